@@ -3,16 +3,16 @@
 Admin Management Script for Eco Actions
 Provides functionality to manage posts, users, and system administration
 """
-import sqlite3
 from datetime import datetime
 import sys
 import os
 
+import repository
+import stats_service
+
 def get_db_connection():
-    """Get database connection"""
-    conn = sqlite3.connect('infousers.db')
-    conn.row_factory = sqlite3.Row
-    return conn
+    """Get database connection (rows support row['column'] access)"""
+    return repository.get_connection()
 
 def list_all_actions():
     """List all eco actions with details"""
@@ -53,8 +53,7 @@ def delete_action(action_id):
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    cursor.execute('SELECT title, username FROM eco_actions ea LEFT JOIN users u ON ea.user_id = u.id WHERE ea.id = ?', (action_id,))
-    action = cursor.fetchone()
+    action = repository.get_eco_action(conn, action_id)
     
     if not action:
         print(f" Action with ID {action_id} not found.")
@@ -67,7 +66,7 @@ def delete_action(action_id):
     confirm = input("\nAre you sure? Type 'DELETE' to confirm: ")
     
     if confirm == 'DELETE':
-        cursor.execute('DELETE FROM eco_actions WHERE id = ?', (action_id,))
+        repository.delete_eco_action(conn, action_id)
         conn.commit()
         print(f" Action {action_id} deleted successfully.")
         return True
@@ -82,8 +81,7 @@ def approve_action(action_id):
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    cursor.execute('SELECT title, approved FROM eco_actions WHERE id = ?', (action_id,))
-    action = cursor.fetchone()
+    action = repository.get_eco_action(conn, action_id)
     
     if not action:
         print(f" Action with ID {action_id} not found.")
@@ -93,7 +91,7 @@ def approve_action(action_id):
         print(f"ℹ  Action '{action['title']}' is already approved.")
         return False
     
-    cursor.execute('UPDATE eco_actions SET approved = TRUE WHERE id = ?', (action_id,))
+    repository.set_eco_action_approved(conn, action_id, True)
     conn.commit()
     conn.close()
     
@@ -105,14 +103,13 @@ def reject_action(action_id):
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    cursor.execute('SELECT title, approved FROM eco_actions WHERE id = ?', (action_id,))
-    action = cursor.fetchone()
+    action = repository.get_eco_action(conn, action_id)
     
     if not action:
         print(f" Action with ID {action_id} not found.")
         return False
     
-    cursor.execute('UPDATE eco_actions SET approved = FALSE WHERE id = ?', (action_id,))
+    repository.set_eco_action_approved(conn, action_id, False)
     conn.commit()
     conn.close()
     
@@ -127,11 +124,10 @@ def list_users():
     
     cursor.execute('''
         SELECT u.id, u.username, u.email, u.role, u.created_at,
-               COUNT(ea.id) as action_count,
-               COALESCE(SUM(ea.points), 0) as total_points
+               COALESCE(s.action_count, 0) as action_count,
+               COALESCE(s.total_points, 0) as total_points
         FROM users u
-        LEFT JOIN eco_actions ea ON u.id = ea.user_id AND ea.approved = TRUE
-        GROUP BY u.id
+        LEFT JOIN user_stats s ON s.user_id = u.id
         ORDER BY total_points DESC
     ''')
     
@@ -176,10 +172,11 @@ def delete_user(user_id):
     confirm = input("\nType 'DELETE USER' to confirm: ")
     
     if confirm == 'DELETE USER':
-        cursor.execute('DELETE FROM eco_actions WHERE user_id = ?', (user_id,))
-        cursor.execute('DELETE FROM sessions WHERE user_id = ?', (user_id,))
+        repository.delete_user_eco_actions(conn, user_id)
+        cursor.execute('DELETE FROM user_sessions WHERE user_id = ?', (user_id,))
         cursor.execute('DELETE FROM user_badges WHERE user_id = ?', (user_id,))
         cursor.execute('DELETE FROM users WHERE id = ?', (user_id,))
+        repository.user_changed(conn, user_id)
         
         conn.commit()
         print(f" User {user['username']} and {action_count} actions deleted successfully.")
@@ -193,53 +190,32 @@ def delete_user(user_id):
 def show_statistics():
     """Show system statistics"""
     conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('SELECT COUNT(*) as count FROM users')
-    total_users = cursor.fetchone()['count']
-    
-    cursor.execute('SELECT COUNT(*) as count FROM eco_actions')
-    total_actions = cursor.fetchone()['count']
-    
-    cursor.execute('SELECT COUNT(*) as count FROM eco_actions WHERE approved = TRUE')
-    approved_actions = cursor.fetchone()['count']
-    
-    cursor.execute('SELECT COUNT(*) as count FROM eco_actions WHERE approved = FALSE')
-    pending_actions = cursor.fetchone()['count']
-    
-    cursor.execute('SELECT COALESCE(SUM(points), 0) as total FROM eco_actions WHERE approved = TRUE')
-    total_points = cursor.fetchone()['total']
-    
-    cursor.execute('''
-        SELECT type, COUNT(*) as count, COALESCE(SUM(points), 0) as points
-        FROM eco_actions WHERE approved = TRUE
-        GROUP BY type
-        ORDER BY count DESC
-    ''')
-    action_types = cursor.fetchall()
-    
+    stats = stats_service.platform_stats(conn, with_totals=True)
     conn.close()
     
+    charity = stats['charity']
     print("\n System Statistics")
     print("=" * 50)
-    print(f" Total Users: {total_users}")
-    print(f" Total Actions: {total_actions}")
-    print(f" Approved Actions: {approved_actions}")
-    print(f" Pending Actions: {pending_actions}")
-    print(f" Total Points: {total_points}")
-    print(f" Charity Donations: {total_points // 500} BGN ({total_points % 500}/500 to next)")
-    
+    print(f" Total Users: {stats['total_users']}")
+    print(f" Total Actions: {stats['total_actions'] + stats['pending_actions']}")
+    print(f" Approved Actions: {stats['total_actions']}")
+    print(f" Pending Actions: {stats['pending_actions']}")
+    print(f" Total Points: {stats['total_points']}")
+    print(f" Charity Donations: {charity['donations_made']} BGN "
+          f"({charity['current_cycle_points']}/{repository.CHARITY_CYCLE_POINTS} to next)")
+    
+    action_types = sorted(stats['eco_actions'].items(), key=lambda item: item[1]['count'], reverse=True)
     if action_types:
         print(f"\n📈 Actions by Type:")
-        for action_type in action_types:
+        for action_type, totals in action_types:
             type_names = {
                 'tree': ' Trees',
                 'clean': ' Cleaning',
                 'bike': ' Biking',
                 'recycle': ' Recycling'
             }
-            name = type_names.get(action_type['type'], action_type['type'])
-            print(f"   {name}: {action_type['count']} actions, {action_type['points']} points")
+            name = type_names.get(action_type, action_type)
+            print(f"   {name}: {totals['count']} actions, {totals['total_points']} points")
 
 def main_menu():
     """Display main menu and handle user input"""
@@ -295,7 +271,7 @@ def main_menu():
             print(" Invalid choice. Please enter 1-8.")
 
 if __name__ == '__main__':
-    if not os.path.exists('infousers.db'):
+    if not repository.database_exists():
         print(" Database file 'infousers.db' not found!")
         print("Make sure you're running this script from the correct directory.")
         sys.exit(1)
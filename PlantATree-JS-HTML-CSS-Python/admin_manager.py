@@ -4,15 +4,15 @@ Admin User Management Script
 Use this script to manually create admin users or manage existing user roles.
 """
 
-import sqlite3
 import getpass
 from werkzeug.security import generate_password_hash
 
+import repository
+
 def connect_to_db():
     """Connect to the user database"""
     try:
-        conn = sqlite3.connect('infousers.db')
-        return conn
+        return repository.get_connection()
     except Exception as e:
         print(f" Error connecting to database: {e}")
         return None
@@ -96,10 +96,12 @@ def create_admin_user():
     hashed_password = generate_password_hash(password)
     
     try:
-        cursor.execute('''
+        user_id = repository.insert_returning_id(conn, '''
             INSERT INTO users (username, email, password_hash, role, points, is_active)
             VALUES (?, ?, ?, ?, ?, ?)
-        ''', (username, email, hashed_password, 'admin', 1000, True))
+        ''', (username, email, hashed_password, 'admin', 0, True))
+        repository.post_points(conn, user_id, 1000, 'grant.admin_created')
+        repository.user_changed(conn, user_id)
         
         conn.commit()
         
@@ -127,7 +129,7 @@ def promote_user_to_admin():
     cursor.execute('''
         SELECT id, username, email, role 
         FROM users 
-        WHERE role = 'regular' AND is_active = 1
+        WHERE role = 'regular' AND is_active = TRUE
         ORDER BY username
     ''')
     
@@ -152,7 +154,7 @@ def promote_user_to_admin():
     cursor.execute('''
         SELECT username, email, role 
         FROM users 
-        WHERE id = ? AND role = 'regular' AND is_active = 1
+        WHERE id = ? AND role = 'regular' AND is_active = TRUE
     ''', (user_id,))
     
     user = cursor.fetchone()
@@ -167,11 +169,8 @@ def promote_user_to_admin():
         return
     
     try:
-        cursor.execute('''
-            UPDATE users 
-            SET role = 'admin', points = points + 500 
-            WHERE id = ?
-        ''', (user_id,))
+        cursor.execute("UPDATE users SET role = 'admin' WHERE id = ?", (user_id,))
+        repository.post_points(conn, user_id, 500, 'grant.admin_promoted')
         
         conn.commit()
         
@@ -197,7 +196,7 @@ def demote_admin_to_user():
     cursor.execute('''
         SELECT id, username, email, role 
         FROM users 
-        WHERE role = 'admin' AND is_active = 1 AND email != 'admin@plantatree.com'
+        WHERE role = 'admin' AND is_active = TRUE AND email != 'admin@plantatree.com'
         ORDER BY username
     ''')
     
@@ -222,7 +221,7 @@ def demote_admin_to_user():
     cursor.execute('''
         SELECT username, email, role 
         FROM users 
-        WHERE id = ? AND role = 'admin' AND is_active = 1 AND email != 'admin@plantatree.com'
+        WHERE id = ? AND role = 'admin' AND is_active = TRUE AND email != 'admin@plantatree.com'
     ''', (user_id,))
     
     user = cursor.fetchone()
@@ -372,8 +371,7 @@ if __name__ == "__main__":
     print("Make sure you're in the directory with infousers.db")
     
     # Check if database exists
-    import os
-    if not os.path.exists('infousers.db'):
+    if not repository.database_exists():
         print(" Database 'infousers.db' not found!")
         print("   Make sure the Flask app has been run at least once to create the database.")
         exit(1)
@@ -0,0 +1,219 @@
+# Ambee air quality and weather client (like an axios service module in Node.js)
+#
+# /api/air-quality, /api/weather and /api/bootstrap go through one GeoCache
+# per endpoint, so Ambee is called once per geohash cell per TTL instead
+# of once per request, and every tab polling Sofia shares the same cell.
+# When Ambee has nothing for a cell (down, no key) callers get the Sofia
+# fallbacks below.
+import os
+import threading
+import time
+from datetime import datetime
+
+import aq_history
+import geo_cache
+import http_client
+
+AMBEE_API_KEY = os.getenv('AMBEE_API_KEY')
+AMBEE_BASE_URL = os.getenv('AMBEE_BASE_URL', 'https://api.ambeedata.com')
+AMBEE_TIMEOUT = float(os.getenv('AMBEE_TIMEOUT', '10'))
+
+AIR_QUALITY_CACHE_TTL = float(os.getenv('AIR_QUALITY_CACHE_TTL', '900'))
+WEATHER_CACHE_TTL = float(os.getenv('WEATHER_CACHE_TTL', '900'))
+AMBEE_CACHE_MAX_STALE = float(os.getenv('AMBEE_CACHE_MAX_STALE', '86400'))
+AMBEE_CACHE_ERROR_TTL = float(os.getenv('AMBEE_CACHE_ERROR_TTL', '60'))
+ENVIRONMENT_TIMEOUT = float(os.getenv('ENVIRONMENT_TIMEOUT', '10'))
+
+class AmbeeError(RuntimeError):
+    pass
+
+# Sofia fallbacks when Ambee is unreachable
+def fallback_air_quality():
+    return {
+        'message': 'success',
+        'stations': [{
+            'AQI': 44,
+            'PM25': 8.177,
+            'PM10': 20.523,
+            'NO2': 7.497,
+            'OZONE': 22.803,
+            'CO': 1.072,
+            'SO2': 0.816,
+            'city': 'Sofia',
+            'countryCode': 'BG',
+            'updatedAt': datetime.now().isoformat()
+        }]
+    }
+
+def fallback_weather():
+    return {
+        'data': {
+            'temperature': 41,  # Fahrenheit (5°C)
+            'temperatureC': 5,  # Celsius
+            'temperatureF': 41, # Fahrenheit
+            'humidity': 78,
+            'windSpeed': 2.1,
+            'visibility': 6500,
+            'pressure': 1018.5
+        }
+    }
+
+# ==================== UPSTREAM ====================
+def _get(path, lat, lon):
+    """Decoded JSON from an Ambee by-lat-lng endpoint; raises AmbeeError"""
+    headers = {
+        'x-api-key': AMBEE_API_KEY,
+        'Content-type': 'application/json'
+    }
+    params = {
+        'lat': lat,
+        'lng': lon
+    }
+    # AMBEE_TIMEOUT covers the retries too, so callers never wait longer than before
+    response = http_client.get('ambee', f"{AMBEE_BASE_URL}{path}", headers=headers, params=params,
+                               timeout=AMBEE_TIMEOUT)
+    if response.status_code != 200:
+        raise AmbeeError(f"Ambee API error: {response.status_code}")
+    return response.json()
+
+def request_air_quality(lat, lon):
+    """Air quality from Ambee, uncached"""
+    print(f"Fetching air quality data for lat: {lat}, lon: {lon}")
+    return _get('/latest/by-lat-lng', lat, lon)
+
+def request_weather(lat, lon):
+    """Weather from Ambee with temperatureC / temperatureF added, uncached"""
+    print(f"Fetching weather data for lat: {lat}, lon: {lon}")
+    data = _get('/weather/latest/by-lat-lng', lat, lon)
+
+    # Convert temperature from Fahrenheit to Celsius if needed
+    if 'data' in data and 'temperature' in data['data']:
+        temp_f = data['data']['temperature']
+        if temp_f:
+            temp_c = (temp_f - 32) * 5/9
+            data['data']['temperatureC'] = round(temp_c, 1)
+            data['data']['temperatureF'] = temp_f
+    return data
+
+def fetch_air_quality(lat, lon):
+    """Air quality for a cell centre from Ambee, also appended to the history"""
+    data = request_air_quality(lat, lon)
+    try:
+        aq_history.record(geo_cache.encode(lat, lon, AIR_QUALITY_CACHE.precision), data)
+    except Exception as e:
+        # A lost history point must not turn a good reading into an upstream error
+        print(f"Air quality history: could not record reading: {e}")
+    return data
+
+# ==================== CACHED LOOKUPS ====================
+STORE = geo_cache.DatabaseStore()
+
+AIR_QUALITY_CACHE = geo_cache.GeoCache(
+    'air_quality', fetch_air_quality, ttl=AIR_QUALITY_CACHE_TTL,
+    max_stale=AMBEE_CACHE_MAX_STALE, error_ttl=AMBEE_CACHE_ERROR_TTL,
+    wait_timeout=AMBEE_TIMEOUT + 1, store=STORE)
+
+WEATHER_CACHE = geo_cache.GeoCache(
+    'weather', request_weather, ttl=WEATHER_CACHE_TTL,
+    max_stale=AMBEE_CACHE_MAX_STALE, error_ttl=AMBEE_CACHE_ERROR_TTL,
+    wait_timeout=AMBEE_TIMEOUT + 1, store=STORE)
+def fallback_payload(fallback):
+    return {
+        'status': 'success',
+        'data': fallback(),
+        'source': 'fallback'
+    }
+
+def _payload(cache, lat, lon, fallback):
+    try:
+        result = cache.get(lat, lon)
+    except (TypeError, ValueError):
+        print(f"Invalid coordinates for {cache.name}: {lat}, {lon}")
+        result = None
+    if result is None:
+        return fallback_payload(fallback)
+    data, info = result
+    return {
+        'status': 'success',
+        'data': data,
+        'source': 'ambee_api',
+        'cache': info
+    }
+
+def air_quality(lat, lon):
+    """Air quality payload for the cell around lat/lon, or the Sofia fallback"""
+    return _payload(AIR_QUALITY_CACHE, lat, lon, fallback_air_quality)
+
+def weather(lat, lon):
+    """Weather payload for the cell around lat/lon, or the Sofia fallback"""
+    return _payload(WEATHER_CACHE, lat, lon, fallback_weather)
+
+# ==================== COMBINED ENVIRONMENT ====================
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_executor():
+    """Process-wide pool for concurrent Ambee lookups (/api/environment, /api/bootstrap)"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+                _executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='ambee')
+    return _executor
+
+FALLBACKS = {
+    'air_quality': fallback_air_quality,
+    'weather': fallback_weather
+}
+
+def submit_environment(lat, lon):
+    """Start the air quality and weather lookups for one point on the shared pool"""
+    executor = get_executor()
+    return {
+        'air_quality': executor.submit(air_quality, lat, lon),
+        'weather': executor.submit(weather, lat, lon)
+    }
+
+def collect_environment(futures, timeout):
+    """Wait up to `timeout` for submitted lookups
+
+    A side that misses the deadline (or fails) gets its Sofia fallback and
+    is listed in `missing`, so callers always get the same payload shape.
+    """
+    from concurrent.futures import wait
+
+    wait(futures.values(), timeout=max(timeout, 0))
+    results = {}
+    missing = []
+    for name, future in futures.items():
+        if future.done() and future.exception() is None:
+            results[name] = future.result()
+        else:
+            results[name] = fallback_payload(FALLBACKS[name])
+            missing.append(name)
+    return results, missing
+
+def environment(lat, lon, timeout=ENVIRONMENT_TIMEOUT):
+    """Air quality and weather for one point, looked up concurrently
+
+    Both lookups share one deadline, so the call takes about as long as
+    the slower of the two. A side that misses the deadline comes back as
+    its fallback and is listed in `missing`; the other side is returned as usual.
+    """
+    start = time.monotonic()
+    results, missing = collect_environment(submit_environment(lat, lon), timeout)
+    if missing:
+        print(f"Environment lookup for {lat}, {lon}: {', '.join(missing)} missed the {timeout}s deadline")
+    payload = {'status': 'success', 'location': {'lat': lat, 'lon': lon}}
+    payload.update(results)
+    payload['partial'] = bool(missing)
+    payload['missing'] = missing
+    payload['elapsed_ms'] = round((time.monotonic() - start) * 1000, 1)
+    return payload
+
+def stats():
+    return {
+        'air_quality': AIR_QUALITY_CACHE.stats(),
+        'weather': WEATHER_CACHE.stats()
+    }
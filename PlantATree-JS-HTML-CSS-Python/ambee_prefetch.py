@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# Ambee prefetcher for Sofia (like a node-cron job warming a cache)
+#
+# Nearly every air quality and weather lookup is for Sofia. This job covers
+# the polygon in sofia_boundaries.geojson with geohash cells and refreshes
+# both lookups for every cell once per interval. The interval is sized so
+# the rounds fit AMBEE_PREFETCH_QUOTA_SHARE of AMBEE_DAILY_QUOTA, leaving
+# the rest for lookups elsewhere. Results land in the external_cache table.
+#
+# The web process marks the same cells as prefetched (install()), so
+# lookups in or near Sofia are answered from memory from the nearest cell
+# and only re-read the table when the prefetcher is due to have refreshed
+# it. When Ambee is down the last cell data keeps being served for
+# AMBEE_CACHE_MAX_STALE; the hard-coded payloads are the last resort.
+#
+# `python app.py` runs it in a thread; next to gunicorn workers it runs as
+# its own process (scripts.py start does this):
+#
+#   python ambee_prefetch.py            # refresh forever
+#   python ambee_prefetch.py --once     # one round, e.g. from cron
+#   python ambee_prefetch.py --list     # print the grid and schedule
+import json
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+load_dotenv()
+
+import ambee
+import aq_history
+import geo_cache
+
+AMBEE_PREFETCH_ENABLED = os.getenv('AMBEE_PREFETCH_ENABLED', 'true').lower() == 'true'
+AMBEE_DAILY_QUOTA = int(os.getenv('AMBEE_DAILY_QUOTA', '1000'))
+AMBEE_PREFETCH_QUOTA_SHARE = float(os.getenv('AMBEE_PREFETCH_QUOTA_SHARE', '0.8'))
+AMBEE_PREFETCH_MIN_INTERVAL = float(os.getenv('AMBEE_PREFETCH_MIN_INTERVAL', '900'))
+AMBEE_PREFETCH_PAUSE = float(os.getenv('AMBEE_PREFETCH_PAUSE', '0.5'))
+AMBEE_NEAREST_KM = float(os.getenv('AMBEE_NEAREST_KM', '5'))
+
+BOUNDARY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sofia_boundaries.geojson')
+
+# ==================== GRID ====================
+def load_boundary(path=BOUNDARY_PATH):
+    """Outer rings, as [(lon, lat), ...], of every polygon in a GeoJSON file"""
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    features = data['features'] if data.get('type') == 'FeatureCollection' else [data]
+    rings = []
+    for feature in features:
+        geometry = feature.get('geometry', feature)
+        if geometry['type'] == 'Polygon':
+            rings.append([tuple(point[:2]) for point in geometry['coordinates'][0]])
+        elif geometry['type'] == 'MultiPolygon':
+            rings.extend([tuple(point[:2]) for point in polygon[0]] for polygon in geometry['coordinates'])
+    return rings
+
+def contains(rings, lat, lon):
+    """Ray casting: True if the point is inside any of the rings"""
+    for ring in rings:
+        inside = False
+        for (x1, y1), (x2, y2) in zip(ring, ring[1:] + ring[:1]):
+            if (y1 > lat) != (y2 > lat) and lon < x1 + (lat - y1) * (x2 - x1) / (y2 - y1):
+                inside = not inside
+        if inside:
+            return True
+    return False
+
+def _touches(rings, cell):
+    lat_min, lat_max, lon_min, lon_max = geo_cache.bounds(cell)
+    points = [geo_cache.decode(cell), (lat_min, lon_min), (lat_min, lon_max),
+              (lat_max, lon_min), (lat_max, lon_max)]
+    if any(contains(rings, lat, lon) for lat, lon in points):
+        return True
+    # A sliver of the polygon poking into the cell
+    return any(lat_min <= lat <= lat_max and lon_min <= lon <= lon_max
+               for ring in rings for lon, lat in ring)
+
+def grid_cells(rings, precision=geo_cache.GEOHASH_PRECISION):
+    """Sorted geohash cells that overlap the polygon"""
+    lons = [lon for ring in rings for lon, _ in ring]
+    lats = [lat for ring in rings for _, lat in ring]
+    lat_min, lat_max, lon_min, lon_max = geo_cache.bounds(geo_cache.encode(min(lats), min(lons), precision))
+    step_lat, step_lon = lat_max - lat_min, lon_max - lon_min
+    cells = set()
+    lat = lat_min + step_lat / 2
+    while lat - step_lat / 2 <= max(lats):
+        lon = lon_min + step_lon / 2
+        while lon - step_lon / 2 <= max(lons):
+            cell = geo_cache.encode(lat, lon, precision)
+            if _touches(rings, cell):
+                cells.add(cell)
+            lon += step_lon
+        lat += step_lat
+    return sorted(cells)
+
+def round_interval(cell_count, lookups=2):
+    """Seconds between rounds so cell_count x lookups calls stay within the prefetch quota"""
+    budget = AMBEE_DAILY_QUOTA * AMBEE_PREFETCH_QUOTA_SHARE
+    if budget <= 0:
+        return float('inf')
+    return max(AMBEE_PREFETCH_MIN_INTERVAL, 86400.0 * cell_count * lookups / budget)
+
+# ==================== PREFETCHER ====================
+class Prefetcher:
+    """Refreshes every cell of every cache once per interval"""
+
+    def __init__(self, caches, cells, interval, pause=AMBEE_PREFETCH_PAUSE, after_round=None):
+        self.caches = caches
+        self.cells = cells
+        self.interval = interval
+        self.pause = pause
+        self.after_round = after_round
+        self.rounds = 0
+        self.upstream_calls = 0
+        self.skipped = 0
+        self.last_round_at = None
+        self.last_round_seconds = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def run_once(self):
+        """One round; cells refreshed less than half an interval ago (e.g. before a restart) are skipped"""
+        start = time.monotonic()
+        for cell in self.cells:
+            for cache in self.caches:
+                if self._stop.is_set():
+                    return
+                if cache.prefetch(cell, max_age=self.interval / 2):
+                    self.upstream_calls += 1
+                    self._stop.wait(self.pause)
+                else:
+                    self.skipped += 1
+        self.rounds += 1
+        self.last_round_at = time.time()
+        self.last_round_seconds = round(time.monotonic() - start, 2)
+        if self.after_round is not None:
+            try:
+                self.after_round()
+            except Exception as e:
+                print(f"Ambee prefetch: after-round task failed: {e}")
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run_forever, name='ambee-prefetch', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def run_forever(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Ambee prefetch round failed: {e}")
+            self._stop.wait(self.interval)
+
+    def stats(self):
+        return {
+            'running': self._thread is not None and self._thread.is_alive(),
+            'cells': len(self.cells),
+            'interval_seconds': round(self.interval, 1),
+            'rounds': self.rounds,
+            'upstream_calls': self.upstream_calls,
+            'skipped': self.skipped,
+            'last_round_seconds': self.last_round_seconds,
+            'age_seconds': round(time.time() - self.last_round_at, 1) if self.last_round_at else None
+        }
+
+_prefetcher = None
+_prefetcher_lock = threading.Lock()
+
+def get_prefetcher():
+    """Process-wide prefetcher for the Ambee caches over the Sofia grid"""
+    global _prefetcher
+    if _prefetcher is None:
+        with _prefetcher_lock:
+            if _prefetcher is None:
+                caches = [ambee.AIR_QUALITY_CACHE, ambee.WEATHER_CACHE]
+                cells = grid_cells(load_boundary(), caches[0].precision)
+                # Each round's new readings are rolled into the air quality history
+                _prefetcher = Prefetcher(caches, cells, round_interval(len(cells), len(caches)),
+                                         after_round=aq_history.maintain)
+    return _prefetcher
+
+def install():
+    """Mark the grid as prefetched in this process's caches (no upstream calls)"""
+    prefetcher = get_prefetcher()
+    for cache in prefetcher.caches:
+        # Half an interval of slack so a round in progress never looks overdue
+        cache.use_prefetched(prefetcher.cells, max(cache.ttl, prefetcher.interval * 1.5),
+                             AMBEE_NEAREST_KM)
+    return prefetcher
+
+def start():
+    return install().start()
+
+def stats():
+    if _prefetcher is None:
+        return {'enabled': AMBEE_PREFETCH_ENABLED, 'running': False}
+    return dict(_prefetcher.stats(), enabled=AMBEE_PREFETCH_ENABLED)
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Prefetch Ambee air quality and weather over the Sofia grid')
+    parser.add_argument('--once', action='store_true', help='run one round and exit')
+    parser.add_argument('--list', action='store_true', help='print the grid and schedule, no upstream calls')
+    args = parser.parse_args()
+
+    import write_queue
+    prefetcher = install()
+    print("=" * 60)
+    print("Ambee Prefetch")
+    print("=" * 60)
+    print(f"Cells: {len(prefetcher.cells)} | Calls per round: {len(prefetcher.cells) * len(prefetcher.caches)} "
+          f"| Interval: {prefetcher.interval / 60:.1f} min | Daily quota: {AMBEE_DAILY_QUOTA}")
+    print("-" * 60)
+    if args.list:
+        for cell in prefetcher.cells:
+            lat, lon = geo_cache.decode(cell)
+            print(f"{cell}  {lat:.4f}, {lon:.4f}")
+        return
+    try:
+        if args.once:
+            prefetcher.run_once()
+            print(f"✓ Round done: {prefetcher.upstream_calls} upstream calls, {prefetcher.skipped} cells still fresh")
+        else:
+            prefetcher.run_forever()
+    except KeyboardInterrupt:
+        print("\nPrefetch stopped by user")
+    finally:
+        write_queue.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,277 @@
+# Columnar analytics over eco actions (like a pandas/arquero data frame behind a charts API)
+#
+# Approved eco actions are held in memory as parallel NumPy columns (id,
+# user, type code, points, created_at as epoch seconds), so the charts in
+# /api/analytics/* are a handful of vectorized passes (bincount, histogram,
+# percentile) instead of per-row Python dicts or one GROUP BY per chart.
+#
+# The snapshot refreshes incrementally: actions inserted approved arrive
+# with higher ids and are appended; the approved count/points per type are
+# then compared with platform_counters, and any mismatch (an old action
+# approved, unapproved or deleted) triggers a full reload. A full reload
+# also happens every ANALYTICS_FULL_RELOAD_SECONDS as a backstop.
+#
+# NumPy is optional and imported on first use; without it the endpoints
+# report that analytics are unavailable.
+import importlib.util
+import os
+import threading
+import time
+from datetime import datetime
+
+import repository
+
+ANALYTICS_REFRESH_SECONDS = float(os.getenv('ANALYTICS_REFRESH_SECONDS', '5'))
+ANALYTICS_FULL_RELOAD_SECONDS = float(os.getenv('ANALYTICS_FULL_RELOAD_SECONDS', '600'))
+ANALYTICS_BATCH_SIZE = int(os.getenv('ANALYTICS_BATCH_SIZE', '50000'))
+
+PERCENTILES = (50, 75, 90, 95, 99)
+BUCKETS = ('day', 'week', 'month')
+WEEKDAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+
+SELECT_APPROVED_ACTIONS = '''
+    SELECT id, user_id, type, points, created_at FROM eco_actions
+    WHERE approved = TRUE AND id > ?
+    ORDER BY id
+'''
+
+def _numpy_available():
+    try:
+        return importlib.util.find_spec('numpy') is not None
+    except ImportError:
+        return False
+
+NUMPY_AVAILABLE = _numpy_available()
+
+class AnalyticsUnavailable(RuntimeError):
+    pass
+
+def _np():
+    if not NUMPY_AVAILABLE:
+        raise AnalyticsUnavailable('Analytics require numpy (pip install numpy)')
+    import numpy
+    return numpy
+
+def _epoch_seconds(np, values):
+    """created_at values (SQLite strings or Postgres datetimes) as int64 epoch seconds"""
+    if values and isinstance(values[0], str):
+        values = [value[:19] for value in values]
+    return np.array(values, dtype='datetime64[s]').astype('int64')
+
+class ActionSnapshot:
+    """Approved eco actions as parallel NumPy columns, refreshed incrementally"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (columns, types): columns maps 'id', 'user', 'type', 'points',
+        # 'created' to arrays; types maps type code -> name. Swapped as one
+        # tuple so readers never see columns and codes from different loads.
+        self.state = None
+        self._type_codes = {}
+        self.last_id = 0
+        self.loaded_at = 0.0
+        self.checked_at = 0.0
+        self.full_loads = 0
+        self.appended = 0
+
+    def _read(self, conn, after_id, types, type_codes):
+        """Columns for approved actions with id > after_id, read in batches"""
+        np = _np()
+        parts = []
+        batch = []
+        for row in repository.iter_rows(conn, SELECT_APPROVED_ACTIONS, (after_id,),
+                                        batch_size=ANALYTICS_BATCH_SIZE):
+            batch.append(row)
+            if len(batch) >= ANALYTICS_BATCH_SIZE:
+                parts.append(_to_columns(np, batch, types, type_codes))
+                batch = []
+        if batch or not parts:
+            parts.append(_to_columns(np, batch, types, type_codes))
+        return {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+
+    def _full_load(self, conn):
+        types, type_codes = [], {}
+        columns = self._read(conn, 0, types, type_codes)
+        self.state = (columns, types)
+        self._type_codes = type_codes
+        self.last_id = int(columns['id'][-1]) if len(columns['id']) else 0
+        self.loaded_at = time.monotonic()
+        self.full_loads += 1
+
+    def _is_fresh(self, now):
+        return self.state is not None and now - self.checked_at < ANALYTICS_REFRESH_SECONDS
+
+    def refresh(self, conn, force=False):
+        """(columns, types), brought up to date at most every ANALYTICS_REFRESH_SECONDS unless forced"""
+        np = _np()
+        if not force and self._is_fresh(time.monotonic()):
+            return self.state
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._is_fresh(now):
+                return self.state
+            if force or self.state is None or now - self.loaded_at >= ANALYTICS_FULL_RELOAD_SECONDS:
+                self._full_load(conn)
+            else:
+                columns, types = self.state
+                # New codes are only ever appended, so older columns stay valid
+                types = list(types)
+                new = self._read(conn, self.last_id, types, self._type_codes)
+                if len(new['id']):
+                    columns = {name: np.concatenate([columns[name], new[name]]) for name in new}
+                    self.appended += len(new['id'])
+                    self.last_id = int(new['id'][-1])
+                self.state = (columns, types)
+                # Uncached read: counters from the query cache could predate the rows just read
+                counters = dict(repository.fetch_all(conn, repository.SELECT_COUNTERS))
+                if not matches_counters(columns, types, counters):
+                    self._full_load(conn)
+            self.checked_at = time.monotonic()
+            return self.state
+
+    def stats(self):
+        columns, types = self.state or ({'id': ()}, [])
+        return {
+            'available': NUMPY_AVAILABLE,
+            'rows': len(columns['id']),
+            'types': len(types),
+            'last_id': self.last_id,
+            'full_loads': self.full_loads,
+            'appended': self.appended,
+            'age_seconds': round(time.monotonic() - self.loaded_at, 1) if self.state is not None else None,
+        }
+
+def _to_columns(np, rows, types, type_codes):
+    codes = []
+    for row in rows:
+        code = type_codes.get(row[2])
+        if code is None:
+            code = type_codes[row[2]] = len(types)
+            types.append(row[2])
+        codes.append(code)
+    return {
+        'id': np.array([row[0] for row in rows], dtype='int64'),
+        'user': np.array([-1 if row[1] is None else row[1] for row in rows], dtype='int64'),
+        'type': np.array(codes, dtype='int64'),
+        'points': np.array([row[3] or 0 for row in rows], dtype='int64'),
+        'created': _epoch_seconds(np, [row[4] for row in rows]),
+    }
+
+def matches_counters(columns, types, counters):
+    """True when the columns agree with the approved count/points counters per type"""
+    np = _np()
+    counts = np.bincount(columns['type'], minlength=len(types))
+    points = np.bincount(columns['type'], weights=columns['points'], minlength=len(types))
+    expected_counts = repository.counters_by_type(counters, 'eco_actions.approved')
+    expected_points = repository.counters_by_type(counters, 'eco_actions.points')
+    for code, name in enumerate(types):
+        if counts[code] != expected_counts.pop(name, 0) or points[code] != expected_points.pop(name, 0):
+            return False
+    return not expected_counts and not expected_points
+
+SNAPSHOT = ActionSnapshot()
+
+# ==================== FILTERS ====================
+def parse_since(value):
+    """Epoch seconds for a 'YYYY-MM-DD' (UTC) or None; raises ValueError"""
+    if not value:
+        return None
+    return int((datetime.strptime(value, '%Y-%m-%d') - datetime(1970, 1, 1)).total_seconds())
+
+def select(columns, types, since=None, action_type=None):
+    """Columns restricted to actions since `since` (epoch seconds) of `action_type`"""
+    mask = None
+    if since is not None:
+        mask = columns['created'] >= since
+    if action_type is not None:
+        type_mask = columns['type'] == (types.index(action_type) if action_type in types else -1)
+        mask = type_mask if mask is None else mask & type_mask
+    if mask is None:
+        return columns
+    return {name: values[mask] for name, values in columns.items()}
+
+# ==================== CHARTS ====================
+def points_distribution(columns, bins=20):
+    """Histogram and percentiles of points per user"""
+    np = _np()
+    users = columns['user']
+    known = users >= 0
+    if not known.any():
+        return {'users': 0, 'histogram': [], 'percentiles': {}, 'mean': 0, 'max': 0}
+    # User ids are small integers, so bincount groups them without sorting
+    users = users[known]
+    totals = np.bincount(users, weights=columns['points'][known]).astype('int64')
+    totals = totals[np.bincount(users) > 0]
+    counts, edges = np.histogram(totals, bins=bins)
+    values = np.percentile(totals, PERCENTILES)
+    return {
+        'users': int(len(totals)),
+        'histogram': [{'from': float(edges[i]), 'to': float(edges[i + 1]), 'users': int(counts[i])}
+                      for i in range(len(counts))],
+        'percentiles': {f'p{p}': float(v) for p, v in zip(PERCENTILES, values)},
+        'mean': round(float(totals.mean()), 2),
+        'max': int(totals.max())
+    }
+
+def activity_heatmap(columns):
+    """Actions per weekday x hour (UTC); rows are Monday..Sunday"""
+    np = _np()
+    created = columns['created']
+    days = created // 86400
+    weekday = (days + 3) % 7  # 1970-01-01 was a Thursday
+    hour = (created // 3600) % 24
+    matrix = np.bincount(weekday * 24 + hour, minlength=7 * 24).reshape(7, 24)
+    return {
+        'timezone': 'UTC',
+        'weekdays': list(WEEKDAYS),
+        'hours': list(range(24)),
+        'matrix': matrix.tolist(),
+        'by_weekday': matrix.sum(axis=1).tolist(),
+        'by_hour': matrix.sum(axis=0).tolist(),
+        'total': int(matrix.sum())
+    }
+
+def _bucket_keys(np, created, bucket):
+    """(keys, step, unit): an integer per action for its day / ISO week (Monday) / month"""
+    days = created // 86400
+    if bucket == 'day':
+        return days, 1, 'D'
+    if bucket == 'week':
+        return days - (days + 3) % 7, 7, 'D'  # the Monday starting the week
+    return created.astype('datetime64[s]').astype('datetime64[M]').astype('int64'), 1, 'M'
+
+def type_mix(columns, types, bucket='week'):
+    """Actions and points per period x type"""
+    np = _np()
+    if bucket not in BUCKETS:
+        raise ValueError(f'bucket must be one of {", ".join(BUCKETS)}')
+    if not len(columns['id']):
+        return {'bucket': bucket, 'periods': [], 'types': [], 'counts': [], 'points': []}
+    keys, step, unit = _bucket_keys(np, columns['created'], bucket)
+    first = keys.min()
+    present = np.flatnonzero(np.bincount(columns['type'], minlength=len(types)))
+    type_index = np.full(len(types), -1, dtype='int64')
+    type_index[present] = np.arange(len(present))
+    # One bincount over (period, type) cells; the period range is dense, empty periods dropped after
+    cells = (keys - first) // step * len(present) + type_index[columns['type']]
+    shape = (int((keys.max() - first) // step) + 1, len(present))
+    counts = np.bincount(cells, minlength=shape[0] * shape[1]).reshape(shape)
+    points = np.bincount(cells, weights=columns['points'], minlength=shape[0] * shape[1]).reshape(shape)
+    used = counts.sum(axis=1) > 0
+    periods = (first + np.flatnonzero(used) * step).astype(f'datetime64[{unit}]').astype(str).tolist()
+    counts, points = counts[used], points[used]
+    return {
+        'bucket': bucket,
+        'periods': periods,
+        'types': [types[code] for code in present.tolist()],
+        'counts': counts.tolist(),
+        'points': points.astype('int64').tolist()
+    }
+
+def get_columns(conn, since=None, action_type=None):
+    """(columns, types) for the current snapshot after an incremental refresh"""
+    columns, types = SNAPSHOT.refresh(conn)
+    return select(columns, types, since, action_type), types
+
+def stats():
+    return SNAPSHOT.stats()
@@ -1,25 +1,15 @@
-from flask import Flask, render_template, request, jsonify, send_from_directory, g
+from flask import Flask, Response, render_template, request, jsonify, send_from_directory, g
 from flask_cors import CORS
 import json
 import os
 from datetime import datetime, timedelta
-import sqlite3
 from werkzeug.utils import secure_filename
 from werkzeug.security import generate_password_hash, check_password_hash
-import requests
-import google.generativeai as genai
+import importlib.util
+import threading
 import jwt
 import time
 
-try:
-    from deep_translator import GoogleTranslator
-    GOOGLE_TRANSLATE_AVAILABLE = True
-    print("✓ Deep Translator library loaded successfully")
-except ImportError as e:
-    print(f"Translation library not available: {e}")
-    GOOGLE_TRANSLATE_AVAILABLE = False
-    GoogleTranslator = None
-
 from dotenv import load_dotenv
 load_dotenv()  
 
@@ -56,6 +46,23 @@ except ImportError as e:
     print(f"Middleware not available: {e}")
     MIDDLEWARE_AVAILABLE = False
 
+import bootstrap
+import ambee
+import ambee_prefetch
+import analytics
+import aq_history
+import db_pool
+import exporter
+import google_translate
+import http_client
+import leaderboard
+import pagination
+import response_cache
+import repository
+import stats_service
+import write_queue
+from sql_dialect import group_concat, period_start
+
 try:
     from routes_v1 import api_v1, admin_routes
     ROUTES_V1_AVAILABLE = True
@@ -79,7 +86,8 @@ def after_request(response):
     else:
         response.headers['Access-Control-Allow-Origin'] = '*'
         response.headers['Access-Control-Allow-Methods'] = 'GET, POST, PUT, DELETE, OPTIONS'
-        response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization'
+        response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization, Idempotency-Key'
+        response.headers['Access-Control-Expose-Headers'] = 'X-Next-Cursor'
         response.headers['X-Content-Type-Options'] = 'nosniff'
         response.headers['X-Frame-Options'] = 'DENY'
     
@@ -96,15 +104,12 @@ if ROUTES_V1_AVAILABLE:
 else:
     print("V1 API Routes not available - using legacy routes")
 
-AMBEE_API_KEY = os.getenv('AMBEE_API_KEY')
-AMBEE_BASE_URL = os.getenv('AMBEE_BASE_URL', 'https://api.ambeedata.com')
-
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'fallback-secret-key')
 app.config['UPLOAD_FOLDER'] = os.getenv('UPLOAD_FOLDER', 'uploads')
 app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('MAX_CONTENT_LENGTH', '16777216'))  
 
 CLOUD_DB_URL = os.environ.get('DATABASE_URL')  
-USE_CLOUD_DB = CLOUD_DB_URL is not None
+USE_CLOUD_DB = db_pool.is_postgres_url(CLOUD_DB_URL)
 
 if USE_CLOUD_DB:
     print(" Using cloud database:", CLOUD_DB_URL[:50] + "...")
@@ -113,194 +118,70 @@ else:
 
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
+# Pooled connections are returned to the pool when the request ends
+db_pool.init_app(app)
+
 def get_db_connection():
-    """Get database connection - local SQLite or cloud PostgreSQL"""
-    if USE_CLOUD_DB:
-        try:
-            import psycopg2
-            return psycopg2.connect(CLOUD_DB_URL)
-        except ImportError:
-            print("psycopg2 not installed, falling back to SQLite")
-            return sqlite3.connect('infousers.db')
-        except Exception as e:
-            print(f"Cloud DB connection failed: {e}, falling back to SQLite")
-            return sqlite3.connect('infousers.db')
-    else:
-        return sqlite3.connect('infousers.db')
+    """Get pooled database connection - local SQLite or cloud PostgreSQL"""
+    return repository.get_connection()
 
-def init_db():
-    """Initialize database with required tables"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            email TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            role TEXT DEFAULT 'regular' CHECK(role IN ('regular', 'admin')),
-            profile_picture TEXT DEFAULT NULL,
-            points INTEGER DEFAULT 0,
-            is_active BOOLEAN DEFAULT TRUE,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            last_login TIMESTAMP DEFAULT NULL
-        )
-    ''')
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS user_sessions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            session_token TEXT UNIQUE NOT NULL,
-            expires_at TIMESTAMP NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
-        )
-    ''')
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS locations (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            description TEXT,
-            type TEXT NOT NULL,
-            latitude REAL,
-            longitude REAL,
-            user_id INTEGER,
-            approved BOOLEAN DEFAULT FALSE,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-    ''')
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS eco_actions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            title TEXT NOT NULL,
-            description TEXT,
-            type TEXT NOT NULL,
-            location_name TEXT,
-            image_path TEXT,
-            points INTEGER DEFAULT 0,
-            user_id INTEGER,
-            approved BOOLEAN DEFAULT FALSE,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-    ''')
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS badges (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            description TEXT,
-            icon TEXT,
-            requirement_type TEXT,
-            requirement_value INTEGER
-        )
-    ''')
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS user_badges (
-            user_id INTEGER,
-            badge_id INTEGER,
-            earned_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            PRIMARY KEY (user_id, badge_id),
-            FOREIGN KEY (user_id) REFERENCES users (id),
-            FOREIGN KEY (badge_id) REFERENCES badges (id)
-        )
-    ''')
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS sofia_redesigns (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            type TEXT NOT NULL,
-            geometry TEXT NOT NULL,
-            coordinates TEXT NOT NULL,
-            description TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    cursor.execute('SELECT COUNT(*) FROM users WHERE role = "admin"')
-    if cursor.fetchone()[0] == 0:
-        admin_password_hash = generate_password_hash('admin123')  
-        cursor.execute('''
-            INSERT INTO users (username, email, password_hash, role, points)
-            VALUES (?, ?, ?, ?, ?)
-        ''', ('admin', 'admin@plantatree.com', admin_password_hash, 'admin', 1000))
-        print("✓ Default admin user created (admin@plantatree.com / admin123)")
-    
-    cursor.execute('SELECT COUNT(*) FROM locations')
-    if cursor.fetchone()[0] == 0:
-        sample_locations = [
-            ('Борисова градина', 'Най-големият парк в София с много дървета и алеи', 'park', 42.6755, 23.3348, None, True),
-            ('Витоша парк', 'Красив парк в подножието на планината', 'park', 42.6447, 23.2750, None, True),
-            ('Еко пътека Витоша', 'Планинска еко пътека с прекрасни гледки', 'trail', 42.5569, 23.2892, None, True),
-            ('Велоалея Дунав', 'Велосипедна алея покрай река Дунав', 'bike', 42.6892, 23.3517, None, True),
-            ('Зона за засаждане', 'Специално място за засаждане на нови дървета', 'plant', 42.6977, 23.3219, None, True)
-        ]
-        
-        cursor.executemany('''
-            INSERT INTO locations (name, description, type, latitude, longitude, user_id, approved)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', sample_locations)
-    
-    cursor.execute('SELECT COUNT(*) FROM badges')
-    if cursor.fetchone()[0] == 0:
-        sample_badges = [
-            ('Tree Planter', 'Засади първото си дърво', 'Tree', 'trees', 1),
-            ('Eco Hero', 'Направи 10 еко действия', 'Eco', 'actions', 10),
-            ('Green Warrior', 'Събери 100 точки', 'Trophy', 'points', 100),
-            ('Nature Lover', 'Посети 5 различни зелени зони', 'Nature', 'locations', 5),
-            ('Bike Rider', 'Използвай велосипед 10 пъти', 'Bike', 'bike_rides', 10)
-        ]
-        
-        cursor.executemany('''
-            INSERT INTO badges (name, description, icon, requirement_type, requirement_value)
-            VALUES (?, ?, ?, ?, ?)
-        ''', sample_badges)
-    
-    conn.commit()
-    conn.close()
+def get_read_db_connection():
+    """Pooled connection for read-only GET handlers (read-only file / snapshot / replica)"""
+    return repository.get_read_connection()
 
-init_db()
+def init_db():
+    """Initialize database with required tables (full bootstrap, ignores the version check)"""
+    bootstrap.bootstrap(force=True)
 
-import os
-from dotenv import load_dotenv
-try:
-    import google.generativeai as genai
-    GENAI_AVAILABLE = True
-except ImportError:
-    print("Google Generative AI not available - chat functionality disabled")
-    GENAI_AVAILABLE = False
-    genai = None
+# ==================== OPTIONAL INTEGRATIONS (lazy) ====================
+# google.generativeai alone takes about a second to import, so the heavy
+# clients are only loaded when a chat or translation request needs them.
+def _module_available(name):
+    try:
+        return importlib.util.find_spec(name) is not None
+    except ImportError:
+        return False
 
+GENAI_AVAILABLE = _module_available('google.generativeai')
 GENAI_API_KEY = os.getenv('GENAI_API_KEY')
-GEMINI_MODEL = None
+# google_translate parses the translate page with BeautifulSoup
+GOOGLE_TRANSLATE_AVAILABLE = _module_available('bs4')
 
-if GENAI_AVAILABLE and GENAI_API_KEY:
-    try:
-        genai.configure(api_key=GENAI_API_KEY)
-        GEMINI_MODEL = genai.GenerativeModel(
-            model_name='gemini-2.5-flash',
-            system_instruction=(
-                "Ти си Еко Асистент за платформата EcoBuilders, фокусирана върху еко инициативи в София, България. "
-                "Отговаряй на български език и английски, в зависимост от контекста, кратко, ясно и полезно, в обикновен текст без Markdown форматиране. "
-                "Не използвай удебелен текст, списъци, нови редове със знаци (напр. \n, *, -) или други специални символи за форматиране. "
-                "Предоставяй информация за засаждане на дървета, почистване, велоалеи, зелени зони и други еко действия. "
-                "Бъди дружелюбен и насърчавай потребителите да се включат в еко инициативи."
-            )
-        )
-        print("Gemini 2.5 готов с главен промпт!")
-    except Exception as e:
-        print(f"Gemini грешка: {e}")
-        GEMINI_MODEL = None
-elif not GENAI_AVAILABLE:
+_gemini_model = None
+_gemini_lock = threading.Lock()
+
+if not GENAI_AVAILABLE:
     print("Google Generative AI не е инсталиран")
-else:
+elif not GENAI_API_KEY:
     print("ℹ GENAI_API_KEY not set - AI chat functionality will be disabled")
+if not GOOGLE_TRANSLATE_AVAILABLE:
+    print("Translation library not available")
+
+def get_gemini_model():
+    """Configure the Gemini model on first use; None when unavailable"""
+    global _gemini_model
+    if _gemini_model is not None or not (GENAI_AVAILABLE and GENAI_API_KEY):
+        return _gemini_model
+    with _gemini_lock:
+        if _gemini_model is None:
+            try:
+                import google.generativeai as genai
+                genai.configure(api_key=GENAI_API_KEY)
+                _gemini_model = genai.GenerativeModel(
+                    model_name='gemini-2.5-flash',
+                    system_instruction=(
+                        "Ти си Еко Асистент за платформата EcoBuilders, фокусирана върху еко инициативи в София, България. "
+                        "Отговаряй на български език и английски, в зависимост от контекста, кратко, ясно и полезно, в обикновен текст без Markdown форматиране. "
+                        "Не използвай удебелен текст, списъци, нови редове със знаци (напр. \n, *, -) или други специални символи за форматиране. "
+                        "Предоставяй информация за засаждане на дървета, почистване, велоалеи, зелени зони и други еко действия. "
+                        "Бъди дружелюбен и насърчавай потребителите да се включат в еко инициативи."
+                    )
+                )
+                print("Gemini 2.5 готов с главен промпт!")
+            except Exception as e:
+                print(f"Gemini грешка: {e}")
+    return _gemini_model
+
 # Routes
 # Express.js-style API info endpoint
 @app.route('/api', methods=['GET'])
@@ -314,6 +195,10 @@ def api_info():
             'v1': '/api/v1/',
             'admin': '/api/admin/',
             'health': '/api/health',
+            'metrics': '/api/metrics',
+            'export': '/api/export/<eco-actions|locations>.<ndjson|csv>',
+            'analytics': '/api/analytics/',
+            'environment': '/api/environment?lat=&lon=',
             'docs': '/api/docs'
         },
         'features': [
@@ -341,7 +226,7 @@ def health_check():
     
     external_apis = {}
     try:
-        response = requests.get('https://httpbin.org/status/200', timeout=5)
+        response = http_client.get('httpbin', 'https://httpbin.org/status/200', timeout=5, retries=0)
         external_apis['connectivity'] = 'healthy' if response.status_code == 200 else 'unhealthy'
     except Exception:
         external_apis['connectivity'] = 'unhealthy'
@@ -353,6 +238,7 @@ def health_check():
         'timestamp': datetime.now().isoformat(),
         'services': {
             'database': db_status,
+            'database_pool': db_pool.pool_stats(),
             'external_apis': external_apis,
             'server': 'healthy'
         },
@@ -360,6 +246,23 @@ def health_check():
         'version': '1.0.0'
     })
 
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Runtime metrics for capacity planning"""
+    return jsonify({
+        'database_pool': db_pool.pool_stats(),
+        'queries': repository.query_stats(),
+        'query_cache': repository.QUERY_CACHE.stats(),
+        'write_queue': write_queue.stats(),
+        'leaderboard': leaderboard.LEADERBOARD.stats(),
+        'response_cache': response_cache.stats(),
+        'analytics': analytics.stats(),
+        'external_cache': ambee.stats(),
+        'ambee_prefetch': ambee_prefetch.stats(),
+        'http_client': http_client.stats(),
+        'timestamp': datetime.now().isoformat()
+    })
+
 def get_current_user():
     """Get current user from JWT token in Authorization header"""
     try:
@@ -432,21 +335,36 @@ def serve_static(filename):
     """Serve static files (CSS, JS, images)"""
     return send_from_directory('.', filename)
 
+def paged_response(items, next_cursor):
+    """JSON list response; the cursor for the next page goes in X-Next-Cursor"""
+    response = jsonify(items)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
+
+# Public GET responses are cached per query string; each route lists the
+# tables it reads so commits that write them drop the cached copies
+LEADERBOARD_TABLES = ('user_stats', 'user_type_stats', 'daily_user_stats', 'user_badges', 'platform_counters')
+
 @app.route('/api/locations', methods=['GET'])
+@response_cache.cached(ttl=60, tags=('locations',))
 def get_locations():
-    """Get all approved locations"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('''
+    """Get approved locations (all of them unless ?limit= / ?cursor= is given)"""
+    limit, after = pagination.page_args(request.args, default_limit=None)
+    conn = get_read_db_connection()
+    locations, next_cursor = locations_page(conn, limit, after)
+    conn.close()
+    return paged_response(locations, next_cursor)
+
+def locations_page(conn, limit=None, after=None):
+    """(locations, next_cursor) for approved locations, newest first"""
+    rows, next_cursor = pagination.fetch_page(conn, '''
         SELECT id, name, description, type, latitude, longitude, created_at
-        FROM locations 
-        WHERE approved = TRUE
-        ORDER BY created_at DESC
-    ''')
+        FROM locations
+    ''', ['approved = TRUE'], (), after, limit)
     
     locations = []
-    for row in cursor.fetchall():
+    for row in rows:
         locations.append({
             'id': row[0],
             'name': row[1],
@@ -456,9 +374,7 @@ def get_locations():
             'longitude': row[5],
             'created_at': row[6]
         })
-    
-    conn.close()
-    return jsonify(locations)
+    return locations, next_cursor
 
 @app.route('/api/locations', methods=['POST'])
 def add_location():
@@ -467,22 +383,17 @@ def add_location():
         data = request.get_json()
         
         conn = get_db_connection()
-        cursor = conn.cursor()
         
-        cursor.execute('''
-            INSERT INTO locations (name, description, type, latitude, longitude, user_id, approved)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (
+        location_id = repository.insert_location(
+            conn,
             data['name'],
             data['description'],
             data['type'],
             data.get('latitude'),
             data.get('longitude'),
-            data.get('user_id', 1),  
-            False  
-        ))
-        
-        location_id = cursor.lastrowid
+            data.get('user_id', 1),
+            approved=False
+        )
         conn.commit()
         conn.close()
         
@@ -496,23 +407,27 @@ def add_location():
         return jsonify({'success': False, 'error': str(e)}), 400
 
 @app.route('/api/eco-actions', methods=['GET'])
+@response_cache.cached(ttl=30, tags=('eco_actions',))
 def get_eco_actions():
-    """Get all approved eco actions"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('''
+    """Get approved eco actions, newest first (20 per page, next page via ?cursor=)"""
+    limit, after = pagination.page_args(request.args)
+    conn = get_read_db_connection()
+    actions, next_cursor = eco_actions_page(conn, limit, after)
+    conn.close()
+    return paged_response(actions, next_cursor)
+
+def eco_actions_page(conn, limit=pagination.DEFAULT_LIMIT, after=None):
+    """(actions, next_cursor) for approved eco actions, newest first"""
+    rows, next_cursor = pagination.fetch_page(conn, '''
         SELECT ea.id, ea.title, ea.description, ea.type, ea.location_name, 
                ea.image_path, ea.points, ea.created_at, u.username, u.profile_picture
         FROM eco_actions ea
         LEFT JOIN users u ON ea.user_id = u.id
-        WHERE ea.approved = TRUE
-        ORDER BY ea.created_at DESC
-        LIMIT 20
-    ''')
+    ''', ['ea.approved = TRUE'], (), after, limit,
+        created_column='ea.created_at', id_column='ea.id', created_index=7)
     
     actions = []
-    for row in cursor.fetchall():
+    for row in rows:
         actions.append({
             'id': row[0],
             'title': row[1],
@@ -525,9 +440,17 @@ def get_eco_actions():
             'username': row[8] or 'Анонимен потребител',
             'user_profile_picture': row[9] if len(row) > 9 else None
         })
-    
-    conn.close()
-    return jsonify(actions)
+    return actions, next_cursor
+
+def replayed_eco_action(entry):
+    """Response for a retried POST whose Idempotency-Key was already posted"""
+    return jsonify({
+        'success': True,
+        'message': f"Еко действието е добавено! Получихте {entry['delta']} точки!",
+        'action_id': entry['action_id'],
+        'points': entry['delta'],
+        'replayed': True
+    })
 
 @app.route('/api/eco-actions', methods=['POST'])
 def add_eco_action():
@@ -537,6 +460,16 @@ def add_eco_action():
         if not current_user:
             return jsonify({'success': False, 'error': 'Трябва да влезете в профила си'}), 401
         
+        # A retried POST with the same Idempotency-Key gets the original result
+        idempotency_key = request.headers.get('Idempotency-Key')
+        if idempotency_key:
+            idempotency_key = f"eco_action:{current_user['id']}:{idempotency_key[:128]}"
+            conn = get_db_connection()
+            entry = repository.get_ledger_entry(conn, idempotency_key)
+            conn.close()
+            if entry is not None:
+                return replayed_eco_action(entry)
+        
         image_path = None
         if 'image' in request.files:
             file = request.files['image']
@@ -565,19 +498,22 @@ def add_eco_action():
         points = points_map.get(action_type, 5)
         
         conn = get_db_connection()
-        cursor = conn.cursor()
         
-        cursor.execute('''
-            INSERT INTO eco_actions (title, description, type, location_name, image_path, points, user_id, approved)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            title, description, action_type, location_name, 
-            image_path, points, current_user['id'], True 
-        ))
-        
-        action_id = cursor.lastrowid
+        # Checks the key again in the same transaction: a concurrent retry may have posted it
+        action_id, entry = repository.add_eco_action(
+            conn, title, description, action_type, location_name,
+            image_path, points, current_user['id'], True, idempotency_key
+        )
         conn.commit()
         conn.close()
+        if entry is not None:
+            # The original request stored its own image; this copy would be orphaned
+            if image_path:
+                try:
+                    os.remove(os.path.join(app.config['UPLOAD_FOLDER'], os.path.basename(image_path)))
+                except OSError:
+                    pass
+            return replayed_eco_action(entry)
         
         return jsonify({
             'success': True,
@@ -590,33 +526,93 @@ def add_eco_action():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 400
 
+def charity_payload(stats):
+    # Derived from the ledger's running pool balance, so no sums over eco_actions
+    return stats['charity']
+
 @app.route('/api/charity-stats', methods=['GET'])
+@response_cache.cached(ttl=30, tags=('platform_counters',))
 def get_charity_stats():
     """Get charity statistics - total points from all eco actions"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT SUM(points) FROM eco_actions WHERE approved = TRUE')
-        total_points = cursor.fetchone()[0] or 0
-        
-        donations_made = total_points // 500
-        total_donated = donations_made * 1.0 
-        
+        conn = get_read_db_connection()
+        stats = stats_service.platform_stats(conn)
         conn.close()
         
-        return jsonify({
-            'total_points': total_points,
-            'donations_made': donations_made,
-            'total_donated_bgn': total_donated,
-            'current_cycle_points': total_points % 500,
-            'points_to_next_donation': 500 - (total_points % 500)
-        })
+        return jsonify(charity_payload(stats))
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def leaderboard_level(points):
+    if points >= 1000:
+        return 'Еко легенда'
+    elif points >= 750:
+        return 'Еко майстор'
+    elif points >= 500:
+        return 'Еко експерт'
+    elif points >= 300:
+        return 'Еко активист'
+    elif points >= 150:
+        return 'Еко ентусиаст'
+    return 'Еко новак'
+
+def leaderboard_badges(conn, user_ids):
+    """{user_id: ['icon name', ...]} for one page of the leaderboard, in one query"""
+    if not user_ids:
+        return {}
+    badges_column = group_concat("b.icon || ' ' || b.name", repository.dialect(conn), distinct=True)
+    placeholders = ', '.join('?' * len(user_ids))
+    rows = repository.fetch_all(conn, f'''
+        SELECT ub.user_id, {badges_column}
+        FROM user_badges ub
+        JOIN badges b ON ub.badge_id = b.id
+        WHERE ub.user_id IN ({placeholders})
+        GROUP BY ub.user_id
+    ''', user_ids)
+    return {row[0]: row[1].split(',') for row in rows if row[1]}
+
+LEADERBOARD_MAX_RADIUS = 50
+
+def decorate_leaderboard_entries(conn, entries):
+    """Add badges, avatar and level to entries from the leaderboard engine"""
+    badges = leaderboard_badges(conn, [entry['id'] for entry in entries])
+    for entry in entries:
+        entry['badges'] = badges.get(entry['id'], [])
+        entry['avatar'] = f'https://via.placeholder.com/80?text={entry["username"][0].upper()}'
+        entry['level'] = leaderboard_level(entry['points'])
+    return entries
+
+def leaderboard_position(user_id):
+    """Rank, percentile and neighbours of one user as a JSON response"""
+    radius = min(max(request.args.get('radius', 5, type=int), 0), LEADERBOARD_MAX_RADIUS)
+    position = leaderboard.get_leaderboard().position(user_id, radius)
+    if position is None:
+        return jsonify({'error': 'User not found'}), 404
+    
+    conn = get_read_db_connection()
+    decorate_leaderboard_entries(conn, position['neighbours'])
+    conn.close()
+    
+    position['user_id'] = user_id
+    position['radius'] = radius
+    return jsonify(position)
+
+@app.route('/api/leaderboard/me', methods=['GET'])
+def get_my_leaderboard_position():
+    """Current user's rank, percentile and neighbouring users"""
+    current_user = get_current_user()
+    if not current_user:
+        return jsonify({'success': False, 'error': 'Трябва да влезете в профила си'}), 401
+    return leaderboard_position(current_user['id'])
+
+@app.route('/api/leaderboard/around/<int:user_id>', methods=['GET'])
+def get_leaderboard_around(user_id):
+    """Rank, percentile and the `radius` users above and below `user_id`"""
+    return leaderboard_position(user_id)
+
 @app.route('/api/leaderboard', methods=['GET'])
+@response_cache.cached(ttl=30, tags=LEADERBOARD_TABLES)
 def get_leaderboard():
     """Get leaderboard data with user rankings"""
     try:
@@ -624,51 +620,88 @@ def get_leaderboard():
         action_type = request.args.get('type', 'all')  
         limit = int(request.args.get('limit', 50))
         
-        conn = get_db_connection()
+        conn = get_read_db_connection()
         cursor = conn.cursor()
         
-        base_query = """
-            SELECT 
-                u.id,
-                u.username,
-                COALESCE(SUM(ea.points), 0) as total_points,
-                COUNT(ea.id) as total_actions,
-                u.created_at,
-                GROUP_CONCAT(DISTINCT b.icon || ' ' || b.name) as badges
-            FROM users u
-            LEFT JOIN eco_actions ea ON u.id = ea.user_id AND ea.approved = TRUE
-            LEFT JOIN user_badges ub ON u.id = ub.user_id
-            LEFT JOIN badges b ON ub.badge_id = b.id
+        if period_start(period) is None and action_type == 'all' and leaderboard.LEADERBOARD_ENABLED:
+            # All-time overall rankings come from the in-memory engine
+            board = leaderboard.get_leaderboard()
+            entries = decorate_leaderboard_entries(conn, board.top(limit))
+            total_users = len(board)
+            
+            stats = stats_service.platform_stats(conn)
+            conn.close()
+            return jsonify({
+                'leaderboard': entries,
+                'statistics': {
+                    'total_users': total_users,
+                    'total_actions': stats['total_actions'],
+                    'total_points': stats['total_points']
+                },
+                'period': period,
+                'type': action_type
+            })
+        
+        badges_column = group_concat("b.icon || ' ' || b.name", repository.dialect(conn), distinct=True)
+        # Correlated subquery so the badge rows do not multiply the point sums
+        badges_query = f"""
+            (SELECT {badges_column} FROM user_badges ub
+             JOIN badges b ON ub.badge_id = b.id
+             WHERE ub.user_id = u.id)
         """
         
-        where_conditions = []
         params = []
-        
-        if action_type != 'all':
-            where_conditions.append("ea.type = ?")
-            params.append(action_type)
-            
-        if period == 'week':
-            where_conditions.append("ea.created_at >= date('now', '-7 days')")
-        elif period == 'month':
-            where_conditions.append("ea.created_at >= date('now', '-1 month')")
-        elif period == 'year':
-            where_conditions.append("ea.created_at >= date('now', '-1 year')")
-        
-        if where_conditions:
-            base_query += " WHERE " + " AND ".join(where_conditions)
-            
-        base_query += """
-            GROUP BY u.id, u.username, u.created_at
-            ORDER BY total_points DESC, total_actions DESC
-            LIMIT ?
-        """
+        since = period_start(period)
+        if since:
+            # Windowed rankings aggregate the daily rollups (at most one row
+            # per user, type and day) instead of the raw eco actions
+            where_conditions = ["d.day >= ?"]
+            params.append(since)
+            if action_type != 'all':
+                where_conditions.append("d.type = ?")
+                params.append(action_type)
+            base_query = f"""
+                SELECT 
+                    u.id,
+                    u.username,
+                    SUM(d.points) as total_points,
+                    SUM(d.action_count) as total_actions,
+                    u.created_at,
+                    {badges_query} as badges
+                FROM daily_user_stats d
+                JOIN users u ON u.id = d.user_id
+                WHERE {" AND ".join(where_conditions)}
+                GROUP BY u.id, u.username, u.created_at
+                HAVING SUM(d.action_count) > 0
+                ORDER BY total_points DESC, total_actions DESC
+                LIMIT ?
+            """
+        else:
+            # All-time rankings read the per-user totals kept by the write path
+            if action_type != 'all':
+                stats_join = 'JOIN user_type_stats s ON s.user_id = u.id AND s.type = ?'
+                params.append(action_type)
+            else:
+                stats_join = 'LEFT JOIN user_stats s ON s.user_id = u.id'
+            base_query = f"""
+                SELECT 
+                    u.id,
+                    u.username,
+                    COALESCE(s.total_points, 0) as total_points,
+                    COALESCE(s.action_count, 0) as total_actions,
+                    u.created_at,
+                    {badges_query} as badges
+                FROM users u
+                {stats_join}
+                ORDER BY total_points DESC, total_actions DESC
+                LIMIT ?
+            """
         params.append(limit)
         
         cursor.execute(base_query, params)
         rows = cursor.fetchall()
         
-        leaderboard = []
+        ranking = []
         for i, row in enumerate(rows):
             user_data = {
                 'rank': i + 1,
@@ -678,42 +711,20 @@ def get_leaderboard():
                 'actions': row[3],
                 'join_date': row[4],
                 'badges': row[5].split(',') if row[5] else [],
-                'avatar': f'https://via.placeholder.com/80?text={row[1][0].upper()}'
+                'avatar': f'https://via.placeholder.com/80?text={row[1][0].upper()}',
+                'level': leaderboard_level(row[2])
             }
-            
-            if user_data['points'] >= 1000:
-                user_data['level'] = 'Еко легенда'
-            elif user_data['points'] >= 750:
-                user_data['level'] = 'Еко майстор'
-            elif user_data['points'] >= 500:
-                user_data['level'] = 'Еко експерт'
-            elif user_data['points'] >= 300:
-                user_data['level'] = 'Еко активист'
-            elif user_data['points'] >= 150:
-                user_data['level'] = 'Еко ентусиаст'
-            else:
-                user_data['level'] = 'Еко новак'
-                
-            leaderboard.append(user_data)
-        
-        # Get total statistics
-        cursor.execute('SELECT COUNT(*) FROM users')
-        total_users = cursor.fetchone()[0]
-        
-        cursor.execute('SELECT COUNT(*) FROM eco_actions WHERE approved = TRUE')
-        total_actions = cursor.fetchone()[0]
-        
-        cursor.execute('SELECT SUM(points) FROM eco_actions WHERE approved = TRUE')
-        total_points = cursor.fetchone()[0] or 0
+            ranking.append(user_data)
         
+        stats = stats_service.platform_stats(conn, with_totals=True)
         conn.close()
         
         return jsonify({
-            'leaderboard': leaderboard,
+            'leaderboard': ranking,
             'statistics': {
-                'total_users': total_users,
-                'total_actions': total_actions,
-                'total_points': total_points
+                'total_users': stats['total_users'],
+                'total_actions': stats['total_actions'],
+                'total_points': stats['total_points']
             },
             'period': period,
             'type': action_type
@@ -723,35 +734,26 @@ def get_leaderboard():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/stats', methods=['GET'])
+@response_cache.cached(ttl=30, tags=('platform_counters',))
 def get_stats():
     """Get platform statistics"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Count locations
-    cursor.execute('SELECT COUNT(*) FROM locations WHERE approved = TRUE')
-    locations_count = cursor.fetchone()[0]
-    
-    # Count eco actions (trees planted)
-    cursor.execute('SELECT COUNT(*) FROM eco_actions WHERE approved = TRUE AND type = "tree"')
-    trees_count = cursor.fetchone()[0]
-    
-    # Count active users (simplified)
-    cursor.execute('SELECT COUNT(DISTINCT user_id) FROM eco_actions WHERE approved = TRUE')
-    users_count = cursor.fetchone()[0]
-    
+    conn = get_read_db_connection()
+    stats = stats_service.platform_stats(conn)
     conn.close()
     
-    return jsonify({
-        'locations': locations_count,
-        'trees': trees_count,
-        'users': users_count
-    })
+    return jsonify(stats_payload(stats))
+
+def stats_payload(stats):
+    return {
+        'locations': stats['total_locations'],
+        'trees': stats['eco_actions'].get('tree', {}).get('count', 0),
+        'users': stats['active_users']
+    }
 
 @app.route('/api/user/<int:user_id>/profile', methods=['GET'])
 def get_user_profile(user_id):
     """Get user profile with stats and badges"""
-    conn = get_db_connection()
+    conn = get_read_db_connection()
     cursor = conn.cursor()
     
     # Get user info
@@ -762,8 +764,7 @@ def get_user_profile(user_id):
         return jsonify({'error': 'User not found'}), 404
     
     # Get user's eco actions count
-    cursor.execute('SELECT COUNT(*) FROM eco_actions WHERE user_id = ? AND approved = TRUE', (user_id,))
-    actions_count = cursor.fetchone()[0]
+    actions_count = repository.get_user_stats(conn, user_id)['action_count']
     
     # Get user's badges
     cursor.execute('''
@@ -813,6 +814,15 @@ def bad_request(error):
         'timestamp': datetime.now().isoformat()
     }), 400
 
+@app.errorhandler(pagination.InvalidCursor)
+def invalid_cursor(error):
+    return jsonify({
+        'error': 'Bad Request',
+        'message': str(error),
+        'status_code': 400,
+        'timestamp': datetime.now().isoformat()
+    }), 400
+
 @app.errorhandler(401)
 def unauthorized(error):
     return jsonify({
@@ -871,6 +881,14 @@ def handle_unexpected_error(error):
         'timestamp': datetime.now().isoformat()
     }), 500
 
+# Auth bookkeeping writes, deferred through write_queue
+INSERT_SESSION = '''
+    INSERT INTO user_sessions (user_id, session_token, expires_at)
+    VALUES (?, ?, ?)
+'''
+
+UPDATE_LAST_LOGIN = 'UPDATE users SET last_login = CURRENT_TIMESTAMP WHERE id = ?'
+
 # Auth routes
 @app.route('/api/auth/register', methods=['POST'])
 def register():
@@ -951,12 +969,11 @@ def register():
         # Create new user
         hashed_password = generate_password_hash(password)
         
-        cursor.execute('''
+        user_id = repository.insert_returning_id(conn, '''
             INSERT INTO users (username, email, password_hash, role, profile_picture, points)
             VALUES (?, ?, ?, ?, ?, ?)
         ''', (username, email, hashed_password, role, profile_picture_path, 0))
-        
-        user_id = cursor.lastrowid
+        repository.user_changed(conn, user_id)
         
         # Create session token
         session_token = jwt.encode({
@@ -964,13 +981,11 @@ def register():
             'exp': datetime.now() + timedelta(days=7)  # 7 days expiry
         }, app.config['SECRET_KEY'], algorithm='HS256')
         
-        # Store session in database
-        expires_at = datetime.now() + timedelta(days=7)
-        cursor.execute('''
-            INSERT INTO user_sessions (user_id, session_token, expires_at)
-            VALUES (?, ?, ?)
-        ''', (user_id, session_token, expires_at))
+        conn.commit()
         
+        # Store session in database (bookkeeping only, the JWT is what authenticates)
+        expires_at = datetime.now() + timedelta(days=7)
+        write_queue.defer(conn, INSERT_SESSION, (user_id, session_token, expires_at))
         conn.commit()
         conn.close()
         
@@ -1026,8 +1041,8 @@ def login():
             conn.close()
             return jsonify({'success': False, 'message': 'Invalid email or password'}), 401
         
-        # Update last login
-        cursor.execute('UPDATE users SET last_login = CURRENT_TIMESTAMP WHERE id = ?', (user[0],))
+        # Update last login (group-committed in the background)
+        write_queue.defer(conn, UPDATE_LAST_LOGIN, (user[0],))
         
         # Create session token
         session_token = jwt.encode({
@@ -1038,10 +1053,7 @@ def login():
         
         # Store session in database
         expires_at = datetime.now() + timedelta(days=7)
-        cursor.execute('''
-            INSERT INTO user_sessions (user_id, session_token, expires_at)
-            VALUES (?, ?, ?)
-        ''', (user[0], session_token, expires_at))
+        write_queue.defer(conn, INSERT_SESSION, (user[0], session_token, expires_at))
         
         conn.commit()
         conn.close()
@@ -1074,6 +1086,9 @@ def logout():
         
         token = auth_header.replace('Bearer ', '')
         
+        # A session row written moments ago may still be queued
+        write_queue.flush(timeout=1)
+        
         conn = get_db_connection()
         cursor = conn.cursor()
         
@@ -1128,8 +1143,7 @@ def get_profile():
             return jsonify({'success': False, 'message': 'User not found'}), 401
         
         # Get user's eco actions count
-        cursor.execute('SELECT COUNT(*) FROM eco_actions WHERE user_id = ? AND approved = TRUE', (user_id,))
-        actions_count = cursor.fetchone()[0]
+        actions_count = repository.get_user_stats(conn, user_id)['action_count']
         
         # Get user's badges
         cursor.execute('''
@@ -1214,17 +1228,16 @@ def get_all_users():
         if user_role != 'admin':
             return jsonify({'success': False, 'message': 'Admin access required'}), 403
         
+        limit, after = pagination.page_args(request.args, default_limit=None)
         conn = get_db_connection()
-        cursor = conn.cursor()
         
-        cursor.execute('''
+        rows, next_cursor = pagination.fetch_page(conn, '''
             SELECT id, username, email, role, profile_picture, points, is_active, created_at, last_login
             FROM users
-            ORDER BY created_at DESC
-        ''')
+        ''', (), (), after, limit, created_index=7)
         
         users = []
-        for row in cursor.fetchall():
+        for row in rows:
             users.append({
                 'id': row[0],
                 'username': row[1],
@@ -1237,14 +1250,20 @@ def get_all_users():
                 'last_login': row[8]
             })
         
+        total_count = len(users)
+        if limit is not None:
+            total_count = repository.fetch_value(conn, 'SELECT COUNT(*) FROM users', default=0)
         conn.close()
         
         return jsonify({
             'success': True,
             'users': users,
-            'total_count': len(users)
+            'total_count': total_count,
+            'next_cursor': next_cursor
         }), 200
         
+    except pagination.InvalidCursor as e:
+        return invalid_cursor(e)
     except Exception as e:
         print(f"Admin users error: {e}")
         return jsonify({'success': False, 'message': 'Failed to get users'}), 500
@@ -1302,18 +1321,9 @@ def toggle_user_status(user_id):
 def get_pending_locations():
     """Get locations waiting for approval"""
     conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT l.id, l.name, l.description, l.type, l.created_at, u.username
-        FROM locations l
-        LEFT JOIN users u ON l.user_id = u.id
-        WHERE l.approved = FALSE
-        ORDER BY l.created_at DESC
-    ''')
     
     pending = []
-    for row in cursor.fetchall():
+    for row in repository.list_pending_locations(conn):
         pending.append({
             'id': row[0],
             'name': row[1],
@@ -1330,9 +1340,8 @@ def get_pending_locations():
 def approve_location(location_id):
     """Approve a pending location"""
     conn = get_db_connection()
-    cursor = conn.cursor()
     
-    cursor.execute('UPDATE locations SET approved = TRUE WHERE id = ?', (location_id,))
+    repository.approve_location(conn, location_id)
     conn.commit()
     conn.close()
     
@@ -1340,35 +1349,44 @@ def approve_location(location_id):
 
 # Sofia Redesign API Endpoints
 @app.route('/api/redesigns', methods=['GET'])
+@response_cache.cached(ttl=60, tags=('sofia_redesigns',))
 def get_redesigns():
-    """Get all Sofia redesigns"""
+    """Get Sofia redesigns (all of them unless ?limit= / ?cursor= is given)"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM sofia_redesigns ORDER BY created_at DESC')
-        redesigns = []
-        for row in cursor.fetchall():
-            redesigns.append({
-                'id': row[0],
-                'type': row[1],
-                'geometry': json.loads(row[2]),
-                'coordinates': json.loads(row[3]),
-                'description': row[4],
-                'created_at': row[5]
-            })
-        
+        limit, after = pagination.page_args(request.args, default_limit=None)
+        conn = get_read_db_connection()
+        redesigns, next_cursor = redesigns_page(conn, limit, after)
         conn.close()
-        return jsonify(redesigns)
+        return paged_response(redesigns, next_cursor)
+    except pagination.InvalidCursor as e:
+        return invalid_cursor(e)
     except Exception as e:
         print(f"Error getting redesigns: {e}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+def redesigns_page(conn, limit=None, after=None):
+    """(redesigns, next_cursor), newest first"""
+    rows, next_cursor = pagination.fetch_page(
+        conn, 'SELECT id, type, geometry, coordinates, description, created_at FROM sofia_redesigns',
+        (), (), after, limit
+    )
+    redesigns = []
+    for row in rows:
+        redesigns.append({
+            'id': row[0],
+            'type': row[1],
+            'geometry': json.loads(row[2]),
+            'coordinates': json.loads(row[3]),
+            'description': row[4],
+            'created_at': row[5]
+        })
+    return redesigns, next_cursor
+
 @app.route('/api/redesigns', methods=['POST'])
 def add_redesign():
     """Add new Sofia redesign"""
     try:
         conn = get_db_connection()
-        cursor = conn.cursor()
         data = request.get_json()
         
         redesign_type = data.get('type')
@@ -1376,13 +1394,12 @@ def add_redesign():
         coordinates = json.dumps(data.get('coordinates'))
         description = data.get('description', '')
         
-        cursor.execute(
+        redesign_id = repository.insert_returning_id(
+            conn,
             'INSERT INTO sofia_redesigns (type, geometry, coordinates, description) VALUES (?, ?, ?, ?)',
             (redesign_type, geometry, coordinates, description)
         )
         conn.commit()
-        
-        redesign_id = cursor.lastrowid
         conn.close()
         
         return jsonify({
@@ -1457,159 +1474,178 @@ def clear_all_redesigns():
         print(f"Error clearing redesigns: {e}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+# ==================== EXPORTS ====================
+# Full dumps for partners, streamed row by row (see exporter.py)
+@app.route('/api/export/<dataset>.<any(ndjson, csv):fmt>', methods=['GET'])
+def export_dataset(dataset, fmt):
+    """Stream approved eco actions or locations as NDJSON or CSV"""
+    gzip = request.args.get('gzip', '').lower() in ('1', 'true', 'yes')
+    try:
+        chunks = exporter.stream_export(
+            dataset, fmt,
+            since=request.args.get('since'),
+            until=request.args.get('until'),
+            action_type=request.args.get('type'),
+            gzip=gzip
+        )
+    except exporter.ExportError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    response = Response(chunks, mimetype='application/gzip' if gzip else exporter.FORMATS[fmt])
+    response.headers['Content-Disposition'] = (
+        f'attachment; filename="{exporter.export_filename(dataset, fmt, gzip)}"'
+    )
+    return response
+
+# ==================== ANALYTICS ====================
+# Chart data computed over the in-memory columnar snapshot (see analytics.py)
+ANALYTICS_MAX_BINS = 100
+
+def analytics_columns():
+    """(columns, types) filtered by ?since=YYYY-MM-DD and ?type="""
+    since = analytics.parse_since(request.args.get('since'))
+    conn = get_read_db_connection()
+    try:
+        return analytics.get_columns(conn, since, request.args.get('type'))
+    finally:
+        conn.close()
+
+def analytics_response(build):
+    try:
+        return jsonify(build())
+    except analytics.AnalyticsUnavailable as e:
+        return jsonify({'error': str(e)}), 503
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/api/analytics/points-distribution', methods=['GET'])
+@response_cache.cached(ttl=60, tags=('eco_actions',))
+def analytics_points_distribution():
+    """Histogram and percentiles of points per user"""
+    bins = min(max(request.args.get('bins', 20, type=int), 1), ANALYTICS_MAX_BINS)
+    return analytics_response(lambda: analytics.points_distribution(analytics_columns()[0], bins))
+
+@app.route('/api/analytics/activity-heatmap', methods=['GET'])
+@response_cache.cached(ttl=60, tags=('eco_actions',))
+def analytics_activity_heatmap():
+    """Approved actions per weekday and hour"""
+    return analytics_response(lambda: analytics.activity_heatmap(analytics_columns()[0]))
+
+@app.route('/api/analytics/type-mix', methods=['GET'])
+@response_cache.cached(ttl=60, tags=('eco_actions',))
+def analytics_type_mix():
+    """Actions and points per type over time (?bucket=day|week|month)"""
+    bucket = request.args.get('bucket', 'week')
+    return analytics_response(lambda: analytics.type_mix(*analytics_columns(), bucket))
+
 # ==================== AMBEE API ENDPOINTS ====================
+# Lookups in and around Sofia are served from the prefetched grid cells
+if ambee_prefetch.AMBEE_PREFETCH_ENABLED:
+    ambee_prefetch.install()
 
 @app.route('/api/air-quality', methods=['GET'])
 def get_air_quality():
     """Get air quality data from Ambee API"""
+    lat = request.args.get('lat', 42.6977)  # Default to Sofia
+    lon = request.args.get('lon', 23.3219)
+    return jsonify(ambee.air_quality(lat, lon))
+
+@app.route('/api/air-quality/history', methods=['GET'])
+@response_cache.cached(ttl=60, tags=aq_history.TABLES)
+def get_air_quality_history():
+    """Downsampled air quality history for the cell around lat/lon
+
+    ?from= / ?to= take epoch seconds, YYYY-MM-DD or ISO datetimes (default:
+    the last 24 hours); ?resolution=auto|raw|hour|day; ?metrics=aqi,pm25
+    """
+    lat = request.args.get('lat', 42.6977)  # Default to Sofia
+    lon = request.args.get('lon', 23.3219)
     try:
-        lat = request.args.get('lat', 42.6977)  # Default to Sofia
-        lon = request.args.get('lon', 23.3219)
-        
-        print(f"Fetching air quality data for lat: {lat}, lon: {lon}")
-        
-        # Make request to Ambee API
-        url = f"{AMBEE_BASE_URL}/latest/by-lat-lng"
-        headers = {
-            'x-api-key': AMBEE_API_KEY,
-            'Content-type': 'application/json'
-        }
-        params = {
-            'lat': lat,
-            'lng': lon
-        }
-        
-        response = requests.get(url, headers=headers, params=params, timeout=10)
-        
-        if response.status_code == 200:
-            data = response.json()
-            print(f"Air quality data received: {data}")
-            return jsonify({
-                'status': 'success',
-                'data': data,
-                'source': 'ambee_api'
-            })
-        else:
-            print(f"Ambee API error: {response.status_code}")
-            # Return fallback data for Sofia
-            return jsonify({
-                'status': 'success',
-                'data': {
-                    'message': 'success',
-                    'stations': [{
-                        'AQI': 44,
-                        'PM25': 8.177,
-                        'PM10': 20.523,
-                        'NO2': 7.497,
-                        'OZONE': 22.803,
-                        'CO': 1.072,
-                        'SO2': 0.816,
-                        'city': 'Sofia',
-                        'countryCode': 'BG',
-                        'updatedAt': datetime.now().isoformat()
-                    }]
-                },
-                'source': 'fallback'
-            })
-            
-    except Exception as e:
-        print(f"Error fetching air quality data: {e}")
-        return jsonify({
-            'status': 'success',
-            'data': {
-                'message': 'success',
-                'stations': [{
-                    'AQI': 44,
-                    'PM25': 8.177,
-                    'PM10': 20.523,
-                    'NO2': 7.497,
-                    'OZONE': 22.803,
-                    'CO': 1.072,
-                    'SO2': 0.816,
-                    'city': 'Sofia',
-                    'countryCode': 'BG',
-                    'updatedAt': datetime.now().isoformat()
-                }]
-            },
-            'source': 'fallback'
-        })
+        cell = ambee.AIR_QUALITY_CACHE.cell_for(lat, lon)
+        end = aq_history.parse_time(request.args.get('to'), time.time())
+        start = aq_history.parse_time(request.args.get('from'), end - aq_history.DAY)
+        metrics = request.args.get('metrics')
+        metrics = tuple(metrics.split(',')) if metrics else aq_history.METRICS
+        try:
+            aq_history.maintain()
+        except Exception as e:
+            # e.g. "database is locked"; the next call or prefetch round catches up
+            print(f"Air quality history maintenance failed: {e}")
+        return jsonify(aq_history.history(get_read_db_connection(), cell, start, end,
+                                          request.args.get('resolution', 'auto'), metrics))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
 @app.route('/api/weather', methods=['GET'])
 def get_weather():
     """Get weather data from Ambee API"""
+    lat = request.args.get('lat', 42.6977)  # Default to Sofia
+    lon = request.args.get('lon', 23.3219)
+    return jsonify(ambee.weather(lat, lon))
+
+@app.route('/api/environment', methods=['GET'])
+def get_environment():
+    """Air quality and weather for the same point in one call"""
+    lat = request.args.get('lat', 42.6977)  # Default to Sofia
+    lon = request.args.get('lon', 23.3219)
+    payload = ambee.environment(lat, lon)
+    payload['timestamp'] = datetime.now().isoformat()
+    return jsonify(payload)
+
+# ==================== HOME PAGE BOOTSTRAP ====================
+# Everything the home page used to fetch in separate requests. The Ambee
+# calls run concurrently on ambee's shared thread pool while the DB parts are
+# served from the response cache over a single connection.
+BOOTSTRAP_EXTERNAL_TIMEOUT = float(os.getenv('BOOTSTRAP_EXTERNAL_TIMEOUT', '12'))
+
+_sofia_data = (None, None)  # (mtime, parsed sofia_data.json)
+
+def load_sofia_data():
+    """sofia_data.json, re-read only when the file changes"""
+    global _sofia_data
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sofia_data.json')
     try:
-        lat = request.args.get('lat', 42.6977)  # Default to Sofia
-        lon = request.args.get('lon', 23.3219)
-        
-        print(f"Fetching weather data for lat: {lat}, lon: {lon}")
-        
-        # Make request to Ambee API
-        url = f"{AMBEE_BASE_URL}/weather/latest/by-lat-lng"
-        headers = {
-            'x-api-key': AMBEE_API_KEY,
-            'Content-type': 'application/json'
-        }
-        params = {
-            'lat': lat,
-            'lng': lon
-        }
-        
-        response = requests.get(url, headers=headers, params=params, timeout=10)
-        
-        if response.status_code == 200:
-            data = response.json()
-            print(f"Weather data received: {data}")
-            
-            # Convert temperature from Fahrenheit to Celsius if needed
-            if 'data' in data and 'temperature' in data['data']:
-                temp_f = data['data']['temperature']
-                if temp_f:
-                    temp_c = (temp_f - 32) * 5/9
-                    data['data']['temperatureC'] = round(temp_c, 1)
-                    data['data']['temperatureF'] = temp_f
-                    print(f"Temperature converted: {temp_f}°F = {temp_c:.1f}°C")
-            
-            return jsonify({
-                'status': 'success',
-                'data': data,
-                'source': 'ambee_api'
-            })
-        else:
-            print(f"Ambee Weather API error: {response.status_code}")
-            # Return fallback weather data for Sofia
-            return jsonify({
-                'status': 'success',
-                'data': {
-                    'data': {
-                        'temperature': 41,  # Fahrenheit (5°C)
-                        'temperatureC': 5,  # Celsius  
-                        'temperatureF': 41, # Fahrenheit
-                        'humidity': 78,
-                        'windSpeed': 2.1,
-                        'visibility': 6500,
-                        'pressure': 1018.5
-                    }
-                },
-                'source': 'fallback'
-            })
-            
-    except Exception as e:
-        print(f"Error fetching weather data: {e}")
-        return jsonify({
-            'status': 'success',
-            'data': {
-                'data': {
-                    'temperature': 41,  # Fahrenheit (5°C)
-                    'temperatureC': 5,  # Celsius
-                    'temperatureF': 41, # Fahrenheit
-                    'humidity': 78,
-                    'windSpeed': 2.1,
-                    'visibility': 6500,
-                    'pressure': 1018.5
-                }
-            },
-            'source': 'fallback'
-        })
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    if _sofia_data[0] != mtime:
+        with open(path, encoding='utf-8') as f:
+            _sofia_data = (mtime, json.load(f))
+    return _sofia_data[1]
+
+@app.route('/api/bootstrap', methods=['GET'])
+def get_bootstrap():
+    """Home page data in one round trip"""
+    lat = request.args.get('lat', 42.6977)  # Default to Sofia
+    lon = request.args.get('lon', 23.3219)
+    
+    # External calls first so they overlap with the DB work
+    deadline = time.monotonic() + BOOTSTRAP_EXTERNAL_TIMEOUT
+    external = ambee.submit_environment(lat, lon)
+    
+    conn = get_read_db_connection()
+    stats = stats_service.platform_stats(conn)
+    payload = {
+        'charity_stats': charity_payload(stats),
+        'eco_actions': response_cache.cached_value(
+            'bootstrap.eco_actions', lambda: eco_actions_page(conn)[0], ttl=30, tags=('eco_actions',)),
+        'locations': response_cache.cached_value(
+            'bootstrap.locations', lambda: locations_page(conn)[0], ttl=60, tags=('locations',)),
+        'redesigns': response_cache.cached_value(
+            'bootstrap.redesigns', lambda: redesigns_page(conn)[0], ttl=60, tags=('sofia_redesigns',)),
+        'sofia_data': load_sofia_data()
+    }
+    conn.close()
+    
+    # Same shape as /api/environment: fallbacks for late sides, listed in `missing`
+    results, missing = ambee.collect_environment(external, deadline - time.monotonic())
+    if missing:
+        print(f"Bootstrap: {', '.join(missing)} timed out, using fallback")
+    payload.update(results)
+    payload['partial'] = bool(missing)
+    payload['missing'] = missing
+    payload['timestamp'] = datetime.now().isoformat()
+    return jsonify(payload)
 
 @app.route('/video/<filename>')
 def serve_video(filename):
@@ -1662,12 +1698,13 @@ def chat():
     if not GENAI_AVAILABLE:
         return jsonify({'error': 'AI chat not available. Google Generative AI not installed.'}), 503
 
-    if GEMINI_MODEL is None:
+    model = get_gemini_model()
+    if model is None:
         return jsonify({'error': 'Gemini model not configured. Set GENAI_API_KEY in environment.'}), 500
 
     try:
         # Use the model to generate a completion
-        response = GEMINI_MODEL.generate_content(user_message)
+        response = model.generate_content(user_message)
         # .text holds the text reply in the current client
         ai_reply = getattr(response, 'text', None) or response.get('output', {}).get('text', '')
         return jsonify({'reply': ai_reply})
@@ -1696,7 +1733,7 @@ def translate_text():
     if not GOOGLE_TRANSLATE_AVAILABLE:
         return jsonify({
             'success': False,
-            'error': 'Google Translate not available. Please install googletrans library.'
+            'error': 'Google Translate not available. Please install beautifulsoup4.'
         }), 503
     
     try:
@@ -1715,13 +1752,10 @@ def translate_text():
         if target_lang not in ['en', 'bg']:
             return jsonify({'success': False, 'error': 'Target language must be "en" or "bg"'}), 400
         
-        # Initialize translator
-        translator = GoogleTranslator(source='auto', target=target_lang)
-        
         print(f"Translating: '{text[:50]}...' from auto to {target_lang}")
         
         # Perform translation
-        result = translator.translate(text)
+        result = google_translate.translate(text, target_lang)
         
         if result:
             return jsonify({
@@ -1786,8 +1820,6 @@ def translate_batch():
         if target_lang not in ['en', 'bg']:
             return jsonify({'success': False, 'error': 'Target language must be "en" or "bg"'}), 400
         
-        # Initialize translator
-        translator = GoogleTranslator(source='auto', target=target_lang)
         translations = []
         
         print(f"Batch translating {len(texts)} texts to {target_lang}")
@@ -1803,7 +1835,7 @@ def translate_batch():
                     })
                     continue
                 
-                result = translator.translate(text.strip())
+                result = google_translate.translate(text, target_lang)
                 
                 if result:
                     translations.append({
@@ -1886,8 +1918,6 @@ def translate_page_content():
         if target_lang not in ['en', 'bg']:
             return jsonify({'success': False, 'error': 'Target language must be "en" or "bg"'}), 400
         
-        # Initialize translator
-        translator = GoogleTranslator(source='auto', target=target_lang)
         translations = {}
         
         print(f"Translating page elements to {target_lang}")
@@ -1899,7 +1929,7 @@ def translate_page_content():
                     translations[key] = text
                     continue
                 
-                result = translator.translate(text.strip())
+                result = google_translate.translate(text, target_lang)
                 
                 if result:
                     translations[key] = result
@@ -1936,8 +1966,10 @@ def create_app():
         format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
     )
     
-    # Initialize database
-    init_db()
+    # Version-checked: a no-op once `python scripts.py db:init` has run
+    if os.getenv('AUTO_BOOTSTRAP', 'true').lower() == 'true':
+        if bootstrap.bootstrap():
+            print("✓ Database bootstrapped")
     
     return app
 
@@ -1966,9 +1998,14 @@ if __name__ == '__main__':
     print(f"Press Ctrl+C to stop server")
     print("="*50 + "\n")
     
+    # One prefetcher per server: skip the debug reloader's watcher process
+    debug = os.getenv('FLASK_DEBUG', 'True').lower() == 'true'
+    if ambee_prefetch.AMBEE_PREFETCH_ENABLED and (not debug or os.environ.get('WERKZEUG_RUN_MAIN')):
+        ambee_prefetch.start()
+    
     try:
         app.run(
-            debug=os.getenv('FLASK_DEBUG', 'True').lower() == 'true', 
+            debug=debug, 
             host=os.getenv('HOST', '0.0.0.0'), 
             port=int(os.getenv('PORT', '5000')),
             threaded=True  # Express.js-style concurrent request handling
@@ -1978,6 +2015,7 @@ if __name__ == '__main__':
     except Exception as e:
         print(f"\nServer error: {e}")
     finally:
+        write_queue.shutdown()
         print("Goodbye!")
         
 # Export app for deployment (like module.exports in Express.js)
@@ -0,0 +1,236 @@
+# Air quality history (like a small time-series store behind an Express.js charts API)
+#
+# Every air quality reading fetched from Ambee is appended to aq_samples,
+# one row per geohash cell and observation time (the station's updatedAt,
+# so refetching an unchanged reading adds nothing). maintain() rolls
+# completed hours into aq_hourly and completed days into aq_daily as
+# sample-weighted averages, then drops rows past their retention:
+#
+#   aq_samples  raw readings     AQ_RAW_RETENTION_DAYS     (default 7)
+#   aq_hourly   hourly averages  AQ_HOURLY_RETENTION_DAYS  (default 90)
+#   aq_daily    daily averages   AQ_DAILY_RETENTION_DAYS   (default 1825)
+#
+# history() reads the finest table that still covers the range and
+# averages it into at most AQ_HISTORY_MAX_POINTS buckets in SQL, so the
+# payload stays the same size however long the range is.
+import math
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+import db_pool
+import repository
+import write_queue
+
+AQ_RAW_RETENTION_DAYS = float(os.getenv('AQ_RAW_RETENTION_DAYS', '7'))
+AQ_HOURLY_RETENTION_DAYS = float(os.getenv('AQ_HOURLY_RETENTION_DAYS', '90'))
+AQ_DAILY_RETENTION_DAYS = float(os.getenv('AQ_DAILY_RETENTION_DAYS', '1825'))
+AQ_HISTORY_MAX_POINTS = int(os.getenv('AQ_HISTORY_MAX_POINTS', '500'))
+AQ_MAINTAIN_INTERVAL = float(os.getenv('AQ_MAINTAIN_INTERVAL', '600'))
+
+HOUR = 3600
+DAY = 86400
+# Rollups recompute this far back so late readings still land in their hour / day
+ROLLUP_LOOKBACK = DAY
+
+METRICS = ('aqi', 'pm25', 'pm10', 'no2', 'o3', 'co', 'so2')
+STATION_KEYS = {'aqi': 'AQI', 'pm25': 'PM25', 'pm10': 'PM10', 'no2': 'NO2', 'o3': 'OZONE',
+                'co': 'CO', 'so2': 'SO2'}
+TABLES = ('aq_samples', 'aq_hourly', 'aq_daily')
+
+# resolution -> (table, time column, weight per row, smallest step in seconds)
+RESOLUTIONS = {
+    'raw': ('aq_samples', 'ts', '1', 1),
+    'hour': ('aq_hourly', 'bucket', 'samples', HOUR),
+    'day': ('aq_daily', 'bucket', 'samples', DAY),
+}
+
+COLUMNS = ', '.join(METRICS)
+
+INSERT_SAMPLE = f'''
+    INSERT OR IGNORE INTO aq_samples (cell, ts, {COLUMNS})
+    VALUES (?, ?, {', '.join('?' for _ in METRICS)})
+'''
+
+def _weighted(metric, weight):
+    """Average of a metric over rows that carry `weight` samples each, ignoring NULLs"""
+    return f'SUM({metric} * {weight}) / SUM(CASE WHEN {metric} IS NOT NULL THEN {weight} END)'
+
+def _rollup_sql(target, source, column, weight, size):
+    bucket = f'{column} - {column} % {size}'
+    return f'''
+        INSERT INTO {target} (cell, bucket, samples, {COLUMNS})
+        SELECT cell, {bucket}, SUM({weight}), {', '.join(_weighted(m, weight) for m in METRICS)}
+        FROM {source}
+        WHERE {column} >= ? AND {column} < ?
+        GROUP BY cell, {bucket}
+        ON CONFLICT (cell, bucket) DO UPDATE SET samples = excluded.samples,
+            {', '.join(f'{m} = excluded.{m}' for m in METRICS)}
+    '''
+
+ROLLUP_HOURLY = _rollup_sql('aq_hourly', 'aq_samples', 'ts', '1', HOUR)
+ROLLUP_DAILY = _rollup_sql('aq_daily', 'aq_hourly', 'bucket', 'samples', DAY)
+
+# ==================== RECORDING ====================
+def _number(value):
+    if isinstance(value, dict):
+        value = value.get('concentration', value.get('value'))
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def _observed_at(value):
+    """Epoch seconds of an ISO timestamp (UTC unless it says otherwise), or None"""
+    if not isinstance(value, str) or not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+def sample_params(cell, data, fetched_at=None):
+    """INSERT_SAMPLE parameters for an Ambee air quality response, or None if it has no readings"""
+    stations = data.get('stations') if isinstance(data, dict) else None
+    if not stations or not isinstance(stations[0], dict):
+        return None
+    station = stations[0]
+    values = [_number(station.get(STATION_KEYS[metric])) for metric in METRICS]
+    if all(value is None for value in values):
+        return None
+    ts = _observed_at(station.get('updatedAt')) or int(fetched_at or time.time())
+    return (cell, ts, *values)
+
+def record(cell, data, fetched_at=None):
+    """Append a reading for a cell through the write queue; False if the response had none"""
+    params = sample_params(cell, data, fetched_at)
+    if params is None:
+        return False
+    if write_queue.WRITE_QUEUE_ENABLED:
+        write_queue.get_write_queue().submit(INSERT_SAMPLE, params)
+    else:
+        with db_pool.get_pool().connection() as conn:
+            conn.cursor().execute(INSERT_SAMPLE, params)
+            conn.commit()
+    return True
+
+# ==================== DOWNSAMPLING ====================
+_maintain_lock = threading.Lock()
+_maintained_at = 0.0
+
+def rollup(conn, now=None):
+    """Roll completed hours into aq_hourly and completed days into aq_daily (caller commits)"""
+    now = int(now or time.time())
+    cursor = conn.cursor()
+    counts = {}
+    for name, sql, source, column, target, size in (
+            ('hourly', ROLLUP_HOURLY, 'aq_samples', 'ts', 'aq_hourly', HOUR),
+            ('daily', ROLLUP_DAILY, 'aq_hourly', 'bucket', 'aq_daily', DAY)):
+        done = repository.fetch_value(conn, f'SELECT MAX(bucket) FROM {target}')
+        start = repository.fetch_value(conn, f'SELECT MIN({column}) FROM {source}') if done is None \
+            else int(done) - ROLLUP_LOOKBACK
+        end = now - now % size
+        if start is None or start >= end:
+            counts[name] = 0
+            continue
+        cursor.execute(sql, (int(start) - int(start) % size, end))
+        counts[name] = max(cursor.rowcount, 0)
+    return counts
+
+def apply_retention(conn, now=None):
+    """Delete rows older than each table's retention (caller commits)"""
+    now = int(now or time.time())
+    cursor = conn.cursor()
+    deleted = {}
+    for table, column, days in (('aq_samples', 'ts', AQ_RAW_RETENTION_DAYS),
+                                ('aq_hourly', 'bucket', AQ_HOURLY_RETENTION_DAYS),
+                                ('aq_daily', 'bucket', AQ_DAILY_RETENTION_DAYS)):
+        cursor.execute(f'DELETE FROM {table} WHERE {column} < ?', (now - int(days * DAY),))
+        deleted[table] = max(cursor.rowcount, 0)
+    return deleted
+
+def maintain(force=False, now=None):
+    """Roll up and apply retention, at most every AQ_MAINTAIN_INTERVAL seconds per process"""
+    global _maintained_at
+    if not force and time.monotonic() - _maintained_at < AQ_MAINTAIN_INTERVAL:
+        return None
+    if not _maintain_lock.acquire(blocking=False):
+        return None  # another thread is on it
+    try:
+        _maintained_at = time.monotonic()
+        with db_pool.get_pool().connection() as conn:
+            try:
+                result = {'rolled_up': rollup(conn, now), 'deleted': apply_retention(conn, now)}
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        return result
+    finally:
+        _maintain_lock.release()
+
+# ==================== QUERIES ====================
+def parse_time(value, default):
+    """Epoch seconds for epoch digits, 'YYYY-MM-DD' or an ISO datetime; raises ValueError"""
+    if value is None or value == '':
+        return int(default)
+    if value.isdigit():
+        return int(value)
+    parsed = _observed_at(value)
+    if parsed is None:
+        raise ValueError(f'Expected epoch seconds, YYYY-MM-DD or an ISO datetime, got {value!r}')
+    return parsed
+
+def pick_resolution(start, end, now=None):
+    """The finest resolution whose retention still covers `start` and that suits the span"""
+    now = now or time.time()
+    span = end - start
+    if span <= 2 * DAY and start >= now - AQ_RAW_RETENTION_DAYS * DAY:
+        return 'raw'
+    if span <= 60 * DAY and start >= now - AQ_HOURLY_RETENTION_DAYS * DAY:
+        return 'hour'
+    return 'day'
+
+def history(conn, cell, start, end, resolution='auto', metrics=METRICS, max_points=AQ_HISTORY_MAX_POINTS,
+            now=None):
+    """Averaged readings for a cell over [start, end), at most max_points of them"""
+    if end <= start:
+        raise ValueError('`from` must be before `to`')
+    unknown = [metric for metric in metrics if metric not in METRICS]
+    if unknown:
+        raise ValueError(f'Unknown metrics {", ".join(unknown)}; choose from {", ".join(METRICS)}')
+    if resolution == 'auto':
+        resolution = pick_resolution(start, end, now)
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f'resolution must be auto or one of {", ".join(RESOLUTIONS)}')
+    table, column, weight, smallest = RESOLUTIONS[resolution]
+    # Whole multiples of the table's own step, wide enough to stay within max_points
+    step = max(smallest, math.ceil((end - start) / max(max_points - 1, 1) / smallest) * smallest)
+    rows = repository.fetch_all(conn, f'''
+        SELECT {column} - {column} % ? AS t, SUM({weight}),
+               {', '.join(_weighted(metric, weight) for metric in metrics)}
+        FROM {table}
+        WHERE cell = ? AND {column} >= ? AND {column} < ?
+        GROUP BY 1
+        ORDER BY 1
+    ''', (step, cell, start, end))
+    points = []
+    for row in rows:
+        point = {'t': datetime.fromtimestamp(int(row[0]), timezone.utc).isoformat(), 'samples': int(row[1])}
+        for metric, value in zip(metrics, row[2:]):
+            point[metric] = None if value is None else round(float(value), 3)
+        points.append(point)
+    return {
+        'cell': cell,
+        'resolution': resolution,
+        'step_seconds': step,
+        'from': datetime.fromtimestamp(start, timezone.utc).isoformat(),
+        'to': datetime.fromtimestamp(end, timezone.utc).isoformat(),
+        'metrics': list(metrics),
+        'count': len(points),
+        'points': points
+    }
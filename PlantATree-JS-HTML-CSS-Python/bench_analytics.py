@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Analytics Benchmark
+Fills a scratch database with approved eco actions and times each chart
+computed by the equivalent SQL GROUP BY against the NumPy snapshot,
+plus the snapshot's full load and incremental refresh.
+
+Usage: python bench_analytics.py [--rows 1000000] [--users 5000] [--repeat 5]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import analytics
+import repository
+from db_pool import sqlite_factory
+
+TYPES = ('tree', 'clean', 'bike', 'recycle')
+POINTS = {'tree': 15, 'clean': 10, 'bike': 5, 'recycle': 8}
+
+def insert_actions(conn, start_index, rows, users):
+    rng = random.Random(start_index)
+    start = datetime(2023, 1, 1)
+    batch = []
+    for i in range(start_index, start_index + rows):
+        action_type = rng.choice(TYPES)
+        created = start + timedelta(seconds=rng.randrange(3 * 365 * 86400))
+        batch.append((f'action {i}', action_type, POINTS[action_type], rng.randrange(users), True,
+                      created.strftime('%Y-%m-%d %H:%M:%S')))
+        if len(batch) == 50000:
+            conn.executemany('INSERT INTO eco_actions (title, type, points, user_id, approved, created_at) '
+                             'VALUES (?, ?, ?, ?, ?, ?)', batch)
+            batch = []
+    if batch:
+        conn.executemany('INSERT INTO eco_actions (title, type, points, user_id, approved, created_at) '
+                         'VALUES (?, ?, ?, ?, ?, ?)', batch)
+    repository.reconcile_counters(conn)
+    conn.commit()
+
+def prepare(path, rows, users):
+    conn = sqlite_factory(path)()
+    conn.executescript('''
+        CREATE TABLE locations (id INTEGER PRIMARY KEY, type TEXT, approved BOOLEAN, created_at TIMESTAMP);
+        CREATE TABLE eco_actions (id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT, type TEXT,
+                                  points INTEGER, user_id INTEGER, approved BOOLEAN,
+                                  created_at TIMESTAMP);
+        CREATE TABLE platform_counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL DEFAULT 0);
+    ''')
+    insert_actions(conn, 0, rows, users)
+    return conn
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+def sql_points_distribution(conn):
+    totals = sorted(row[0] for row in conn.execute('''
+        SELECT SUM(points) FROM eco_actions WHERE approved = TRUE AND user_id IS NOT NULL GROUP BY user_id
+    '''))
+    return [totals[min(len(totals) - 1, len(totals) * p // 100)] for p in analytics.PERCENTILES]
+
+def sql_activity_heatmap(conn):
+    return conn.execute('''
+        SELECT strftime('%w', created_at), strftime('%H', created_at), COUNT(*)
+        FROM eco_actions WHERE approved = TRUE GROUP BY 1, 2
+    ''').fetchall()
+
+def sql_type_mix(conn):
+    return conn.execute('''
+        SELECT strftime('%Y-%m', created_at), type, COUNT(*), SUM(points)
+        FROM eco_actions WHERE approved = TRUE GROUP BY 1, 2
+    ''').fetchall()
+
+def main():
+    parser = argparse.ArgumentParser(description='SQL GROUP BY vs NumPy snapshot analytics')
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    # Every SQL chart here is a full scan; keep the slow-query log quiet
+    repository.SLOW_QUERY_MS = float('inf')
+
+    print("=" * 60)
+    print("Analytics Benchmark")
+    print("=" * 60)
+    print(f"Rows: {args.rows:,} | Users: {args.users:,} | Repeat: {args.repeat}")
+    print("-" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        load_start = time.perf_counter()
+        conn = prepare(os.path.join(tmp, 'analytics.db'), args.rows, args.users)
+        print(f"Loaded in {time.perf_counter() - load_start:.1f}s")
+
+        snapshot = analytics.ActionSnapshot()
+        start = time.perf_counter()
+        columns, types = snapshot.refresh(conn)
+        print(f"Snapshot full load: {(time.perf_counter() - start) * 1000:.1f}ms")
+
+        insert_actions(conn, args.rows, 1000, args.users)
+        analytics.ANALYTICS_REFRESH_SECONDS = 0
+        start = time.perf_counter()
+        columns, types = snapshot.refresh(conn)
+        print(f"Incremental refresh (+1,000 rows): {(time.perf_counter() - start) * 1000:.1f}ms "
+              f"(full loads: {snapshot.full_loads})")
+        print("-" * 60)
+
+        print(f"{'chart':<22} {'sql ms':>12} {'numpy ms':>12} {'speedup':>10}")
+        charts = [
+            ('points-distribution', lambda: sql_points_distribution(conn),
+             lambda: analytics.points_distribution(columns)),
+            ('activity-heatmap', lambda: sql_activity_heatmap(conn),
+             lambda: analytics.activity_heatmap(columns)),
+            ('type-mix (month)', lambda: sql_type_mix(conn),
+             lambda: analytics.type_mix(columns, types, 'month')),
+        ]
+        for name, sql_fn, numpy_fn in charts:
+            sql_ms = timed(sql_fn, args.repeat)
+            numpy_ms = timed(numpy_fn, args.repeat)
+            print(f"{name:<22} {sql_ms:>12.2f} {numpy_ms:>12.2f} {sql_ms / numpy_ms:>9.1f}x")
+        conn.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Pagination Benchmark
+Fills a scratch database with approved eco actions and times fetching a
+page at increasing depths with LIMIT/OFFSET and with a keyset cursor.
+
+Usage: python bench_pagination.py [--rows 1000000] [--page-size 20] [--repeat 5]
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import pagination
+from db_pool import sqlite_factory
+from migrations import run_migrations
+
+SELECT_ACTIONS = 'SELECT id, title, points, created_at FROM eco_actions'
+
+def prepare(path, rows):
+    conn = sqlite_factory(path)()
+    conn.executescript('''
+        CREATE TABLE users (id INTEGER PRIMARY KEY, username TEXT, points INTEGER DEFAULT 0,
+                            created_at TIMESTAMP);
+        CREATE TABLE user_sessions (id INTEGER PRIMARY KEY, user_id INTEGER, session_token TEXT UNIQUE,
+                                    expires_at TIMESTAMP, created_at TIMESTAMP);
+        CREATE TABLE locations (id INTEGER PRIMARY KEY, name TEXT, type TEXT, user_id INTEGER,
+                                approved BOOLEAN, created_at TIMESTAMP);
+        CREATE TABLE sofia_redesigns (id INTEGER PRIMARY KEY, type TEXT, created_at TIMESTAMP);
+        CREATE TABLE eco_actions (id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT, type TEXT,
+                                  points INTEGER, user_id INTEGER, approved BOOLEAN,
+                                  created_at TIMESTAMP);
+    ''')
+    start = datetime(2020, 1, 1)
+    batch = []
+    for i in range(rows):
+        # Several actions per second so the cursor has ties to break
+        created = (start + timedelta(seconds=i // 3)).strftime('%Y-%m-%d %H:%M:%S')
+        batch.append((f'action {i}', 'tree', 15, i % 1000, True, created))
+        if len(batch) == 50000:
+            conn.executemany('INSERT INTO eco_actions (title, type, points, user_id, approved, created_at) '
+                             'VALUES (?, ?, ?, ?, ?, ?)', batch)
+            batch = []
+    if batch:
+        conn.executemany('INSERT INTO eco_actions (title, type, points, user_id, approved, created_at) '
+                         'VALUES (?, ?, ?, ?, ?, ?)', batch)
+    conn.commit()
+    run_migrations(conn)
+    conn.execute('ANALYZE')
+    conn.commit()
+    return conn
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+def main():
+    parser = argparse.ArgumentParser(description='OFFSET vs keyset pagination')
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--page-size', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Pagination Benchmark")
+    print("=" * 60)
+    print(f"Rows: {args.rows:,} | Page size: {args.page_size} | Repeat: {args.repeat}")
+    print("-" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        load_start = time.perf_counter()
+        conn = prepare(os.path.join(tmp, 'pages.db'), args.rows)
+        print(f"Loaded in {time.perf_counter() - load_start:.1f}s")
+        print(f"{'page':>8} {'offset ms':>12} {'keyset ms':>12}")
+
+        offset_sql, _ = pagination.keyset_query(SELECT_ACTIONS, ['approved = TRUE'], (), None, None)
+        offset_sql += ' LIMIT ? OFFSET ?'
+        pages = max(args.rows // args.page_size, 1)
+        for page in sorted({1, 10, 100, 1000, 10000, pages // 2, pages}):
+            if page > pages:
+                continue
+            skip = (page - 1) * args.page_size
+            offset_ms = timed(lambda: conn.execute(offset_sql, (args.page_size, skip)).fetchall(), args.repeat)
+
+            # The cursor a client would hold after reading the previous page
+            after = None
+            if skip:
+                row = conn.execute(offset_sql, (1, skip - 1)).fetchone()
+                after = (row[3], row[0])
+            keyset_ms = timed(lambda: pagination.fetch_page(
+                conn, SELECT_ACTIONS, ['approved = TRUE'], (), after, args.page_size, created_index=3
+            ), args.repeat)
+            print(f"{page:>8} {offset_ms:>12.3f} {keyset_ms:>12.3f}")
+        conn.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+SQLite Profile Benchmark
+Compares read/write throughput under concurrent load with the stock
+connection settings and with the tuned profile from db_pool.SQLITE_PROFILE.
+
+Usage: python bench_sqlite_profile.py [--readers 8] [--writers 4] [--seconds 5]
+"""
+
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from db_pool import SQLITE_PROFILE, apply_sqlite_profile
+
+def stock_connect(path):
+    # What get_db_connection() used to do: rollback journal, default timeout
+    return sqlite3.connect(path, check_same_thread=False)
+
+def tuned_connect(path):
+    conn = sqlite3.connect(path, timeout=SQLITE_PROFILE['busy_timeout'] / 1000.0,
+                           check_same_thread=False)
+    return apply_sqlite_profile(conn, SQLITE_PROFILE)
+
+def prepare_database(path, rows=5000):
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        CREATE TABLE eco_actions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            type TEXT NOT NULL,
+            points INTEGER DEFAULT 0,
+            user_id INTEGER,
+            approved BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.executemany(
+        'INSERT INTO eco_actions (title, type, points, user_id, approved) VALUES (?, ?, ?, ?, ?)',
+        [(f'Action {i}', 'tree', 15, i % 50, True) for i in range(rows)]
+    )
+    conn.commit()
+    conn.close()
+
+def run_load(connect, path, readers, writers, seconds):
+    """Hammer the database with concurrent feed reads and action inserts"""
+    stop = threading.Event()
+    counts = {'reads': 0, 'writes': 0, 'locked': 0}
+    lock = threading.Lock()
+
+    def reader():
+        conn = connect(path)
+        done = 0
+        while not stop.is_set():
+            try:
+                conn.execute('''
+                    SELECT id, title, points FROM eco_actions
+                    WHERE approved = TRUE ORDER BY created_at DESC LIMIT 20
+                ''').fetchall()
+                done += 1
+            except sqlite3.OperationalError:
+                with lock:
+                    counts['locked'] += 1
+        conn.close()
+        with lock:
+            counts['reads'] += done
+
+    def writer():
+        conn = connect(path)
+        done = 0
+        while not stop.is_set():
+            try:
+                conn.execute(
+                    'INSERT INTO eco_actions (title, type, points, user_id, approved) VALUES (?, ?, ?, ?, ?)',
+                    ('Bench action', 'clean', 10, 1, True)
+                )
+                conn.commit()
+                done += 1
+            except sqlite3.OperationalError:
+                conn.rollback()
+                with lock:
+                    counts['locked'] += 1
+        conn.close()
+        with lock:
+            counts['writes'] += done
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads += [threading.Thread(target=writer) for _ in range(writers)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description='SQLite connection profile benchmark')
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("SQLite Profile Benchmark")
+    print("=" * 60)
+    print(f"Readers: {args.readers} | Writers: {args.writers} | Duration: {args.seconds}s")
+    print(f"Tuned profile: {SQLITE_PROFILE}")
+    print("-" * 60)
+
+    results = {}
+    for label, connect in (('stock', stock_connect), ('tuned', tuned_connect)):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'bench.db')
+            prepare_database(path)
+            counts = run_load(connect, path, args.readers, args.writers, args.seconds)
+        results[label] = counts
+        print(f"{label:<6} reads/s: {counts['reads'] / args.seconds:>10.1f}   "
+              f"writes/s: {counts['writes'] / args.seconds:>8.1f}   "
+              f"lock errors: {counts['locked']}")
+
+    stock, tuned = results['stock'], results['tuned']
+    print("-" * 60)
+    if stock['reads'] and stock['writes']:
+        print(f"Read speedup:  {tuned['reads'] / stock['reads']:.2f}x")
+        print(f"Write speedup: {tuned['writes'] / stock['writes']:.2f}x")
+
+if __name__ == '__main__':
+    main()
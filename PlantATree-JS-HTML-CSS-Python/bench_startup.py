@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Startup Benchmark
+Measures `import app` time and first-request latency in fresh interpreters,
+the cost every gunicorn worker pays on each restart.
+
+Usage: python bench_startup.py [--runs 5] [--path /api/locations]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# Runs inside a fresh interpreter so nothing is already imported
+PROBE = '''
+import json, sys, time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+response = app.app.test_client().get(sys.argv[1])
+t2 = time.perf_counter()
+print("BENCH " + json.dumps({"import_ms": (t1 - t0) * 1000, "first_request_ms": (t2 - t1) * 1000,
+                              "status": response.status_code}))
+'''
+
+def run_once(path, env):
+    result = subprocess.run([sys.executable, '-c', PROBE, path], env=env,
+                            capture_output=True, text=True)
+    for line in result.stdout.splitlines():
+        if line.startswith('BENCH '):
+            return json.loads(line[len('BENCH '):])
+    raise RuntimeError(f"probe failed:\n{result.stderr[-2000:]}")
+
+def main():
+    parser = argparse.ArgumentParser(description='App import and first-request latency')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--path', default='/api/locations')
+    parser.add_argument('--database', default=os.getenv('SQLITE_PATH', 'infousers.db'),
+                        help='SQLite file to copy (the original is never modified)')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Startup Benchmark")
+    print("=" * 60)
+    print(f"Runs: {args.runs} | First request: GET {args.path}")
+    print("-" * 60)
+
+    samples = []
+    with tempfile.TemporaryDirectory() as tmp:
+        db_copy = os.path.join(tmp, 'bench.db')
+        shutil.copy(args.database, db_copy)
+        env = dict(os.environ, SQLITE_PATH=db_copy, DATABASE_URL='')
+        # Warm run bootstraps the copy, so later runs only pay the version check
+        run_once(args.path, env)
+        for i in range(args.runs):
+            sample = run_once(args.path, env)
+            samples.append(sample)
+            print(f"run {i + 1}: import {sample['import_ms']:>8.1f}ms   "
+                  f"first request {sample['first_request_ms']:>7.1f}ms   status {sample['status']}")
+
+    print("-" * 60)
+    for key, label in (('import_ms', 'Import'), ('first_request_ms', 'First request')):
+        values = [s[key] for s in samples]
+        print(f"{label:<14} median {statistics.median(values):>8.1f}ms   max {max(values):>8.1f}ms")
+
+if __name__ == '__main__':
+    main()
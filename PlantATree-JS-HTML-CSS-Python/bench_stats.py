@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Platform Stats Benchmark
+Fills a scratch database with users, locations and eco actions and
+compares statement count and latency of the old six-query admin
+statistics, the single-pass scan_stats() and the counter-backed
+platform_stats().
+
+Usage: python bench_stats.py [--rows 1000000] [--users 100000] [--repeat 5]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import db_pool
+import repository
+import stats_service
+from db_pool import sqlite_factory
+
+TYPES = ('tree', 'clean', 'bike', 'recycle')
+POINTS = {'tree': 15, 'clean': 10, 'bike': 5, 'recycle': 8}
+
+# What admin_eco_manager.show_statistics() used to run
+LEGACY_QUERIES = [
+    'SELECT COUNT(*) FROM users',
+    'SELECT COUNT(*) FROM eco_actions',
+    'SELECT COUNT(*) FROM eco_actions WHERE approved = TRUE',
+    'SELECT COUNT(*) FROM eco_actions WHERE approved = FALSE',
+    'SELECT COALESCE(SUM(points), 0) FROM eco_actions WHERE approved = TRUE',
+    '''SELECT type, COUNT(*), COALESCE(SUM(points), 0) FROM eco_actions WHERE approved = TRUE
+       GROUP BY type ORDER BY COUNT(*) DESC''',
+]
+
+def prepare(path, rows, users):
+    rng = random.Random(42)
+    conn = sqlite_factory(path)()
+    conn.executescript('''
+        CREATE TABLE users (id INTEGER PRIMARY KEY, username TEXT);
+        CREATE TABLE locations (id INTEGER PRIMARY KEY, type TEXT, approved BOOLEAN, created_at TIMESTAMP);
+        CREATE TABLE eco_actions (id INTEGER PRIMARY KEY AUTOINCREMENT, type TEXT, points INTEGER,
+                                  user_id INTEGER, approved BOOLEAN, created_at TIMESTAMP);
+        CREATE TABLE user_stats (user_id INTEGER PRIMARY KEY, total_points INTEGER, action_count INTEGER);
+        CREATE TABLE platform_counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL DEFAULT 0);
+        CREATE INDEX idx_eco_actions_approved_created_id ON eco_actions (approved, created_at, id);
+    ''')
+    conn.executemany('INSERT INTO users (id, username) VALUES (?, ?)',
+                     ((i, f'user{i}') for i in range(users)))
+    conn.executemany('INSERT INTO locations (type, approved) VALUES (?, ?)',
+                     ((rng.choice(('park', 'garden')), rng.random() < 0.9) for _ in range(rows // 100)))
+    batch = []
+    for _ in range(rows):
+        action_type = rng.choice(TYPES)
+        batch.append((action_type, POINTS[action_type], rng.randrange(users), rng.random() < 0.95))
+        if len(batch) == 50000:
+            conn.executemany('INSERT INTO eco_actions (type, points, user_id, approved) VALUES (?, ?, ?, ?)', batch)
+            batch = []
+    if batch:
+        conn.executemany('INSERT INTO eco_actions (type, points, user_id, approved) VALUES (?, ?, ?, ?)', batch)
+    conn.execute('''
+        INSERT INTO user_stats (user_id, total_points, action_count)
+        SELECT user_id, SUM(points), COUNT(*) FROM eco_actions WHERE approved = TRUE GROUP BY user_id
+    ''')
+    repository.reconcile_counters(conn)
+    conn.commit()
+    return conn
+
+def measure(fn, repeat):
+    """(median ms, statements per call)"""
+    statements = []
+    db_pool.query_observers.append(lambda sql, seconds: statements.append(sql))
+    samples = []
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - start) * 1000)
+    finally:
+        db_pool.query_observers.pop()
+    return statistics.median(samples), len(statements) / repeat
+
+def legacy(conn):
+    return [conn.execute(sql).fetchall() for sql in LEGACY_QUERIES]
+
+def counters_cold(conn):
+    repository.QUERY_CACHE.clear()
+    return stats_service.platform_stats(conn, with_totals=True)
+
+def main():
+    parser = argparse.ArgumentParser(description='Platform statistics: six queries vs one scan vs counters')
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    repository.SLOW_QUERY_MS = float('inf')
+
+    print("=" * 60)
+    print("Platform Stats Benchmark")
+    print("=" * 60)
+    print(f"Actions: {args.rows:,} | Users: {args.users:,} | Repeat: {args.repeat}")
+    print("-" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        load_start = time.perf_counter()
+        conn = prepare(os.path.join(tmp, 'stats.db'), args.rows, args.users)
+        print(f"Loaded in {time.perf_counter() - load_start:.1f}s")
+        print(f"{'method':<28} {'statements':>11} {'ms':>12}")
+
+        methods = [
+            ('legacy six queries', lambda: legacy(conn)),
+            ('scan_stats (one pass)', lambda: stats_service.scan_stats(conn)),
+            ('platform_stats (cold)', lambda: counters_cold(conn)),
+            ('platform_stats (cached)', lambda: stats_service.platform_stats(conn, with_totals=True)),
+        ]
+        for name, fn in methods:
+            ms, statements = measure(fn, args.repeat)
+            print(f"{name:<28} {statements:>11.1f} {ms:>12.3f}")
+        conn.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Write Queue Benchmark
+Simulates login bookkeeping (last_login update + session insert) from many
+concurrent request threads, once with a commit per request and once through
+the group-commit write queue, and reports submissions per second.
+
+Usage: python bench_write_queue.py [--threads 16] [--seconds 5] [--latency-ms 20]
+"""
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from db_pool import ConnectionPool, sqlite_factory
+from write_queue import WriteQueue
+
+UPDATE_LAST_LOGIN = 'UPDATE users SET last_login = CURRENT_TIMESTAMP WHERE id = ?'
+INSERT_SESSION = 'INSERT INTO user_sessions (user_id, session_token, expires_at) VALUES (?, ?, ?)'
+
+def prepare_pool(path, threads):
+    pool = ConnectionPool(sqlite_factory(path), max_size=threads + 1)
+    with pool.connection() as conn:
+        conn.executescript('''
+            CREATE TABLE users (id INTEGER PRIMARY KEY, last_login TIMESTAMP);
+            CREATE TABLE user_sessions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                session_token TEXT UNIQUE NOT NULL,
+                expires_at TIMESTAMP NOT NULL
+            );
+        ''')
+        conn.executemany('INSERT INTO users (id) VALUES (?)', [(i,) for i in range(1000)])
+        conn.commit()
+    return pool
+
+def run(pool, threads, seconds, submit):
+    stop = threading.Event()
+    counts = [0] * threads
+
+    def worker(index):
+        n = 0
+        while not stop.is_set():
+            user_id = (index * 7919 + n) % 1000
+            submit(UPDATE_LAST_LOGIN, (user_id,), INSERT_SESSION,
+                   (user_id, f'{index}-{n}', '2030-01-01 00:00:00'))
+            n += 1
+        counts[index] = n
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in workers:
+        t.join()
+    return sum(counts), time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description='Group-commit write queue benchmark')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--latency-ms', type=float, default=20)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Write Queue Benchmark")
+    print("=" * 60)
+    print(f"Threads: {args.threads} | Duration: {args.seconds}s | Max latency: {args.latency_ms}ms")
+    print("-" * 60)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        pool = prepare_pool(os.path.join(tmp, 'sync.db'), args.threads)
+
+        def commit_per_request(sql1, params1, sql2, params2):
+            with pool.connection() as conn:
+                conn.execute(sql1, params1)
+                conn.execute(sql2, params2)
+                conn.commit()
+
+        results['sync'] = run(pool, args.threads, args.seconds, commit_per_request)
+        pool.close_all()
+
+        pool = prepare_pool(os.path.join(tmp, 'queued.db'), args.threads)
+        wq = WriteQueue(pool, max_latency_ms=args.latency_ms)
+
+        def queued(sql1, params1, sql2, params2):
+            wq.submit(sql1, params1)
+            wq.submit(sql2, params2)
+
+        submitted, elapsed = run(pool, args.threads, args.seconds, queued)
+        flush_start = time.perf_counter()
+        wq.close()
+        flush_ms = (time.perf_counter() - flush_start) * 1000
+        results['queued'] = (submitted, elapsed)
+        stats = wq.stats()
+        pool.close_all()
+
+    for label, (submitted, elapsed) in results.items():
+        print(f"{label:<7} submissions/s: {submitted / elapsed:>10.1f}")
+    print(f"Queue: {stats['batches']} batches, avg {stats['avg_batch']} writes/batch, "
+          f"avg commit {stats['avg_commit_ms']}ms, final flush {flush_ms:.1f}ms, failed {stats['failed']}")
+    sync_rate = results['sync'][0] / results['sync'][1]
+    if sync_rate:
+        print("-" * 60)
+        print(f"Speedup: {(results['queued'][0] / results['queued'][1]) / sync_rate:.2f}x")
+
+if __name__ == '__main__':
+    main()
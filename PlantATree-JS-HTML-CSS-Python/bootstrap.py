@@ -0,0 +1,190 @@
+# One-time, version-checked database bootstrap (like `npm run db:init`)
+#
+# Creates the base tables, seeds the default admin, sample locations and
+# badges, then applies the versioned migrations. The app only checks the
+# schema version at startup; the full run happens once per database, via
+# `python scripts.py db:init` or `python bootstrap.py`.
+import sys
+
+from werkzeug.security import generate_password_hash
+
+import repository
+from migrations import LATEST_VERSION, run_migrations
+
+def create_tables(conn):
+    """Create the base tables (idempotent)"""
+    cursor = conn.cursor()
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            role TEXT DEFAULT 'regular' CHECK(role IN ('regular', 'admin')),
+            profile_picture TEXT DEFAULT NULL,
+            points INTEGER DEFAULT 0,
+            is_active BOOLEAN DEFAULT TRUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_login TIMESTAMP DEFAULT NULL
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS user_sessions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            session_token TEXT UNIQUE NOT NULL,
+            expires_at TIMESTAMP NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS locations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            description TEXT,
+            type TEXT NOT NULL,
+            latitude REAL,
+            longitude REAL,
+            user_id INTEGER,
+            approved BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS eco_actions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            description TEXT,
+            type TEXT NOT NULL,
+            location_name TEXT,
+            image_path TEXT,
+            points INTEGER DEFAULT 0,
+            user_id INTEGER,
+            approved BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS badges (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            description TEXT,
+            icon TEXT,
+            requirement_type TEXT,
+            requirement_value INTEGER
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS user_badges (
+            user_id INTEGER,
+            badge_id INTEGER,
+            earned_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, badge_id),
+            FOREIGN KEY (user_id) REFERENCES users (id),
+            FOREIGN KEY (badge_id) REFERENCES badges (id)
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sofia_redesigns (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            type TEXT NOT NULL,
+            geometry TEXT NOT NULL,
+            coordinates TEXT NOT NULL,
+            description TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+def seed_defaults(conn):
+    """Insert the default admin, sample locations and badges into empty tables"""
+    cursor = conn.cursor()
+    
+    cursor.execute("SELECT COUNT(*) FROM users WHERE role = 'admin'")
+    if cursor.fetchone()[0] == 0:
+        admin_password_hash = generate_password_hash('admin123')  
+        cursor.execute('''
+            INSERT INTO users (username, email, password_hash, role, points)
+            VALUES (?, ?, ?, ?, ?)
+        ''', ('admin', 'admin@plantatree.com', admin_password_hash, 'admin', 1000))
+        print("✓ Default admin user created (admin@plantatree.com / admin123)")
+    
+    cursor.execute('SELECT COUNT(*) FROM locations')
+    if cursor.fetchone()[0] == 0:
+        sample_locations = [
+            ('Борисова градина', 'Най-големият парк в София с много дървета и алеи', 'park', 42.6755, 23.3348, None, True),
+            ('Витоша парк', 'Красив парк в подножието на планината', 'park', 42.6447, 23.2750, None, True),
+            ('Еко пътека Витоша', 'Планинска еко пътека с прекрасни гледки', 'trail', 42.5569, 23.2892, None, True),
+            ('Велоалея Дунав', 'Велосипедна алея покрай река Дунав', 'bike', 42.6892, 23.3517, None, True),
+            ('Зона за засаждане', 'Специално място за засаждане на нови дървета', 'plant', 42.6977, 23.3219, None, True)
+        ]
+        
+        repository.bulk_insert(conn, 'locations', (
+            'name', 'description', 'type', 'latitude', 'longitude', 'user_id', 'approved'
+        ), sample_locations)
+    
+    cursor.execute('SELECT COUNT(*) FROM badges')
+    if cursor.fetchone()[0] == 0:
+        sample_badges = [
+            ('Tree Planter', 'Засади първото си дърво', 'Tree', 'trees', 1),
+            ('Eco Hero', 'Направи 10 еко действия', 'Eco', 'actions', 10),
+            ('Green Warrior', 'Събери 100 точки', 'Trophy', 'points', 100),
+            ('Nature Lover', 'Посети 5 различни зелени зони', 'Nature', 'locations', 5),
+            ('Bike Rider', 'Използвай велосипед 10 пъти', 'Bike', 'bike_rides', 10)
+        ]
+        
+        repository.bulk_insert(conn, 'badges', (
+            'name', 'description', 'icon', 'requirement_type', 'requirement_value'
+        ), sample_badges)
+
+def schema_version(conn):
+    """Applied schema version, or None for a database that was never bootstrapped
+
+    Read-only, so every worker can afford it at startup.
+    """
+    try:
+        return repository.fetch_value(conn, 'SELECT MAX(version) FROM schema_version', default=0)
+    except Exception:
+        conn.rollback()
+        return None
+
+def is_current(conn):
+    version = schema_version(conn)
+    return version is not None and version >= LATEST_VERSION
+
+def bootstrap(conn=None, force=False):
+    """Create, seed and migrate the database unless it is already current
+
+    Returns True when work was done, False when the version check passed.
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = repository.get_connection()
+    try:
+        if not force and is_current(conn):
+            return False
+        create_tables(conn)
+        seed_defaults(conn)
+        conn.commit()
+        # Bring indexes and later schema changes up to date
+        run_migrations(conn)
+        # Seeding may have added approved locations behind the counters' back
+        repository.reconcile_counters(conn)
+        conn.commit()
+        return True
+    finally:
+        if own_conn:
+            conn.close()
+
+if __name__ == '__main__':
+    ran = bootstrap(force='--force' in sys.argv)
+    print("✓ Database bootstrapped" if ran else "Database already up to date")
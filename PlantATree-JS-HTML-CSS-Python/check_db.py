@@ -1,8 +1,8 @@
-import sqlite3
+import repository
 
 def check_database():
     try:
-        conn = sqlite3.connect('infousers.db')
+        conn = repository.get_connection()
         cursor = conn.cursor()
         
         # Get all tables
@@ -20,7 +20,7 @@ def check_database():
         if 'users' in tables:
             cursor.execute("SELECT id, username, points FROM users LIMIT 5")
             users = cursor.fetchall()
-            print("Sample users:", users)
+            print("Sample users:", [tuple(user) for user in users])
         
         # Check badges table
         if 'badges' in tables:
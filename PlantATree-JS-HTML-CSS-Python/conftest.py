@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""
+Shared pytest fixtures: a bootstrapped SQLite database with one user (id 7)
+"""
+
+import pytest
+
+import bootstrap
+import repository
+from db_pool import sqlite_factory
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'test.db')
+
+@pytest.fixture
+def conn(db_path):
+    connection = sqlite_factory(db_path)()
+    bootstrap.bootstrap(connection)
+    connection.execute("INSERT INTO users (id, username, email, password_hash) VALUES (7, 'ana', 'ana@x', 'x')")
+    connection.commit()
+    yield connection
+    connection.close()
+
+@pytest.fixture
+def add(conn):
+    """add(type, points, approved, key=None) -> id of a new eco action by user 7"""
+    def add(action_type, points, approved, key=None):
+        return repository.insert_eco_action(conn, 'a', 'd', action_type, None, None, points, 7, approved, key)
+    return add
@@ -0,0 +1,670 @@
+# Database connection pooling (like pg-pool / generic-pool for Node.js)
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from urllib.parse import quote
+
+from flask import g, has_app_context, request
+
+# Pool settings
+SQLITE_PATH = os.getenv('SQLITE_PATH', 'infousers.db')
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '5'))
+DB_POOL_HEALTH_CHECK_INTERVAL = float(os.getenv('DB_POOL_HEALTH_CHECK_INTERVAL', '30'))
+DB_POOL_MAX_LIFETIME = float(os.getenv('DB_POOL_MAX_LIFETIME', '3600'))
+
+# SQLite connection profile, applied to every connection the factory opens.
+# WAL lets readers run alongside the single writer; busy_timeout makes
+# writers queue instead of failing with "database is locked".
+SQLITE_PROFILE = {
+    'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000')),
+    'cache_size': int(os.getenv('SQLITE_CACHE_SIZE', '-20000')),  # negative = KiB, ~20MB
+    'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024))),
+    'temp_store': os.getenv('SQLITE_TEMP_STORE', 'MEMORY'),
+}
+
+# Size of each SQLite connection's prepared statement cache. Pooled
+# connections live long enough for the cache to actually get hits.
+SQLITE_CACHED_STATEMENTS = int(os.getenv('SQLITE_CACHED_STATEMENTS', '256'))
+
+# Read routing: GET handlers use a separate read-only target. On Postgres
+# that is DATABASE_REPLICA_URL (falls back to the primary when unset). On
+# SQLite it is either the same file opened with mode=ro ('ro'), a copy
+# refreshed every SQLITE_SNAPSHOT_INTERVAL seconds ('snapshot') or the
+# write pool itself ('off').
+DATABASE_REPLICA_URL = os.getenv('DATABASE_REPLICA_URL')
+DB_READ_POOL_SIZE = int(os.getenv('DB_READ_POOL_SIZE', str(DB_POOL_SIZE)))
+SQLITE_READ_MODE = os.getenv('SQLITE_READ_MODE', 'ro').lower()
+SQLITE_SNAPSHOT_INTERVAL = float(os.getenv('SQLITE_SNAPSHOT_INTERVAL', '30'))
+READ_YOUR_WRITES_HEADER = 'X-Read-Your-Writes'
+
+SQLITE_PRAGMA_CHOICES = {
+    'journal_mode': {'DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'},
+    'synchronous': {'OFF', 'NORMAL', 'FULL', 'EXTRA'},
+    'temp_store': {'DEFAULT', 'FILE', 'MEMORY'},
+}
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes available before the checkout timeout"""
+    pass
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of reusable DB-API connections"""
+
+    def __init__(self, factory, max_size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT,
+                 health_check_interval=DB_POOL_HEALTH_CHECK_INTERVAL,
+                 max_lifetime=DB_POOL_MAX_LIFETIME, backend='sqlite'):
+        self.factory = factory
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.max_lifetime = max_lifetime
+        self.backend = backend
+
+        self._cond = threading.Condition()
+        self._idle = deque()  # (conn, created_at, last_used)
+        self._born = {}       # id(conn) -> created_at
+        self._size = 0
+        self._in_use = 0
+        self._waiting = 0
+
+        # Metrics
+        self._checkouts = 0
+        self._timeouts = 0
+        self._created = 0
+        self._discarded = 0
+        self._health_check_failures = 0
+        self._latencies = deque(maxlen=1000)
+        self._max_latency = 0.0
+
+    def acquire(self, timeout=None):
+        """Check out a connection, waiting up to `timeout` seconds for a free slot"""
+        timeout = self.timeout if timeout is None else timeout
+        start = time.perf_counter()
+        deadline = start + timeout
+        conn = None
+        last_used = None
+
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn, created_at, last_used = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(
+                        f'No {self.backend} connection available after {timeout}s '
+                        f'({self._in_use}/{self.max_size} in use)'
+                    )
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+            self._in_use += 1
+
+        try:
+            if conn is not None and not self._is_usable(conn, created_at, last_used):
+                self._close_quietly(conn)
+                with self._cond:
+                    self._discarded += 1
+                    self._born.pop(id(conn), None)
+                conn = None
+            if conn is None:
+                conn = self.factory()
+                with self._cond:
+                    self._created += 1
+                    self._born[id(conn)] = time.monotonic()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+        latency = (time.perf_counter() - start) * 1000
+        with self._cond:
+            self._checkouts += 1
+            self._latencies.append(latency)
+            self._max_latency = max(self._max_latency, latency)
+        return conn
+
+    def release(self, conn, discard=False):
+        """Return a connection to the pool, rolling back any open transaction"""
+        if not discard:
+            try:
+                conn.rollback()
+                if self.backend == 'sqlite':
+                    conn.row_factory = getattr(type(conn), 'default_row_factory', None)
+            except Exception:
+                discard = True
+
+        with self._cond:
+            self._in_use -= 1
+            created_at = self._born.get(id(conn), time.monotonic())
+            if discard:
+                self._size -= 1
+                self._discarded += 1
+                self._born.pop(id(conn), None)
+            else:
+                self._idle.append((conn, created_at, time.monotonic()))
+            self._cond.notify()
+
+        if discard:
+            self._close_quietly(conn)
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """Context manager that checks a connection out and always returns it"""
+        conn = self.acquire(timeout)
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close_all(self):
+        """Close every idle connection (used on shutdown and in tests)"""
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            for conn, _, _ in idle:
+                self._born.pop(id(conn), None)
+        for conn, _, _ in idle:
+            self._close_quietly(conn)
+
+    def stats(self):
+        """Pool metrics for sizing: usage, waiters and checkout latency"""
+        with self._cond:
+            latencies = sorted(self._latencies)
+            return {
+                'backend': self.backend,
+                'max_size': self.max_size,
+                'size': self._size,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'waiting': self._waiting,
+                'checkouts': self._checkouts,
+                'timeouts': self._timeouts,
+                'created': self._created,
+                'discarded': self._discarded,
+                'health_check_failures': self._health_check_failures,
+                'checkout_latency_ms': {
+                    'avg': round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+                    'p95': round(latencies[int(len(latencies) * 0.95) - 1], 3) if latencies else 0.0,
+                    'max': round(self._max_latency, 3)
+                }
+            }
+
+    def _is_usable(self, conn, created_at, last_used):
+        """Recycle old connections and ping ones that sat idle for a while"""
+        now = time.monotonic()
+        if self.max_lifetime and now - created_at > self.max_lifetime:
+            return False
+        if getattr(conn, 'closed', 0):  # psycopg2 marks dead connections here
+            return False
+        if now - last_used < self.health_check_interval:
+            return True
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+            cursor.close()
+            conn.rollback()
+            return True
+        except Exception:
+            with self._cond:
+                self._health_check_failures += 1
+            return False
+
+    def _close_quietly(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+class PooledConnection:
+    """Connection handle whose close() hands the connection back to the pool"""
+
+    def __init__(self, pool, conn, request_scoped=False):
+        object.__setattr__(self, '_pool', pool)
+        object.__setattr__(self, '_conn', conn)
+        object.__setattr__(self, '_request_scoped', request_scoped)
+
+    def close(self):
+        # Request-scoped connections are returned in teardown, so handlers
+        # can keep calling close() exactly like they did with raw connections
+        if not self._request_scoped:
+            self.release()
+
+    def release(self, discard=False):
+        conn = self._conn
+        if conn is not None:
+            object.__setattr__(self, '_conn', None)
+            self._pool.release(conn, discard=discard)
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise sqlite3.ProgrammingError('Cannot operate on a connection returned to the pool')
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._conn, name, value)
+
+    def __enter__(self):
+        return self._conn.__enter__()
+
+    def __exit__(self, exc_type, exc, tb):
+        return self._conn.__exit__(exc_type, exc, tb)
+
+# ==================== QUERY INSTRUMENTATION ====================
+# Every statement run through a pooled connection passes through these
+# classes, which makes them the single place to hook timing and cache
+# invalidation (see repository.py).
+
+query_observers = []   # fn(sql, seconds) after every statement
+commit_observers = []  # fn(tables) after a commit that wrote to `tables`
+
+_WRITE_RE = re.compile(
+    r'^\s*(?:INSERT(?:\s+OR\s+\w+)?\s+INTO|REPLACE\s+INTO|UPDATE(?:\s+OR\s+\w+)?|DELETE\s+FROM)\s+["`]?(\w+)',
+    re.IGNORECASE
+)
+
+def _observe(conn, sql, seconds):
+    for observer in query_observers:
+        observer(sql, seconds)
+    match = _WRITE_RE.match(sql) if isinstance(sql, str) else None
+    if match is not None:
+        conn.written_tables.add(match.group(1).lower())
+
+def _notify_commit(conn):
+    # In-memory state first, so caches invalidated below refill from it
+    callbacks, conn.after_commit_callbacks = conn.after_commit_callbacks, []
+    for callback in callbacks:
+        try:
+            callback()
+        except Exception as e:
+            print(f"After-commit callback failed: {e}")
+    tables, conn.written_tables = conn.written_tables, set()
+    if tables:
+        for observer in commit_observers:
+            observer(tables)
+
+def _discard_transaction(conn):
+    conn.written_tables = set()
+    conn.after_commit_callbacks = []
+
+def after_commit(conn, callback):
+    """Run `callback` once the current transaction on `conn` commits (dropped on rollback)
+
+    For in-memory state that must only reflect durable writes.
+    """
+    raw = getattr(conn, '_conn', conn)
+    callbacks = getattr(raw, 'after_commit_callbacks', None)
+    if callbacks is None:
+        callback()  # plain DB-API connection without hooks
+    else:
+        callbacks.append(callback)
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """SQLite cursor that reports statement timing"""
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            _observe(self.connection, sql, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            _observe(self.connection, sql, time.perf_counter() - start)
+
+class InstrumentedConnection(sqlite3.Connection):
+    """SQLite connection with sqlite3.Row rows and instrumented cursors"""
+
+    # Row is implemented in C and supports both row[0] and row['name']
+    default_row_factory = sqlite3.Row
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.written_tables = set()
+        self.after_commit_callbacks = []
+        self.row_factory = self.default_row_factory
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        super().commit()
+        _notify_commit(self)
+
+    def rollback(self):
+        super().rollback()
+        _discard_transaction(self)
+
+def apply_sqlite_profile(conn, profile):
+    """Apply the PRAGMA profile to a fresh SQLite connection"""
+    for name, value in profile.items():
+        if value is None:
+            continue
+        choices = SQLITE_PRAGMA_CHOICES.get(name)
+        if choices is not None:
+            value = str(value).upper()
+            if value not in choices:
+                raise ValueError(f'Invalid SQLite {name}: {value}')
+        else:
+            value = int(value)
+        # PRAGMA values cannot be bound as parameters, hence the validation above
+        conn.execute(f'PRAGMA {name} = {value}')
+    return conn
+
+def sqlite_factory(path=SQLITE_PATH, profile=None, read_only=False):
+    """Build a SQLite connection factory usable from any worker thread"""
+    profile = SQLITE_PROFILE if profile is None else profile
+    timeout = profile.get('busy_timeout', 5000) / 1000.0
+    if read_only:
+        # The journal mode belongs to the database file and is the writer's to set
+        profile = dict(profile, journal_mode=None)
+        target = f'file:{quote(os.path.abspath(path))}?mode=ro'
+    else:
+        target = path
+
+    def connect():
+        # A checked-out connection is only ever used by one thread at a time
+        conn = sqlite3.connect(
+            target, timeout=timeout, check_same_thread=False,
+            factory=InstrumentedConnection,
+            cached_statements=SQLITE_CACHED_STATEMENTS,
+            uri=read_only
+        )
+        if read_only:
+            conn.execute('PRAGMA query_only = 1')
+        return apply_sqlite_profile(conn, profile)
+    return connect
+
+class SqliteSnapshot:
+    """Read-only copy of a SQLite database, refreshed in the background
+
+    Each refresh is written with the online backup API to a temp file and
+    swapped in atomically; pooled readers pick up the new file when their
+    connection is recycled (the read pool's max_lifetime is the interval).
+    """
+
+    def __init__(self, source, path=None, interval=SQLITE_SNAPSHOT_INTERVAL):
+        self.source = source
+        self.path = path or source + '.snapshot'
+        self.interval = interval
+        self.refreshed_at = None
+        self.refreshes = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def refresh(self):
+        tmp = self.path + '.tmp'
+        src = sqlite3.connect(self.source, timeout=SQLITE_PROFILE.get('busy_timeout', 5000) / 1000.0)
+        dst = sqlite3.connect(tmp)
+        try:
+            src.backup(dst)
+            dst.execute('PRAGMA journal_mode = DELETE')
+        finally:
+            dst.close()
+            src.close()
+        os.replace(tmp, self.path)
+        self.refreshed_at = time.time()
+        self.refreshes += 1
+
+    def start(self):
+        self.refresh()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='sqlite-snapshot', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"SQLite snapshot refresh failed: {e}")
+
+    def stats(self):
+        return {
+            'path': self.path,
+            'interval_seconds': self.interval,
+            'refreshes': self.refreshes,
+            'age_seconds': round(time.time() - self.refreshed_at, 1) if self.refreshed_at else None
+        }
+
+def postgres_factory(dsn):
+    """Build a psycopg2 connection factory"""
+    import psycopg2
+    import psycopg2.extensions
+    import psycopg2.extras
+
+    from sql_dialect import to_postgres
+
+    class InstrumentedPgCursor(psycopg2.extras.DictCursor):
+        """DictCursor rows support both row[0] and row['name'], like sqlite3.Row
+
+        Statements are written for SQLite and translated here (? -> %s etc.).
+        """
+
+        def execute(self, query, vars=None):
+            if isinstance(query, str):
+                query = to_postgres(query, vars is not None)
+            start = time.perf_counter()
+            try:
+                return super().execute(query, vars)
+            finally:
+                _observe(self.connection, query, time.perf_counter() - start)
+
+        def executemany(self, query, vars_list):
+            if isinstance(query, str):
+                query = to_postgres(query)
+            start = time.perf_counter()
+            try:
+                return super().executemany(query, vars_list)
+            finally:
+                _observe(self.connection, query, time.perf_counter() - start)
+
+    class InstrumentedPgConnection(psycopg2.extensions.connection):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.written_tables = set()
+            self.after_commit_callbacks = []
+
+        def commit(self):
+            super().commit()
+            _notify_commit(self)
+
+        def rollback(self):
+            super().rollback()
+            _discard_transaction(self)
+
+    def connect():
+        return psycopg2.connect(
+            dsn, connect_timeout=int(DB_POOL_TIMEOUT) or 1,
+            connection_factory=InstrumentedPgConnection,
+            cursor_factory=InstrumentedPgCursor
+        )
+    return connect
+
+def is_postgres_url(url):
+    return bool(url) and url.startswith(('postgres://', 'postgresql://'))
+
+def create_pool(database_url=None, sqlite_path=SQLITE_PATH, **kwargs):
+    """Create the pool for DATABASE_URL, falling back to SQLite if Postgres is unusable"""
+    if is_postgres_url(database_url):
+        try:
+            factory = postgres_factory(database_url)
+            pool = ConnectionPool(factory, backend='postgres', **kwargs)
+            pool.release(pool.acquire())  # fail fast and warm one connection
+            return pool
+        except ImportError:
+            print("psycopg2 not installed, falling back to SQLite")
+        except Exception as e:
+            print(f"Cloud DB connection failed: {e}, falling back to SQLite")
+    return ConnectionPool(sqlite_factory(sqlite_path), backend='sqlite', **kwargs)
+
+def create_read_pool(write_pool, replica_url=None, sqlite_path=SQLITE_PATH, mode=None, **kwargs):
+    """Read-only target for GET handlers; returns `write_pool` itself when there is none"""
+    replica_url = DATABASE_REPLICA_URL if replica_url is None else replica_url
+    mode = SQLITE_READ_MODE if mode is None else mode
+    kwargs.setdefault('max_size', DB_READ_POOL_SIZE)
+    try:
+        if write_pool.backend == 'postgres':
+            if not is_postgres_url(replica_url):
+                return write_pool
+            pool = ConnectionPool(postgres_factory(replica_url), backend='postgres', **kwargs)
+            pool.release(pool.acquire())
+            return pool
+        if mode == 'snapshot':
+            snapshot = SqliteSnapshot(sqlite_path).start()
+            kwargs.setdefault('max_lifetime', snapshot.interval)
+            pool = ConnectionPool(sqlite_factory(snapshot.path, read_only=True), backend='sqlite', **kwargs)
+            pool.snapshot = snapshot
+            return pool
+        if mode == 'ro':
+            return ConnectionPool(sqlite_factory(sqlite_path, read_only=True), backend='sqlite', **kwargs)
+    except Exception as e:
+        print(f"Read-only database target unavailable ({e}), reads use the primary")
+    return write_pool
+
+_pool = None
+_read_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Process-wide pool, created lazily from the environment"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = create_pool(os.environ.get('DATABASE_URL'))
+    return _pool
+
+def get_read_pool():
+    """Process-wide read-only pool (may be the write pool itself)"""
+    global _read_pool
+    if _read_pool is None:
+        write_pool = get_pool()
+        with _pool_lock:
+            if _read_pool is None:
+                _read_pool = create_read_pool(write_pool)
+    return _read_pool
+
+def set_pool(pool, read_pool=None):
+    """Replace the process-wide pools (tests, CLI tools pointing at another file)
+
+    Without `read_pool`, reads go to the new write pool.
+    """
+    global _pool, _read_pool
+    with _pool_lock:
+        old, _pool = _pool, pool
+        old_read, _read_pool = _read_pool, read_pool or pool
+    for stale in (old, old_read):
+        if stale is not None and stale is not pool and stale is not _read_pool:
+            _close_pool(stale)
+
+def _close_pool(pool):
+    snapshot = getattr(pool, 'snapshot', None)
+    if snapshot is not None:
+        snapshot.stop()
+    pool.close_all()
+
+def get_connection():
+    """Pooled connection; inside a request the same one is reused until teardown"""
+    pool = get_pool()
+    if has_app_context():
+        conn = g.get('db_conn')
+        if conn is None or conn._conn is None:
+            conn = PooledConnection(pool, pool.acquire(), request_scoped=True)
+            g.db_conn = conn
+        return conn
+    return PooledConnection(pool, pool.acquire())
+
+def request_connection():
+    """The request's write connection if it already has one, else None (never checks one out)"""
+    if has_app_context():
+        conn = g.get('db_conn')
+        if conn is not None and conn._conn is not None:
+            return conn
+    return None
+
+def read_your_writes():
+    """True when this request must see its own (or just-made) writes
+
+    Set by the client with the X-Read-Your-Writes header or ?consistent=1,
+    e.g. when reloading a list right after a POST; implied once the request
+    has used a write connection.
+    """
+    if not has_app_context():
+        return True
+    if g.get('db_conn') is not None:
+        return True
+    if g.get('read_your_writes') is None:
+        flag = False
+        try:
+            value = request.headers.get(READ_YOUR_WRITES_HEADER) or request.args.get('consistent')
+            flag = str(value).lower() in ('1', 'true', 'yes')
+        except RuntimeError:
+            pass  # app context without a request (CLI, tests)
+        g.read_your_writes = flag
+    return g.read_your_writes
+
+def get_read_connection():
+    """Pooled connection for read-only work, routed to the read target unless read_your_writes()"""
+    if read_your_writes():
+        return get_connection()
+    pool = get_read_pool()
+    if pool is get_pool():
+        return get_connection()
+    conn = g.get('db_read_conn')
+    if conn is None or conn._conn is None:
+        conn = PooledConnection(pool, pool.acquire(), request_scoped=True)
+        g.db_read_conn = conn
+    return conn
+
+def release_request_connection(exception=None):
+    """Teardown hook: hand the request's connections back to their pools"""
+    for key in ('db_conn', 'db_read_conn'):
+        conn = g.pop(key, None)
+        if conn is not None:
+            conn.release()
+
+def pool_stats():
+    stats = get_pool().stats()
+    read_pool = get_read_pool()
+    if read_pool is not get_pool():
+        stats['read'] = read_pool.stats()
+        snapshot = getattr(read_pool, 'snapshot', None)
+        if snapshot is not None:
+            stats['read']['snapshot'] = snapshot.stats()
+    return stats
+
+def init_app(app):
+    """Register the request teardown that returns pooled connections"""
+    app.teardown_appcontext(release_request_connection)
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# Streaming CSV / NDJSON exports (like piping a pg-query-stream into res in Express.js)
+#
+# Full dumps of approved eco actions and locations for partners. Rows come
+# from repository.iter_rows (a server-side cursor on Postgres, stepped
+# lazily on SQLite) and are encoded into chunks of EXPORT_CHUNK_ROWS rows,
+# optionally gzipped on the fly, so memory stays flat however large the
+# tables grow. The same generator backs /api/export/<dataset>.<format> and
+# the command line:
+#
+#   python exporter.py eco-actions --format csv --since 2025-01-01 --type tree --gzip -o trees.csv.gz
+import csv
+import io
+import json
+import os
+import sys
+import zlib
+from datetime import datetime, timedelta
+
+import db_pool
+import repository
+
+EXPORT_CHUNK_ROWS = int(os.getenv('EXPORT_CHUNK_ROWS', '500'))
+
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+# dataset -> (SELECT without WHERE, base conditions, output columns, column prefix)
+DATASETS = {
+    'eco-actions': ('''
+        SELECT ea.id, ea.title, ea.description, ea.type, ea.location_name, ea.points,
+               ea.image_path, ea.user_id, u.username, ea.created_at
+        FROM eco_actions ea
+        LEFT JOIN users u ON ea.user_id = u.id
+    ''', ['ea.approved = TRUE'], ('id', 'title', 'description', 'type', 'location_name', 'points',
+                                 'image_path', 'user_id', 'username', 'created_at'), 'ea.'),
+    'locations': ('''
+        SELECT l.id, l.name, l.description, l.type, l.latitude, l.longitude, l.created_at
+        FROM locations l
+    ''', ['l.approved = TRUE'], ('id', 'name', 'description', 'type', 'latitude', 'longitude',
+                                'created_at'), 'l.'),
+}
+
+class ExportError(ValueError):
+    pass
+
+def parse_day(value, name):
+    """datetime for a 'YYYY-MM-DD' filter value; raises ExportError"""
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except (TypeError, ValueError):
+        raise ExportError(f'{name} must be YYYY-MM-DD, got {value!r}')
+
+def export_query(dataset, since=None, until=None, action_type=None):
+    """(sql, params, columns) for one dataset; `since` / `until` are inclusive days"""
+    if dataset not in DATASETS:
+        raise ExportError(f'Unknown dataset {dataset!r}; choose from {", ".join(DATASETS)}')
+    select_sql, conditions, columns, prefix = DATASETS[dataset]
+    conditions = list(conditions)
+    params = []
+    if since:
+        conditions.append(f'{prefix}created_at >= ?')
+        params.append(parse_day(since, 'since').strftime('%Y-%m-%d'))
+    if until:
+        conditions.append(f'{prefix}created_at < ?')
+        params.append((parse_day(until, 'until') + timedelta(days=1)).strftime('%Y-%m-%d'))
+    if action_type:
+        conditions.append(f'{prefix}type = ?')
+        params.append(action_type)
+    # Oldest first along the (approved, [type,] created_at, id) indexes
+    sql = (select_sql + ' WHERE ' + ' AND '.join(conditions)
+           + f' ORDER BY {prefix}created_at, {prefix}id')
+    return sql, params, columns
+
+def _value(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat(sep=' ') if isinstance(value, datetime) else value.isoformat()
+    return value
+
+def ndjson_chunks(columns, rows, chunk_rows=EXPORT_CHUNK_ROWS):
+    """One JSON object per line, yielded as str chunks"""
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(columns, map(_value, row))), ensure_ascii=False))
+        if len(lines) >= chunk_rows:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+def csv_chunks(columns, rows, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Header plus one CSV line per row, yielded as str chunks"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    pending = 0
+    for row in rows:
+        writer.writerow(['' if value is None else _value(value) for value in row])
+        pending += 1
+        if pending >= chunk_rows:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    yield buffer.getvalue()
+
+ENCODERS = {'ndjson': ndjson_chunks, 'csv': csv_chunks}
+
+def gzip_chunks(chunks, level=6):
+    """Compress a stream of bytes chunks into one gzip member"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    try:
+        for chunk in chunks:
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+    finally:
+        # Hand the connection back right away when the client goes away
+        chunks.close()
+
+def stream_export(dataset, fmt, since=None, until=None, action_type=None, gzip=False, conn=None):
+    """Generator of bytes chunks for an export
+
+    Arguments are validated before the generator is returned, so bad
+    filters raise ExportError up front. Without `conn` a connection is
+    taken from the read pool and held until the stream ends; it is not
+    tied to the request, because the body is sent after the view returns.
+    """
+    if fmt not in ENCODERS:
+        raise ExportError(f'Unknown format {fmt!r}; choose from {", ".join(ENCODERS)}')
+    sql, params, columns = export_query(dataset, since, until, action_type)
+
+    def generate():
+        own_conn = conn is None
+        export_conn = conn
+        if own_conn:
+            pool = db_pool.get_read_pool()
+            export_conn = db_pool.PooledConnection(pool, pool.acquire())
+        try:
+            rows = repository.iter_rows(export_conn, sql, params, batch_size=EXPORT_CHUNK_ROWS)
+            for chunk in ENCODERS[fmt](columns, rows):
+                yield chunk.encode('utf-8')
+        finally:
+            if own_conn:
+                export_conn.close()
+
+    return gzip_chunks(generate()) if gzip else generate()
+
+def export_filename(dataset, fmt, gzip=False):
+    stamp = datetime.utcnow().strftime('%Y%m%d')
+    return f'{dataset}-{stamp}.{fmt}' + ('.gz' if gzip else '')
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Export approved eco actions or locations')
+    parser.add_argument('dataset', choices=sorted(DATASETS))
+    parser.add_argument('--format', choices=sorted(ENCODERS), default='ndjson')
+    parser.add_argument('--since', help='first day to include (YYYY-MM-DD)')
+    parser.add_argument('--until', help='last day to include (YYYY-MM-DD)')
+    parser.add_argument('--type', dest='action_type', help='only rows of this type')
+    parser.add_argument('--gzip', action='store_true', help='gzip the output')
+    parser.add_argument('-o', '--output', help='file to write (default: stdout)')
+    args = parser.parse_args()
+
+    try:
+        chunks = stream_export(args.dataset, args.format, args.since, args.until,
+                               args.action_type, args.gzip)
+    except ExportError as e:
+        parser.error(str(e))
+    out = open(args.output, 'wb') if args.output else sys.stdout.buffer
+    written = 0
+    try:
+        for chunk in chunks:
+            out.write(chunk)
+            written += len(chunk)
+    finally:
+        if args.output:
+            out.close()
+    if args.output:
+        print(f"✓ Wrote {written:,} bytes to {args.output}", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,384 @@
+# Geohash-keyed cache for external lookups (like an lru-cache with stale-while-revalidate in Node.js)
+#
+# Clients send whatever lat/lon they have, so caching on the raw values
+# would almost never hit. GeoCache snaps each lookup to a geohash cell
+# (precision 5 is roughly 5 x 5 km) and asks the upstream for the cell's
+# centre instead:
+#
+#   fresh  (age < ttl)               served from memory
+#   stale  (age < ttl + max_stale)   served from memory right away while one
+#                                    background refresh runs for the cell
+#   miss / older                     the caller waits for a refresh; every
+#                                    concurrent caller shares the same one,
+#                                    and gets None if it fails
+#
+# A failed refresh keeps the old entry and is not retried for error_ttl
+# seconds, so an upstream outage costs one timeout per cell, not one per
+# request. Entries are written to the external_cache table (through the
+# write queue) and read back per cell after a restart.
+#
+# Cells kept warm by a prefetcher (ambee_prefetch) are marked with
+# use_prefetched(): lookups near them snap to the nearest such cell, and
+# their refreshes re-read the shared table before going upstream, so web
+# workers pick up the prefetcher's results instead of spending quota.
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+import db_pool
+import write_queue
+
+GEOHASH_PRECISION = int(os.getenv('GEOHASH_PRECISION', '5'))
+GEO_CACHE_MAX_ENTRIES = int(os.getenv('GEO_CACHE_MAX_ENTRIES', '10000'))
+GEO_CACHE_REFRESH_WORKERS = int(os.getenv('GEO_CACHE_REFRESH_WORKERS', '4'))
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+_BASE32_INDEX = {char: i for i, char in enumerate(_BASE32)}
+
+# ==================== GEOHASH ====================
+def encode(lat, lon, precision=GEOHASH_PRECISION):
+    """Geohash of a point; raises ValueError for coordinates off the globe"""
+    lat, lon = float(lat), float(lon)
+    if not (-90.0 <= lat <= 90.0 and -180.0 <= lon <= 180.0):
+        raise ValueError(f'Coordinates out of range: {lat}, {lon}')
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, value, bits, even = [], 0, 0, True
+    while len(chars) < precision:
+        # Bits alternate longitude, latitude, starting with longitude
+        span, coordinate = (lon_range, lon) if even else (lat_range, lat)
+        mid = (span[0] + span[1]) / 2
+        if coordinate >= mid:
+            value = value * 2 + 1
+            span[0] = mid
+        else:
+            value *= 2
+            span[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            value, bits = 0, 0
+    return ''.join(chars)
+
+def bounds(cell):
+    """(lat_min, lat_max, lon_min, lon_max) of a geohash cell"""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for char in cell:
+        value = _BASE32_INDEX[char]
+        for shift in range(4, -1, -1):
+            span = lon_range if even else lat_range
+            mid = (span[0] + span[1]) / 2
+            if value >> shift & 1:
+                span[0] = mid
+            else:
+                span[1] = mid
+            even = not even
+    return lat_range[0], lat_range[1], lon_range[0], lon_range[1]
+
+def decode(cell):
+    """(lat, lon) at the centre of a geohash cell"""
+    lat_min, lat_max, lon_min, lon_max = bounds(cell)
+    return (lat_min + lat_max) / 2, (lon_min + lon_max) / 2
+
+def distance_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance (haversine)"""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 12742.0 * math.asin(math.sqrt(a))
+
+# ==================== PERSISTENCE ====================
+SELECT_ENTRY = 'SELECT fetched_at, payload FROM external_cache WHERE cache = ? AND cell = ?'
+
+UPSERT_ENTRY = '''
+    INSERT INTO external_cache (cache, cell, fetched_at, payload) VALUES (?, ?, ?, ?)
+    ON CONFLICT (cache, cell) DO UPDATE SET fetched_at = excluded.fetched_at, payload = excluded.payload
+'''
+
+class DatabaseStore:
+    """external_cache rows; reads on the caller's thread, writes through the write queue"""
+
+    def __init__(self, pool=None, writer=None):
+        self._pool = pool
+        self._writer = writer
+
+    @property
+    def pool(self):
+        return self._pool or db_pool.get_pool()
+
+    def load(self, cache, cell):
+        """(fetched_at, value) or None"""
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(SELECT_ENTRY, (cache, cell))
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        return float(row[0]), json.loads(row[1])
+
+    def save(self, cache, cell, entry):
+        params = (cache, cell, entry[0], json.dumps(entry[1]))
+        if self._writer is not None:
+            self._writer.submit(UPSERT_ENTRY, params)
+        elif write_queue.WRITE_QUEUE_ENABLED:
+            write_queue.get_write_queue().submit(UPSERT_ENTRY, params)
+        else:
+            with self.pool.connection() as conn:
+                conn.cursor().execute(UPSERT_ENTRY, params)
+                conn.commit()
+
+# ==================== CACHE ====================
+class GeoCache:
+    """Stale-while-revalidate cache of fetch(lat, lon) results per geohash cell"""
+
+    def __init__(self, name, fetch, ttl, max_stale=86400, error_ttl=60, precision=GEOHASH_PRECISION,
+                 wait_timeout=15, store=None, max_entries=GEO_CACHE_MAX_ENTRIES,
+                 workers=GEO_CACHE_REFRESH_WORKERS):
+        self.name = name
+        self.fetch = fetch
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.error_ttl = error_ttl
+        self.precision = precision
+        self.wait_timeout = wait_timeout
+        self.store = store
+        self.max_entries = max_entries
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._executor = None
+        self._entries = {}      # cell -> (fetched_at epoch seconds, value), oldest first
+        self._inflight = {}     # cell -> Future of the running refresh
+        self._failed_at = {}    # cell -> epoch seconds of the last failed refresh
+        self._checked = set()   # cells already looked up in the store
+        self._prefetched = {}   # cell -> centre, for cells a prefetcher keeps warm
+        self.prefetch_ttl = None
+        self.nearest_km = 0.0
+
+        # Metrics
+        self._hits = 0
+        self._stale_hits = 0
+        self._misses = 0
+        self._restored = 0
+        self._reloads = 0
+        self._refreshes = 0
+        self._upstream_errors = 0
+        self._latencies = deque(maxlen=1000)
+        self._max_latency = 0.0
+
+    def get(self, lat, lon):
+        """(value, info) for the cell containing lat/lon, or None when nothing recent is available
+
+        Raises ValueError for invalid coordinates.
+        """
+        cell = self.cell_for(lat, lon)
+        entry = self._entry(cell)
+        if entry is not None:
+            age = time.time() - entry[0]
+            if age < self._ttl(cell):
+                self._count('_hits')
+                return entry[1], self._info(cell, age, False)
+            if age < self._ttl(cell) + self.max_stale:
+                self._count('_stale_hits')
+                self._refresh_in_background(cell)
+                return entry[1], self._info(cell, age, True)
+        self._count('_misses')
+        try:
+            fresh = self._refresh_in_background(cell).result(timeout=self.wait_timeout)
+        except FutureTimeout:
+            fresh = None
+        if fresh is not None:
+            return fresh[1], self._info(cell, time.time() - fresh[0], False)
+        # Nothing, or only data older than max_stale: the caller falls back
+        return None
+
+    def refresh(self, lat, lon):
+        """Fetch the cell now, bypassing freshness; the new (fetched_at, value) or None"""
+        return self._refresh_in_background(encode(lat, lon, self.precision)).result()
+
+    def use_prefetched(self, cells, ttl, nearest_km=0.0):
+        """Mark cells a prefetcher refreshes every so often
+
+        They count as fresh for `ttl` seconds, lookups within `nearest_km`
+        of one of them (and outside their own prefetched cell) are served
+        from the nearest one, and their refreshes try the store first.
+        """
+        self._prefetched = {cell: decode(cell) for cell in cells}
+        self.prefetch_ttl = ttl
+        self.nearest_km = nearest_km
+
+    def cell_for(self, lat, lon):
+        """The cell lat/lon is served from: its own, or the nearest prefetched one"""
+        cell = encode(lat, lon, self.precision)
+        if cell in self._prefetched or not self.nearest_km or not self._prefetched:
+            return cell
+        lat, lon = float(lat), float(lon)
+        distance, nearest = min((distance_km(lat, lon, *centre), candidate)
+                                for candidate, centre in self._prefetched.items())
+        return nearest if distance <= self.nearest_km else cell
+
+    def prefetch(self, cell, max_age):
+        """Fetch a cell from upstream unless its entry is younger than max_age
+
+        Returns True when the upstream was called, whatever the outcome.
+        """
+        entry = self._entry(cell)
+        if entry is not None and time.time() - entry[0] < max_age:
+            return False
+        self._fetch(cell)
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._failed_at.clear()
+            self._checked.clear()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def stats(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            lookups = self._hits + self._stale_hits + self._misses
+            return {
+                'ttl_seconds': self.ttl,
+                'max_stale_seconds': self.max_stale,
+                'precision': self.precision,
+                'entries': len(self._entries),
+                'refreshing': len(self._inflight),
+                'hits': self._hits,
+                'stale_hits': self._stale_hits,
+                'misses': self._misses,
+                'hit_rate': round((self._hits + self._stale_hits) / lookups, 3) if lookups else 0.0,
+                'prefetched_cells': len(self._prefetched),
+                'restored': self._restored,
+                'reloads': self._reloads,
+                'refreshes': self._refreshes,
+                'upstream_errors': self._upstream_errors,
+                'upstream_latency_ms': {
+                    'avg': round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+                    'p95': round(latencies[int(len(latencies) * 0.95) - 1], 3) if latencies else 0.0,
+                    'max': round(self._max_latency, 3)
+                }
+            }
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _ttl(self, cell):
+        return self.prefetch_ttl if cell in self._prefetched else self.ttl
+
+    def _info(self, cell, age, stale):
+        return {'cell': cell, 'age_seconds': round(max(age, 0.0), 1), 'stale': stale}
+
+    def _entry(self, cell):
+        """The in-memory entry, read through from the store once per cell"""
+        entry = self._entries.get(cell)
+        if entry is not None or self.store is None or cell in self._checked:
+            return entry
+        with self._lock:
+            self._checked.add(cell)
+        try:
+            entry = self.store.load(self.name, cell)
+        except Exception as e:
+            print(f"{self.name} cache: could not load {cell}: {e}")
+            return None
+        if entry is None:
+            return None
+        with self._lock:
+            if cell not in self._entries:
+                self._put(cell, entry)
+                self._restored += 1
+            return self._entries[cell]
+
+    def _put(self, cell, entry):
+        # Caller holds the lock; re-inserting moves the cell to the young end
+        self._entries.pop(cell, None)
+        self._entries[cell] = entry
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            del self._entries[oldest]
+            self._checked.discard(oldest)
+
+    def _get_executor(self):
+        if self._executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                thread_name_prefix=f'geo-cache-{self.name}')
+        return self._executor
+
+    def _refresh_in_background(self, cell):
+        """Future of the cell's refresh; at most one runs per cell"""
+        with self._lock:
+            future = self._inflight.get(cell)
+            if future is not None:
+                return future
+            if time.time() - self._failed_at.get(cell, 0) < self.error_ttl:
+                future = Future()
+                future.set_result(None)
+                return future
+            future = self._inflight[cell] = self._get_executor().submit(self._refresh, cell)
+            return future
+
+    def _refresh(self, cell):
+        try:
+            entry = self._reload(cell) if cell in self._prefetched else None
+            return entry or self._fetch(cell)
+        finally:
+            with self._lock:
+                self._inflight.pop(cell, None)
+
+    def _reload(self, cell):
+        """The store's copy of a prefetched cell if it is fresh; the prefetcher may be another process"""
+        if self.store is None:
+            return None
+        try:
+            entry = self.store.load(self.name, cell)
+        except Exception as e:
+            print(f"{self.name} cache: could not reload {cell}: {e}")
+            return None
+        if entry is None or time.time() - entry[0] >= self.prefetch_ttl:
+            return None
+        with self._lock:
+            self._reloads += 1
+            self._put(cell, entry)
+        return entry
+
+    def _fetch(self, cell):
+        """Call the upstream for a cell and keep the result; None on failure"""
+        lat, lon = decode(cell)
+        start = time.perf_counter()
+        try:
+            value = self.fetch(lat, lon)
+        except Exception as e:
+            print(f"{self.name} cache: refresh of {cell} failed: {e}")
+            with self._lock:
+                self._record_latency(start)
+                self._upstream_errors += 1
+                self._failed_at[cell] = time.time()
+            return None
+        entry = (time.time(), value)
+        with self._lock:
+            self._record_latency(start)
+            self._refreshes += 1
+            self._failed_at.pop(cell, None)
+            self._put(cell, entry)
+        if self.store is not None:
+            try:
+                self.store.save(self.name, cell, entry)
+            except Exception as e:
+                print(f"{self.name} cache: could not save {cell}: {e}")
+        return entry
+
+    def _record_latency(self, start):
+        elapsed = (time.perf_counter() - start) * 1000
+        self._latencies.append(elapsed)
+        self._max_latency = max(self._max_latency, elapsed)
@@ -0,0 +1,38 @@
+# Google Translate client (like a google-translate-api wrapper in Node.js)
+#
+# Reads the same mobile translate page deep_translator's GoogleTranslator
+# scrapes, but the request goes through http_client, so translations share
+# the pooled session, the jittered retries and the per-upstream metrics
+# with every other external call. BeautifulSoup (bs4) parses the page and
+# is imported on first use.
+import os
+
+import http_client
+
+GOOGLE_TRANSLATE_URL = os.getenv('GOOGLE_TRANSLATE_URL', 'https://translate.google.com/m')
+GOOGLE_TRANSLATE_TIMEOUT = float(os.getenv('GOOGLE_TRANSLATE_TIMEOUT', '10'))
+MAX_CHARS = 5000
+
+class TranslationError(RuntimeError):
+    pass
+
+def translate(text, target, source='auto'):
+    """`text` translated to `target`; raises TranslationError"""
+    text = text.strip()
+    if not text or source == target:
+        return text
+    if len(text) > MAX_CHARS:
+        raise TranslationError(f"Text is longer than {MAX_CHARS} characters")
+
+    response = http_client.get('google_translate', GOOGLE_TRANSLATE_URL,
+                               params={'sl': source, 'tl': target, 'q': text},
+                               timeout=GOOGLE_TRANSLATE_TIMEOUT)
+    if response.status_code != 200:
+        raise TranslationError(f"Google Translate error: {response.status_code}")
+
+    from bs4 import BeautifulSoup
+    page = BeautifulSoup(response.text, 'html.parser')
+    element = page.find('div', {'class': 't0'}) or page.find('div', {'class': 'result-container'})
+    if element is None:
+        raise TranslationError("No translation found in the response")
+    return element.get_text(strip=True)
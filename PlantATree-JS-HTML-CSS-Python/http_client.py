@@ -0,0 +1,195 @@
+# Shared outbound HTTP client (like a keep-alive axios instance with axios-retry in Node.js)
+#
+# Every external call (Ambee, Google Translate, the health check probe) goes through one
+# requests.Session, so connections and TLS sessions are reused per host
+# instead of being set up for each call. At most HTTP_POOL_MAXSIZE idle
+# connections are kept per host; a burst beyond that opens extra
+# connections that are closed after use rather than making callers queue
+# (urllib3's blocking mode would wait without a timeout).
+#
+# Idempotent requests are retried on connection errors, timeouts and
+# 429 / 502 / 503 / 504 with exponential backoff and full jitter. The
+# `budget` caps the whole call (every attempt plus the sleeps between
+# them), so a retry never makes a caller wait longer than it asked to.
+# Latency is recorded per upstream as a histogram for /api/metrics.
+import os
+import random
+import threading
+import time
+
+HTTP_POOL_HOSTS = int(os.getenv('HTTP_POOL_HOSTS', '10'))
+HTTP_POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE', '10'))
+HTTP_RETRIES = int(os.getenv('HTTP_RETRIES', '2'))
+HTTP_BACKOFF = float(os.getenv('HTTP_BACKOFF', '0.2'))
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '3.05'))
+
+RETRY_STATUSES = frozenset((429, 502, 503, 504))
+IDEMPOTENT_METHODS = frozenset(('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'))
+
+# Upper bounds in ms; the last bucket catches everything slower
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, float('inf'))
+
+class UpstreamStats:
+    """Call, retry and error counts plus a latency histogram for one upstream"""
+
+    def __init__(self):
+        self.calls = 0
+        self.attempts = 0
+        self.retries = 0
+        self.errors = 0
+        self.statuses = {}
+        self.buckets = [0] * len(LATENCY_BUCKETS_MS)
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, elapsed_ms):
+        for i, bound in enumerate(LATENCY_BUCKETS_MS):
+            if elapsed_ms <= bound:
+                self.buckets[i] += 1
+                break
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the given fraction of calls"""
+        target = fraction * sum(self.buckets)
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS_MS, self.buckets):
+            seen += count
+            if count and seen >= target:
+                return bound if bound != float('inf') else round(self.max_ms, 3)
+        return 0.0
+
+    def as_dict(self):
+        return {
+            'calls': self.calls,
+            'attempts': self.attempts,
+            'retries': self.retries,
+            'errors': self.errors,
+            'statuses': dict(sorted(self.statuses.items())),
+            'latency_ms': {
+                'avg': round(self.total_ms / self.calls, 3) if self.calls else 0.0,
+                'p50': self.percentile(0.5),
+                'p95': self.percentile(0.95),
+                'max': round(self.max_ms, 3),
+                'histogram': {('+Inf' if bound == float('inf') else str(bound)): count
+                              for bound, count in zip(LATENCY_BUCKETS_MS, self.buckets)}
+            }
+        }
+
+class HttpClient:
+    """Pooled session with jittered retries and per-upstream latency histograms"""
+
+    def __init__(self, pool_hosts=HTTP_POOL_HOSTS, pool_maxsize=HTTP_POOL_MAXSIZE,
+                 retries=HTTP_RETRIES, backoff=HTTP_BACKOFF):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.retries = retries
+        self.backoff = backoff
+        self.session = requests.Session()
+        # Retries are handled below so they share the caller's budget
+        adapter = HTTPAdapter(pool_connections=pool_hosts, pool_maxsize=pool_maxsize,
+                              pool_block=False, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def request(self, method, upstream, url, timeout=10, budget=None, retries=None, **kwargs):
+        """Send a request, retrying idempotent ones within `budget` seconds (default: timeout)
+
+        `timeout` bounds each attempt's read; the final response is returned
+        whatever its status, and the last transport error is raised once
+        the retries or the budget run out.
+        """
+        import requests
+
+        method = method.upper()
+        retries = self.retries if retries is None else retries
+        if method not in IDEMPOTENT_METHODS:
+            retries = 0
+        deadline = time.monotonic() + (timeout if budget is None else budget)
+        start = time.perf_counter()
+        attempts = 0
+        response = error = None
+        while True:
+            attempts += 1
+            remaining = max(deadline - time.monotonic(), 0.001)
+            try:
+                response = self.session.request(
+                    method, url, timeout=(min(HTTP_CONNECT_TIMEOUT, remaining), min(timeout, remaining)),
+                    **kwargs)
+                error = None
+            except (requests.ConnectionError, requests.Timeout) as e:
+                response, error = None, e
+            retryable = error is not None or response.status_code in RETRY_STATUSES
+            if not retryable or attempts > retries:
+                break
+            delay = self._delay(attempts, response)
+            if time.monotonic() + delay >= deadline - 0.05:
+                break  # no time left for another attempt
+            if response is not None:
+                response.close()
+            time.sleep(delay)
+
+        self._record(upstream, start, attempts, response, error)
+        if error is not None:
+            raise error
+        return response
+
+    def get(self, upstream, url, **kwargs):
+        return self.request('GET', upstream, url, **kwargs)
+
+    def _delay(self, attempt, response):
+        """Full jitter backoff, or the server's Retry-After when it sends seconds"""
+        if response is not None:
+            retry_after = response.headers.get('Retry-After', '')
+            if retry_after.isdigit():
+                return float(retry_after)
+        return random.uniform(0, self.backoff * 2 ** (attempt - 1))
+
+    def _record(self, upstream, start, attempts, response, error):
+        elapsed = (time.perf_counter() - start) * 1000
+        with self._lock:
+            stats = self._stats.get(upstream)
+            if stats is None:
+                stats = self._stats[upstream] = UpstreamStats()
+            stats.calls += 1
+            stats.attempts += attempts
+            stats.retries += attempts - 1
+            if error is not None or response.status_code >= 500:
+                stats.errors += 1
+            status = 'error' if error is not None else str(response.status_code)
+            stats.statuses[status] = stats.statuses.get(status, 0) + 1
+            stats.observe(elapsed)
+
+    def stats(self):
+        with self._lock:
+            return {upstream: stats.as_dict() for upstream, stats in sorted(self._stats.items())}
+
+    def close(self):
+        self.session.close()
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """Process-wide client, created on first use"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = HttpClient()
+    return _client
+
+def request(method, upstream, url, **kwargs):
+    return get_client().request(method, upstream, url, **kwargs)
+
+def get(upstream, url, **kwargs):
+    return get_client().get(upstream, url, **kwargs)
+
+def stats():
+    if _client is None:
+        return {}
+    return _client.stats()
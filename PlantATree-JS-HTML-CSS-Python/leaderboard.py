@@ -0,0 +1,345 @@
+# In-memory leaderboard engine (like a Redis sorted set next to a Node.js app)
+#
+# All-time rankings are kept in an indexable skip list ordered by points,
+# then approved actions, so the top N, any rank window and a user's own
+# rank cost O(log n) instead of sorting every user per request. The engine
+# is loaded once from user_stats and then follows the write path through
+# repository.user_stats_listeners; changes are applied only after their
+# transaction commits. Writes from other processes (other gunicorn workers,
+# the admin CLIs) are detected through the version.user_stats counter; the
+# users they touched are re-read from the user_stats_changes log, and only a
+# gap the log no longer covers costs a full rebuild.
+import os
+import random
+import threading
+import time
+
+import db_pool
+import repository
+
+LEADERBOARD_ENABLED = os.getenv('LEADERBOARD_ENABLED', 'true').lower() == 'true'
+# How often (seconds) a request re-reads the version counter
+LEADERBOARD_CHECK_INTERVAL = float(os.getenv('LEADERBOARD_CHECK_INTERVAL', '1'))
+
+SELECT_RANKED_USERS = '''
+    SELECT u.id, u.username, COALESCE(s.total_points, 0), COALESCE(s.action_count, 0), u.created_at
+    FROM users u
+    LEFT JOIN user_stats s ON s.user_id = u.id
+'''
+
+SELECT_RANKED_USER = SELECT_RANKED_USERS + ' WHERE u.id = ?'
+
+SELECT_CHANGED_RANKED_USERS = SELECT_RANKED_USERS + '''
+    WHERE u.id IN (SELECT user_id FROM user_stats_changes WHERE version > ? AND version <= ?)
+'''
+
+# ==================== INDEXABLE SKIP LIST ====================
+_MAX_LEVEL = 32
+
+class _Node:
+    __slots__ = ('key', 'next', 'width')
+
+    def __init__(self, key, levels):
+        self.key = key
+        self.next = [None] * levels
+        # width[i]: how many positions next[i] skips ahead
+        self.width = [1] * levels
+
+class IndexableSkipList:
+    """Sorted set of unique keys with O(log n) insert, remove, rank and index lookups"""
+
+    def __init__(self):
+        self._head = _Node(None, _MAX_LEVEL)
+        self._levels = 1
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        node = self._head.next[0]
+        while node is not None:
+            yield node.key
+            node = node.next[0]
+
+    def _random_levels(self):
+        levels = 1
+        while levels < _MAX_LEVEL and random.random() < 0.5:
+            levels += 1
+        return levels
+
+    def _path(self, key):
+        """Rightmost node before `key` on every level, and its 0-based position"""
+        update = [None] * _MAX_LEVEL
+        positions = [0] * _MAX_LEVEL
+        node, position = self._head, -1
+        for level in range(self._levels - 1, -1, -1):
+            while node.next[level] is not None and node.next[level].key < key:
+                position += node.width[level]
+                node = node.next[level]
+            update[level] = node
+            positions[level] = position
+        return update, positions
+
+    def insert(self, key):
+        update, positions = self._path(key)
+        levels = self._random_levels()
+        for level in range(self._levels, levels):
+            update[level] = self._head
+            positions[level] = -1
+            self._head.width[level] = self._size + 1
+        self._levels = max(self._levels, levels)
+
+        new = _Node(key, levels)
+        index = positions[0] + 1
+        for level in range(levels):
+            prev = update[level]
+            new.next[level] = prev.next[level]
+            prev.next[level] = new
+            skipped = index - positions[level]
+            new.width[level] = prev.width[level] - skipped + 1
+            prev.width[level] = skipped
+        for level in range(levels, self._levels):
+            update[level].width[level] += 1
+        self._size += 1
+
+    def remove(self, key):
+        update, _ = self._path(key)
+        node = update[0].next[0]
+        if node is None or node.key != key:
+            raise KeyError(key)
+        for level in range(self._levels):
+            prev = update[level]
+            if prev.next[level] is node:
+                prev.width[level] += node.width[level] - 1
+                prev.next[level] = node.next[level]
+            else:
+                prev.width[level] -= 1
+        while self._levels > 1 and self._head.next[self._levels - 1] is None:
+            self._levels -= 1
+        self._size -= 1
+
+    def rank(self, key):
+        """0-based position of `key`"""
+        update, positions = self._path(key)
+        node = update[0].next[0]
+        if node is None or node.key != key:
+            raise KeyError(key)
+        return positions[0] + 1
+
+    def slice(self, start, count):
+        """Up to `count` keys starting at 0-based position `start`"""
+        if start < 0 or start >= self._size or count <= 0:
+            return []
+        node, position = self._head, -1
+        for level in range(self._levels - 1, -1, -1):
+            while node.next[level] is not None and position + node.width[level] < start:
+                position += node.width[level]
+                node = node.next[level]
+        keys = []
+        while node is not None and len(keys) < count:
+            node = node.next[0]
+            if node is not None:
+                keys.append(node.key)
+        return keys
+
+# ==================== LEADERBOARD ====================
+class Leaderboard:
+    """All-time user ranking by (points, actions), kept in memory"""
+
+    def __init__(self):
+        self._ranks = IndexableSkipList()
+        self._users = {}  # user_id -> (key, username, created_at)
+        self._lock = threading.RLock()
+        self.version = None
+        self._checked_at = 0.0
+        self._rebuilds = 0
+        self._catch_ups = 0
+        self._updates = 0
+        self._rebuild_ms = 0.0
+
+    @staticmethod
+    def _key(user_id, points, actions):
+        # Ascending skip list order == best first; user id breaks ties
+        return (-points, -actions, user_id)
+
+    def _set(self, user_id, username, points, actions, created_at):
+        old = self._users.get(user_id)
+        key = self._key(user_id, points, actions)
+        if old is not None:
+            if old[0] == key:
+                self._users[user_id] = (key, username, created_at)
+                return
+            self._ranks.remove(old[0])
+        self._ranks.insert(key)
+        self._users[user_id] = (key, username, created_at)
+
+    def _drop(self, user_id):
+        old = self._users.pop(user_id, None)
+        if old is not None:
+            self._ranks.remove(old[0])
+
+    def rebuild(self, conn):
+        """Reload every user's totals from the database"""
+        start = time.perf_counter()
+        # Version first: a write landing in between only causes one more rebuild
+        version = repository.user_stats_version(conn)
+        rows = repository.fetch_all(conn, SELECT_RANKED_USERS)
+        ranks, users = IndexableSkipList(), {}
+        for user_id, username, points, actions, created_at in rows:
+            key = self._key(user_id, points, actions)
+            ranks.insert(key)
+            users[user_id] = (key, username, created_at)
+        with self._lock:
+            self._ranks, self._users = ranks, users
+            self.version = version
+            self._checked_at = time.monotonic()
+            self._rebuilds += 1
+            self._rebuild_ms = (time.perf_counter() - start) * 1000
+        return len(users)
+
+    def needs_check(self, max_age=LEADERBOARD_CHECK_INTERVAL):
+        return self.version is None or time.monotonic() - self._checked_at >= max_age
+
+    def ensure_current(self, conn):
+        """Catch up with changes this process has not seen; True when anything was re-read
+
+        Only the users logged since our version are re-read; when the log
+        no longer covers the whole gap everything is rebuilt.
+        """
+        version = repository.user_stats_version(conn)
+        with self._lock:
+            seen = self.version
+            if seen == version:
+                self._checked_at = time.monotonic()
+                return False
+        if seen is not None and seen < version:
+            user_ids = repository.changed_users(conn, seen, version)
+            if user_ids is not None:
+                rows = repository.fetch_all(conn, SELECT_CHANGED_RANKED_USERS, (seen, version))
+                self._catch_up(seen, version, user_ids, rows)
+                return True
+        self.rebuild(conn)
+        return True
+
+    def _catch_up(self, seen, version, user_ids, rows):
+        with self._lock:
+            if self.version != seen:
+                return  # a rebuild or a committed local change moved on; the next check retries
+            found = set()
+            for row in rows:
+                self._set(*row)
+                found.add(row[0])
+            for user_id in user_ids:
+                if user_id not in found:
+                    self._drop(user_id)  # deleted
+            self.version = version
+            self._checked_at = time.monotonic()
+            self._catch_ups += 1
+
+    def apply(self, user_id, row, version):
+        """Apply one committed change (row is None when the user was deleted)"""
+        with self._lock:
+            if self.version is None or version <= self.version:
+                return  # not loaded yet, or a rebuild already saw this change
+            if row is None:
+                self._drop(user_id)
+            else:
+                self._set(*row)
+            self._updates += 1
+            if version == self.version + 1:
+                self.version = version
+            # Otherwise another process wrote in between: keep the old version
+            # so the next ensure_current() catches up
+
+    def _entry(self, key, rank):
+        user_id = key[2]
+        _, username, created_at = self._users[user_id]
+        return {'rank': rank, 'id': user_id, 'username': username,
+                'points': -key[0], 'actions': -key[1], 'join_date': created_at}
+
+    def window(self, start, count):
+        """Entries for 0-based ranks start .. start + count - 1"""
+        with self._lock:
+            keys = self._ranks.slice(start, count)
+            return [self._entry(key, start + i + 1) for i, key in enumerate(keys)]
+
+    def top(self, n):
+        return self.window(0, n)
+
+    def rank_of(self, user_id):
+        """1-based rank of a user, or None for an unknown user"""
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is None:
+                return None
+            return self._ranks.rank(entry[0]) + 1
+
+    def around(self, user_id, radius):
+        """The user's entry plus up to `radius` neighbours on each side"""
+        with self._lock:
+            rank = self.rank_of(user_id)
+            if rank is None:
+                return None, []
+            start = max(rank - 1 - radius, 0)
+            return rank, self.window(start, rank - 1 - start + radius + 1)
+
+    def position(self, user_id, radius=5):
+        """Rank, percentile and neighbours for one user, or None for an unknown user"""
+        with self._lock:
+            rank, neighbours = self.around(user_id, radius)
+            if rank is None:
+                return None
+            total = len(self._users)
+            return {
+                'rank': rank,
+                'total_users': total,
+                # Share of the other users ranked below this one
+                'percentile': round(100.0 * (total - rank) / (total - 1), 1) if total > 1 else 100.0,
+                'neighbours': neighbours
+            }
+
+    def __len__(self):
+        return len(self._users)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': LEADERBOARD_ENABLED,
+                'users': len(self._users),
+                'version': self.version,
+                'rebuilds': self._rebuilds,
+                'catch_ups': self._catch_ups,
+                'updates': self._updates,
+                'last_rebuild_ms': round(self._rebuild_ms, 3)
+            }
+
+LEADERBOARD = Leaderboard()
+
+def _on_user_changed(conn, user_id, version):
+    # Runs inside the writing transaction, so this reads the new totals
+    row = repository.fetch_one(conn, SELECT_RANKED_USER, (user_id,))
+    if row is not None:
+        row = tuple(row)
+    db_pool.after_commit(conn, lambda: LEADERBOARD.apply(user_id, row, version))
+
+if LEADERBOARD_ENABLED:
+    repository.user_stats_listeners.append(_on_user_changed)
+
+def get_leaderboard():
+    """The process-wide leaderboard, loaded or refreshed as needed
+
+    The version check goes to the primary: a snapshot or replica may lag
+    behind changes this process has already applied. A request that
+    already holds a primary connection lends it (a second checkout could
+    wait on a pool its own handler exhausted); otherwise a short-lived one
+    is used, so the request's reads keep going to the read pool.
+    """
+    if LEADERBOARD.needs_check():
+        conn = db_pool.request_connection()
+        if conn is not None:
+            LEADERBOARD.ensure_current(conn)
+        else:
+            with db_pool.get_pool().connection() as conn:
+                LEADERBOARD.ensure_current(conn)
+    return LEADERBOARD
@@ -128,7 +128,8 @@ def add_cors_headers(response):
     """Add CORS headers to response"""
     response.headers['Access-Control-Allow-Origin'] = '*'
     response.headers['Access-Control-Allow-Methods'] = 'GET, POST, PUT, DELETE, OPTIONS'
-    response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization'
+    response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization, Idempotency-Key'
+    response.headers['Access-Control-Expose-Headers'] = 'X-Next-Cursor'
     return response
 
 # Response compression middleware (like compression for Express.js)
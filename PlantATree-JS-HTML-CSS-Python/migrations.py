@@ -0,0 +1,253 @@
+# Versioned schema migrations (like knex / sequelize migrations for Node.js)
+#
+# Each migration is (version, description, steps). A step is either a SQL
+# string or a callable taking a cursor. Versions are applied in order, each
+# in its own transaction, and recorded in the schema_version table.
+
+def _build_platform_counters(cursor):
+    import repository
+    repository.reconcile_counters(cursor.connection)
+
+def _build_daily_user_stats(cursor):
+    import repository
+    repository.rebuild_daily_user_stats(cursor.connection)
+
+def _build_points_ledger(cursor):
+    import repository
+    repository.backfill_points_ledger(cursor.connection)
+
+MIGRATIONS = [
+    (1, 'Add hot-path indexes for feeds, profiles, stats and session cleanup', [
+        # Feed: WHERE approved = TRUE ORDER BY created_at DESC
+        'CREATE INDEX IF NOT EXISTS idx_eco_actions_approved_created ON eco_actions (approved, created_at)',
+        # Profile / recent actions: WHERE user_id = ? AND approved = TRUE ORDER BY created_at DESC
+        'CREATE INDEX IF NOT EXISTS idx_eco_actions_user_approved_created ON eco_actions (user_id, approved, created_at)',
+        # Stats and type-filtered leaderboard: WHERE type = ? AND approved = TRUE
+        'CREATE INDEX IF NOT EXISTS idx_eco_actions_type_approved ON eco_actions (type, approved)',
+        # Map and v1 list: WHERE approved = TRUE [AND type = ?] ORDER BY created_at DESC
+        'CREATE INDEX IF NOT EXISTS idx_locations_approved_type_created ON locations (approved, type, created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_locations_approved_created ON locations (approved, created_at)',
+        # Expired session cleanup; logout already uses the UNIQUE index on session_token
+        'CREATE INDEX IF NOT EXISTS idx_user_sessions_expires ON user_sessions (expires_at)',
+        'CREATE INDEX IF NOT EXISTS idx_user_sessions_user ON user_sessions (user_id)',
+    ]),
+    (2, 'Add per-user stats maintained by the eco action write path', [
+        '''
+        CREATE TABLE IF NOT EXISTS user_stats (
+            user_id INTEGER PRIMARY KEY,
+            total_points INTEGER NOT NULL DEFAULT 0,
+            action_count INTEGER NOT NULL DEFAULT 0,
+            last_action_at TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS user_type_stats (
+            user_id INTEGER NOT NULL,
+            type TEXT NOT NULL,
+            total_points INTEGER NOT NULL DEFAULT 0,
+            action_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, type)
+        )
+        ''',
+        # All-time leaderboard: ORDER BY total_points DESC
+        'CREATE INDEX IF NOT EXISTS idx_user_stats_points ON user_stats (total_points, action_count)',
+        'CREATE INDEX IF NOT EXISTS idx_user_type_stats_type_points ON user_type_stats (type, total_points)',
+        '''
+        INSERT INTO user_stats (user_id, total_points, action_count, last_action_at)
+        SELECT user_id, COALESCE(SUM(points), 0), COUNT(*), MAX(created_at)
+        FROM eco_actions
+        WHERE approved = TRUE AND user_id IS NOT NULL
+        GROUP BY user_id
+        ''',
+        '''
+        INSERT INTO user_type_stats (user_id, type, total_points, action_count)
+        SELECT user_id, type, COALESCE(SUM(points), 0), COUNT(*)
+        FROM eco_actions
+        WHERE approved = TRUE AND user_id IS NOT NULL
+        GROUP BY user_id, type
+        ''',
+        # users.points was never credited for eco actions; add what they earned so far
+        '''
+        UPDATE users SET points = COALESCE(points, 0) + (
+            SELECT s.total_points FROM user_stats s WHERE s.user_id = users.id
+        ) WHERE id IN (SELECT user_id FROM user_stats)
+        ''',
+    ]),
+    (3, 'Add platform counters for the stats endpoints', [
+        '''
+        CREATE TABLE IF NOT EXISTS platform_counters (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+        )
+        ''',
+        _build_platform_counters,
+    ]),
+    (4, 'Add daily per-user rollups for period and type leaderboards', [
+        '''
+        CREATE TABLE IF NOT EXISTS daily_user_stats (
+            day TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            type TEXT NOT NULL,
+            points INTEGER NOT NULL DEFAULT 0,
+            action_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, user_id, type)
+        )
+        ''',
+        # Period leaderboards scan the primary key by day; profiles and user deletion go by user
+        'CREATE INDEX IF NOT EXISTS idx_daily_user_stats_user_day ON daily_user_stats (user_id, day)',
+        _build_daily_user_stats,
+    ]),
+    (5, 'Add (created_at, id) indexes for keyset pagination', [
+        # Newest-first lists page by (created_at, id); the id column lets
+        # Postgres walk the index for ties (SQLite indexes already end in the rowid)
+        'CREATE INDEX IF NOT EXISTS idx_locations_approved_created_id ON locations (approved, created_at, id)',
+        'CREATE INDEX IF NOT EXISTS idx_locations_approved_type_created_id ON locations (approved, type, created_at, id)',
+        'CREATE INDEX IF NOT EXISTS idx_eco_actions_approved_created_id ON eco_actions (approved, created_at, id)',
+        'CREATE INDEX IF NOT EXISTS idx_eco_actions_approved_type_created_id ON eco_actions (approved, type, created_at, id)',
+        'CREATE INDEX IF NOT EXISTS idx_eco_actions_user_approved_created_id ON eco_actions (user_id, approved, created_at, id)',
+        'CREATE INDEX IF NOT EXISTS idx_users_created_id ON users (created_at, id)',
+        'CREATE INDEX IF NOT EXISTS idx_sofia_redesigns_created_id ON sofia_redesigns (created_at, id)',
+        # Superseded by the indexes above
+        'DROP INDEX IF EXISTS idx_locations_approved_created',
+        'DROP INDEX IF EXISTS idx_locations_approved_type_created',
+        'DROP INDEX IF EXISTS idx_eco_actions_approved_created',
+        'DROP INDEX IF EXISTS idx_eco_actions_user_approved_created',
+    ]),
+    (6, 'Add the append-only points ledger', [
+        '''
+        CREATE TABLE IF NOT EXISTS points_ledger (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            idempotency_key TEXT NOT NULL UNIQUE,
+            user_id INTEGER,
+            type TEXT,
+            action_id INTEGER,
+            reason TEXT NOT NULL,
+            delta INTEGER NOT NULL,
+            user_balance INTEGER,
+            global_balance INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        # A user's history, newest first
+        'CREATE INDEX IF NOT EXISTS idx_points_ledger_user_id ON points_ledger (user_id, id)',
+        _build_points_ledger,
+    ]),
+    (7, 'Add the persistent cache for Ambee lookups', [
+        '''
+        CREATE TABLE IF NOT EXISTS external_cache (
+            cache TEXT NOT NULL,
+            cell TEXT NOT NULL,
+            fetched_at DOUBLE PRECISION NOT NULL,
+            payload TEXT NOT NULL,
+            PRIMARY KEY (cache, cell)
+        )
+        ''',
+    ]),
+    (8, 'Add the air quality history with hourly and daily rollups', [
+        # Raw readings, append-only; epoch seconds
+        '''
+        CREATE TABLE IF NOT EXISTS aq_samples (
+            cell TEXT NOT NULL,
+            ts BIGINT NOT NULL,
+            aqi DOUBLE PRECISION,
+            pm25 DOUBLE PRECISION,
+            pm10 DOUBLE PRECISION,
+            no2 DOUBLE PRECISION,
+            o3 DOUBLE PRECISION,
+            co DOUBLE PRECISION,
+            so2 DOUBLE PRECISION,
+            PRIMARY KEY (cell, ts)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS aq_hourly (
+            cell TEXT NOT NULL,
+            bucket BIGINT NOT NULL,
+            samples INTEGER NOT NULL,
+            aqi DOUBLE PRECISION,
+            pm25 DOUBLE PRECISION,
+            pm10 DOUBLE PRECISION,
+            no2 DOUBLE PRECISION,
+            o3 DOUBLE PRECISION,
+            co DOUBLE PRECISION,
+            so2 DOUBLE PRECISION,
+            PRIMARY KEY (cell, bucket)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS aq_daily (
+            cell TEXT NOT NULL,
+            bucket BIGINT NOT NULL,
+            samples INTEGER NOT NULL,
+            aqi DOUBLE PRECISION,
+            pm25 DOUBLE PRECISION,
+            pm10 DOUBLE PRECISION,
+            no2 DOUBLE PRECISION,
+            o3 DOUBLE PRECISION,
+            co DOUBLE PRECISION,
+            so2 DOUBLE PRECISION,
+            PRIMARY KEY (cell, bucket)
+        )
+        ''',
+        # Rollup windows and retention deletes go by time across all cells
+        'CREATE INDEX IF NOT EXISTS idx_aq_samples_ts ON aq_samples (ts)',
+        'CREATE INDEX IF NOT EXISTS idx_aq_hourly_bucket ON aq_hourly (bucket)',
+    ]),
+    (9, 'Add the user stats change log for incremental leaderboard updates', [
+        # version.user_stats value -> the user that change was for
+        '''
+        CREATE TABLE IF NOT EXISTS user_stats_changes (
+            version BIGINT PRIMARY KEY,
+            user_id INTEGER NOT NULL
+        )
+        ''',
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+def ensure_version_table(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+def current_version(conn):
+    """Highest applied migration version (0 for a database never migrated)"""
+    cursor = conn.cursor()
+    ensure_version_table(cursor)
+    cursor.execute('SELECT MAX(version) FROM schema_version')
+    version = cursor.fetchone()[0]
+    conn.commit()
+    return version or 0
+
+def pending_migrations(conn):
+    version = current_version(conn)
+    return [m for m in MIGRATIONS if m[0] > version]
+
+def run_migrations(conn, target=None):
+    """Apply every pending migration up to `target`; returns the versions applied"""
+    applied = []
+    for version, description, steps in pending_migrations(conn):
+        if target is not None and version > target:
+            break
+        cursor = conn.cursor()
+        try:
+            for step in steps:
+                if callable(step):
+                    step(cursor)
+                else:
+                    cursor.execute(step)
+            cursor.execute(
+                'INSERT INTO schema_version (version, description) VALUES (?, ?)',
+                (version, description)
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append((version, description))
+    return applied
@@ -0,0 +1,81 @@
+# Keyset (cursor) pagination (like cursor-based paging in GraphQL/Relay APIs)
+#
+# List endpoints are ordered newest first by (created_at, id). Instead of
+# LIMIT/OFFSET, which reads and throws away every skipped row, a page ends
+# with an opaque cursor holding the last row's (created_at, id); the next
+# page starts right after it with an index range scan, so page 1000 costs
+# the same as page 1. Each paged table has a (…, created_at, id) index.
+import base64
+import json
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 500
+
+class InvalidCursor(ValueError):
+    pass
+
+def encode_cursor(created_at, row_id):
+    """Opaque token for the position right after (created_at, row_id)"""
+    raw = json.dumps([str(created_at), row_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(token):
+    """(created_at, row_id) from a token; raises InvalidCursor"""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        created_at, row_id = json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(f'Invalid cursor: {token!r}') from e
+    if not isinstance(created_at, str) or not isinstance(row_id, int):
+        raise InvalidCursor(f'Invalid cursor: {token!r}')
+    return created_at, row_id
+
+def page_args(args, default_limit=DEFAULT_LIMIT):
+    """(limit, after) from request args; limit is None for an unbounded default"""
+    limit = args.get('limit', default_limit, type=int)
+    if limit is not None:
+        limit = min(max(limit, 1), MAX_LIMIT)
+    token = args.get('cursor')
+    after = decode_cursor(token) if token else None
+    return limit, after
+
+def keyset_query(select_sql, conditions, params, after, limit,
+                 created_column='created_at', id_column='id'):
+    """Append the cursor condition, newest-first ORDER BY and LIMIT to a query
+
+    `select_sql` has no WHERE clause; `conditions` are ANDed together.
+    Returns (sql, params). One extra row is fetched to tell whether there
+    is a next page.
+    """
+    conditions = list(conditions)
+    params = list(params)
+    if after is not None:
+        # Written so the created_at range can use the index on both backends
+        conditions.append(f'{created_column} <= ? AND ({created_column} < ? OR {id_column} < ?)')
+        params.extend([after[0], after[0], after[1]])
+    sql = select_sql
+    if conditions:
+        sql += ' WHERE ' + ' AND '.join(conditions)
+    sql += f' ORDER BY {created_column} DESC, {id_column} DESC'
+    if limit is not None:
+        sql += ' LIMIT ?'
+        params.append(limit + 1)
+    return sql, params
+
+def fetch_page(conn, select_sql, conditions=(), params=(), after=None, limit=DEFAULT_LIMIT,
+               created_column='created_at', id_column='id', created_index=None, id_index=0):
+    """(rows, next_cursor) for one page; next_cursor is None on the last page
+
+    `created_index` / `id_index` locate the ordering columns in each row
+    (created_index defaults to the last column).
+    """
+    sql, params = keyset_query(select_sql, conditions, params, after, limit, created_column, id_column)
+    cursor = conn.cursor()
+    cursor.execute(sql, params)
+    rows = cursor.fetchall()
+    if limit is None or len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    created = last[len(last) - 1 if created_index is None else created_index]
+    return rows, encode_cursor(created, last[id_index])
@@ -5,24 +5,22 @@ Provides quick commands for common admin tasks
 """
 import sys
 import os
-import sqlite3
 from datetime import datetime
 
+import repository
+
 def get_db_connection():
-    conn = sqlite3.connect('infousers.db')
-    conn.row_factory = sqlite3.Row
-    return conn
+    return repository.get_connection()
 
 def quick_delete_action(action_id):
     """Quickly delete an action by ID"""
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    cursor.execute('SELECT title FROM eco_actions WHERE id = ?', (action_id,))
-    action = cursor.fetchone()
+    action = repository.get_eco_action(conn, action_id)
     
     if action:
-        cursor.execute('DELETE FROM eco_actions WHERE id = ?', (action_id,))
+        repository.delete_eco_action(conn, action_id)
         conn.commit()
         print(f"✅ Deleted action: {action['title']}")
     else:
@@ -58,10 +56,8 @@ def quick_list_actions():
 def quick_approve_all():
     """Approve all pending actions"""
     conn = get_db_connection()
-    cursor = conn.cursor()
     
-    cursor.execute('UPDATE eco_actions SET approved = TRUE WHERE approved = FALSE')
-    affected = cursor.rowcount
+    affected = repository.approve_all_pending_actions(conn)
     conn.commit()
     conn.close()
     
@@ -78,7 +74,7 @@ if __name__ == '__main__':
     
     command = sys.argv[1].lower()
     
-    if not os.path.exists('infousers.db'):
+    if not repository.database_exists():
         print("❌ Database not found!")
         sys.exit(1)
     
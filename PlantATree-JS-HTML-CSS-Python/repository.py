@@ -0,0 +1,846 @@
+# Shared data-access layer (like a repository/DAO module in Node.js apps)
+#
+# app.py, routes_v1.py and the admin scripts all get their connections and
+# shared statements from here, so pooling, query timing and caching have a
+# single choke point. Statements are module-level constants: the identical
+# SQL text lets each pooled SQLite connection reuse its prepared statement.
+import os
+import threading
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+import db_pool
+import sql_dialect
+
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '200'))
+QUERY_CACHE_MAX_ENTRIES = int(os.getenv('QUERY_CACHE_MAX_ENTRIES', '512'))
+
+# ==================== CONNECTIONS ====================
+def get_connection():
+    """Pooled connection (shared for the whole request inside Flask)"""
+    return db_pool.get_connection()
+
+def get_read_connection():
+    """Connection for read-only handlers (replica / read-only target unless read-your-writes)"""
+    return db_pool.get_read_connection()
+
+def database_exists():
+    """True when the configured database is reachable from this directory"""
+    if db_pool.get_pool().backend == 'postgres':
+        return True
+    return os.path.exists(db_pool.SQLITE_PATH)
+
+def dialect(conn=None):
+    """'sqlite' or 'postgres' for `conn` (or the configured pool)"""
+    if conn is None:
+        return db_pool.get_pool().backend
+    raw = getattr(conn, '_conn', conn)
+    return sql_dialect.SQLITE if isinstance(raw, sqlite3.Connection) else sql_dialect.POSTGRES
+
+# ==================== QUERY TIMING ====================
+class QueryStats:
+    """Per-statement call counts and latency, keyed by normalized SQL"""
+
+    def __init__(self, max_statements=500):
+        self.max_statements = max_statements
+        self._lock = threading.Lock()
+        self._normalized = {}
+        self._stats = {}
+
+    def record(self, sql, seconds):
+        if not isinstance(sql, str):
+            sql = str(sql)
+        key = self._normalized.get(sql)
+        if key is None:
+            key = ' '.join(sql.split())
+            if len(self._normalized) < self.max_statements:
+                self._normalized[sql] = key
+        ms = seconds * 1000
+        with self._lock:
+            entry = self._stats.get(key)
+            if entry is None:
+                if len(self._stats) >= self.max_statements:
+                    return
+                entry = self._stats[key] = {'calls': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'slow': 0}
+            entry['calls'] += 1
+            entry['total_ms'] += ms
+            if ms > entry['max_ms']:
+                entry['max_ms'] = ms
+            if ms >= SLOW_QUERY_MS:
+                entry['slow'] += 1
+        if ms >= SLOW_QUERY_MS:
+            print(f"Slow query ({ms:.1f}ms): {key[:200]}")
+
+    def snapshot(self, limit=20):
+        with self._lock:
+            items = sorted(self._stats.items(), key=lambda item: item[1]['total_ms'], reverse=True)
+            return [{
+                'sql': sql[:200],
+                'calls': entry['calls'],
+                'total_ms': round(entry['total_ms'], 3),
+                'avg_ms': round(entry['total_ms'] / entry['calls'], 3),
+                'max_ms': round(entry['max_ms'], 3),
+                'slow': entry['slow']
+            } for sql, entry in items[:limit]]
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+QUERY_STATS = QueryStats()
+db_pool.query_observers.append(QUERY_STATS.record)
+
+def query_stats(limit=20):
+    return QUERY_STATS.snapshot(limit)
+
+# ==================== QUERY CACHE ====================
+class QueryCache:
+    """Small TTL cache for read results, dropped when a commit writes a dependent table"""
+
+    def __init__(self, max_entries=QUERY_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = {}  # (sql, params) -> (expires_at, rows, tables)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, rows, ttl, tables):
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._entries.pop(next(iter(self._entries)))
+            self._entries[key] = (time.monotonic() + ttl, rows, frozenset(tables))
+
+    def invalidate(self, tables):
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if entry[2] & tables]
+            for key in stale:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+QUERY_CACHE = QueryCache()
+db_pool.commit_observers.append(QUERY_CACHE.invalidate)
+
+def fetch_all(conn, sql, params=(), ttl=None, tables=()):
+    """Run a read query; with `ttl` the rows are cached until a write to `tables` commits"""
+    if ttl:
+        key = (sql, tuple(params))
+        rows = QUERY_CACHE.get(key)
+        if rows is not None:
+            return rows
+    cursor = conn.cursor()
+    cursor.execute(sql, params)
+    rows = cursor.fetchall()
+    if ttl:
+        QUERY_CACHE.set(key, rows, ttl, tables)
+    return rows
+
+def fetch_one(conn, sql, params=()):
+    cursor = conn.cursor()
+    cursor.execute(sql, params)
+    return cursor.fetchone()
+
+def fetch_value(conn, sql, params=(), default=None):
+    row = fetch_one(conn, sql, params)
+    if row is None or row[0] is None:
+        return default
+    return row[0]
+
+def execute(conn, sql, params=()):
+    """Run a write statement and return its cursor (the caller commits)"""
+    cursor = conn.cursor()
+    cursor.execute(sql, params)
+    return cursor
+
+def execute_returning(conn, sql, params=()):
+    """Run a write with a RETURNING clause and return every row it changed
+
+    All rows are fetched so the statement is finished before the caller commits.
+    """
+    return execute(conn, sql, params).fetchall()
+
+def insert_returning_id(conn, sql, params=()):
+    """Run an INSERT and return the new row id on either backend"""
+    backend = dialect(conn)
+    cursor = execute(conn, sql_dialect.with_returning_id(sql, backend), params)
+    if backend == sql_dialect.POSTGRES:
+        return cursor.fetchone()[0]
+    return cursor.lastrowid
+
+@contextmanager
+def savepoint(conn, name):
+    """Undo only the block's own writes if it raises; the caller still commits"""
+    if dialect(conn) == sql_dialect.SQLITE and not conn.in_transaction:
+        # Outside a transaction SQLite would commit on RELEASE
+        execute(conn, 'BEGIN')
+    execute(conn, f'SAVEPOINT {name}')
+    try:
+        yield
+    except Exception:
+        execute(conn, f'ROLLBACK TO SAVEPOINT {name}')
+        execute(conn, f'RELEASE SAVEPOINT {name}')
+        raise
+    execute(conn, f'RELEASE SAVEPOINT {name}')
+
+def is_unique_violation(error):
+    """True when a statement failed on a UNIQUE / primary key constraint (either backend)"""
+    if isinstance(error, sqlite3.IntegrityError):
+        return 'UNIQUE constraint failed' in str(error)
+    return getattr(error, 'pgcode', None) == '23505'  # psycopg2 unique_violation
+
+def iter_rows(conn, sql, params=(), batch_size=500):
+    """Stream a large result set without loading it all at once
+
+    Postgres uses a server-side (named) cursor so rows arrive in batches;
+    SQLite already steps through results lazily, so fetchmany is enough.
+    """
+    if dialect(conn) == sql_dialect.POSTGRES:
+        cursor = conn.cursor(name=f'iter_{uuid.uuid4().hex[:12]}')
+        cursor.itersize = batch_size
+    else:
+        cursor = conn.cursor()
+    try:
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        cursor.close()
+
+def bulk_insert(conn, table, columns, rows, page_size=500):
+    """Insert many rows (execute_values on Postgres, executemany on SQLite)"""
+    rows = list(rows)
+    if not rows:
+        return 0
+    column_list = ', '.join(columns)
+    cursor = conn.cursor()
+    if dialect(conn) == sql_dialect.POSTGRES:
+        from psycopg2.extras import execute_values
+        execute_values(cursor, f'INSERT INTO {table} ({column_list}) VALUES %s', rows, page_size=page_size)
+    else:
+        placeholders = ', '.join('?' for _ in columns)
+        cursor.executemany(f'INSERT INTO {table} ({column_list}) VALUES ({placeholders})', rows)
+    return len(rows)
+
+# ==================== LOCATIONS ====================
+INSERT_LOCATION = '''
+    INSERT INTO locations (name, description, type, latitude, longitude, user_id, approved)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+
+SELECT_PENDING_LOCATIONS = '''
+    SELECT l.id, l.name, l.description, l.type, l.created_at, u.username
+    FROM locations l
+    LEFT JOIN users u ON l.user_id = u.id
+    WHERE l.approved = FALSE
+    ORDER BY l.created_at DESC
+'''
+
+# Conditional writes with RETURNING (SQLite 3.35+): the row only counts for
+# whichever transaction actually flipped it, so two admins approving at once
+# cannot both bump the counters
+APPROVE_LOCATION = 'UPDATE locations SET approved = TRUE WHERE id = ? AND approved = FALSE RETURNING type'
+
+SELECT_LOCATION_EXISTS = 'SELECT 1 FROM locations WHERE id = ?'
+
+def insert_location(conn, name, description, location_type, latitude, longitude, user_id, approved=False):
+    """Insert a location and return its id"""
+    location_id = insert_returning_id(conn, INSERT_LOCATION, (
+        name, description, location_type, latitude, longitude, user_id, approved
+    ))
+    if approved:
+        bump_counters(conn, location_counter_deltas(location_type, 1))
+    return location_id
+
+def list_pending_locations(conn):
+    return fetch_all(conn, SELECT_PENDING_LOCATIONS)
+
+def approve_location(conn, location_id):
+    """Approve a location; returns 0 when it does not exist"""
+    rows = execute_returning(conn, APPROVE_LOCATION, (location_id,))
+    if not rows:
+        return 1 if fetch_one(conn, SELECT_LOCATION_EXISTS, (location_id,)) is not None else 0
+    bump_counters(conn, location_counter_deltas(rows[0][0], 1))
+    return 1
+
+# ==================== ECO ACTIONS ====================
+# Every eco action write goes through these functions so the per-user totals
+# below (user_stats, user_type_stats, daily_user_stats), the points ledger and
+# the platform counters change in the same transaction as the action itself.
+# Only approved actions count.
+INSERT_ECO_ACTION = '''
+    INSERT INTO eco_actions (title, description, type, location_name, image_path, points, user_id, approved)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+SELECT_ECO_ACTION = '''
+    SELECT ea.id, ea.title, ea.description, ea.type, ea.points, ea.user_id,
+           ea.approved, ea.created_at, u.username
+    FROM eco_actions ea
+    LEFT JOIN users u ON ea.user_id = u.id
+    WHERE ea.id = ?
+'''
+
+# State changes return the rows they changed (see APPROVE_LOCATION), so stats,
+# counters and the ledger follow exactly the rows this transaction flipped
+SET_ECO_ACTION_APPROVED = '''
+    UPDATE eco_actions SET approved = ? WHERE id = ? AND approved <> ?
+    RETURNING user_id, type, points, created_at
+'''
+
+DELETE_ECO_ACTION = 'DELETE FROM eco_actions WHERE id = ?'
+
+DELETE_ECO_ACTION_RETURNING = '''
+    DELETE FROM eco_actions WHERE id = ?
+    RETURNING user_id, type, points, approved, created_at
+'''
+
+APPROVE_ALL_PENDING_ACTIONS = '''
+    UPDATE eco_actions SET approved = TRUE WHERE approved = FALSE
+    RETURNING user_id, type, points, created_at
+'''
+
+DELETE_USER_ECO_ACTIONS = 'DELETE FROM eco_actions WHERE user_id = ?'
+
+def insert_eco_action(conn, title, description, action_type, location_name, image_path,
+                      points, user_id, approved, idempotency_key=None):
+    """Insert an eco action and return its id (the original one for a repeated key)"""
+    return add_eco_action(conn, title, description, action_type, location_name, image_path,
+                          points, user_id, approved, idempotency_key)[0]
+
+def add_eco_action(conn, title, description, action_type, location_name, image_path,
+                   points, user_id, approved, idempotency_key=None):
+    """Insert an eco action once per idempotency key; returns (action_id, replayed_entry)
+
+    With `idempotency_key` the points are posted under that ledger key. A
+    key that was already posted writes nothing and returns the original
+    action's id with its ledger entry. When a concurrent request posts the
+    key first, the ledger's UNIQUE key rejects this insert: it is undone back
+    to a savepoint, leaving the rest of the caller's transaction alone, and
+    that request's entry is returned. The caller commits.
+    """
+    if idempotency_key is not None:
+        entry = get_ledger_entry(conn, idempotency_key)
+        if entry is not None:
+            return entry['action_id'], entry
+    try:
+        with savepoint(conn, 'add_eco_action') if idempotency_key is not None else nullcontext():
+            action_id = insert_returning_id(conn, INSERT_ECO_ACTION, (
+                title, description, action_type, location_name, image_path, points, user_id, approved
+            ))
+            recorded = not approved or record_approved_actions(
+                conn, user_id, action_type, points or 0, 1, utc_timestamp(),
+                reason='eco_action.created', action_id=action_id, idempotency_key=idempotency_key)
+    except Exception as e:
+        if idempotency_key is None or not is_unique_violation(e):
+            raise
+        recorded = False
+    else:
+        if not recorded:
+            # Posted by another transaction since the check above
+            execute(conn, DELETE_ECO_ACTION, (action_id,))
+    if recorded:
+        return action_id, None
+    entry = get_ledger_entry(conn, idempotency_key)
+    return entry['action_id'], entry
+
+def get_eco_action(conn, action_id):
+    return fetch_one(conn, SELECT_ECO_ACTION, (action_id,))
+
+def set_eco_action_approved(conn, action_id, approved):
+    """Approve or un-approve an action; returns the number of rows changed (0 if already so)"""
+    rows = execute_returning(conn, SET_ECO_ACTION_APPROVED, (approved, action_id, approved))
+    if not rows:
+        return 0
+    state = rows[0]
+    sign = 1 if approved else -1
+    record_approved_actions(conn, state[0], state[1], sign * (state[2] or 0), sign, state[3],
+                            reason='eco_action.approved' if approved else 'eco_action.unapproved',
+                            action_id=action_id)
+    return 1
+
+def delete_eco_action(conn, action_id):
+    rows = execute_returning(conn, DELETE_ECO_ACTION_RETURNING, (action_id,))
+    if not rows:
+        return 0
+    state = rows[0]
+    if state[3]:
+        record_approved_actions(conn, state[0], state[1], -(state[2] or 0), -1, day=day_of(state[4]),
+                                reason='eco_action.deleted', action_id=action_id)
+    return 1
+
+def approve_all_pending_actions(conn):
+    rows = execute_returning(conn, APPROVE_ALL_PENDING_ACTIONS)
+    # One group per user, type and day so the daily rollups stay exact
+    groups = {}
+    for user_id, action_type, points, created_at in rows:
+        key = (user_id, action_type, day_of(created_at))
+        total, count, last_action_at = groups.get(key, (0, 0, None))
+        groups[key] = (total + (points or 0), count + 1,
+                       created_at if last_action_at is None or created_at > last_action_at else last_action_at)
+    for (user_id, action_type, day), (points, count, last_action_at) in groups.items():
+        record_approved_actions(conn, user_id, action_type, points, count, last_action_at, day=day,
+                                reason='eco_action.approved')
+    return len(rows)
+
+def delete_user_eco_actions(conn, user_id):
+    """Delete all of a user's actions and their stats rows"""
+    deltas = {}
+    for action_type, totals in get_user_type_stats(conn, user_id).items():
+        for name, delta in eco_action_counter_deltas(action_type, -totals['total_points'], -totals['action_count']).items():
+            deltas[name] = deltas.get(name, 0) + delta
+        if totals['total_points']:
+            post_points(conn, user_id, -totals['total_points'], 'eco_action.user_deleted', action_type)
+    if get_user_stats(conn, user_id)['action_count'] > 0:
+        deltas['active_users'] = -1
+    rowcount = execute(conn, DELETE_USER_ECO_ACTIONS, (user_id,)).rowcount
+    bump_counters(conn, deltas)
+    execute(conn, DELETE_USER_STATS, (user_id,))
+    execute(conn, DELETE_USER_TYPE_STATS, (user_id,))
+    execute(conn, DELETE_DAILY_USER_STATS, (user_id,))
+    user_changed(conn, user_id)
+    return rowcount
+
+# ==================== USER STATS ====================
+# In-process views of the per-user totals (leaderboard.py) subscribe here:
+# fn(conn, user_id, version), called inside the writing transaction after the
+# user's rows changed; use db_pool.after_commit to act once it is durable.
+# Each change bumps the version.user_stats counter and logs the user under the
+# new version in user_stats_changes, so views in other processes (other
+# workers, the admin CLIs) can tell their copy is stale and re-read only the
+# users that changed. The log keeps roughly the last USER_STATS_CHANGES_KEPT.
+user_stats_listeners = []
+
+USER_STATS_VERSION = 'version.user_stats'
+USER_STATS_CHANGES_KEPT = int(os.getenv('USER_STATS_CHANGES_KEPT', '10000'))
+
+INSERT_USER_STATS_CHANGE = 'INSERT INTO user_stats_changes (version, user_id) VALUES (?, ?)'
+
+PRUNE_USER_STATS_CHANGES = 'DELETE FROM user_stats_changes WHERE version <= ?'
+
+COUNT_USER_STATS_CHANGES = 'SELECT COUNT(*) FROM user_stats_changes WHERE version > ? AND version <= ?'
+
+SELECT_CHANGED_USERS = 'SELECT DISTINCT user_id FROM user_stats_changes WHERE version > ? AND version <= ?'
+
+UPSERT_USER_STATS = '''
+    INSERT INTO user_stats (user_id, total_points, action_count, last_action_at)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT (user_id) DO UPDATE SET
+        total_points = user_stats.total_points + excluded.total_points,
+        action_count = user_stats.action_count + excluded.action_count,
+        last_action_at = CASE
+            WHEN user_stats.last_action_at IS NULL OR excluded.last_action_at > user_stats.last_action_at
+            THEN excluded.last_action_at
+            ELSE user_stats.last_action_at
+        END
+'''
+
+UPSERT_USER_TYPE_STATS = '''
+    INSERT INTO user_type_stats (user_id, type, total_points, action_count)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT (user_id, type) DO UPDATE SET
+        total_points = user_type_stats.total_points + excluded.total_points,
+        action_count = user_type_stats.action_count + excluded.action_count
+'''
+
+# Removing an action may remove the latest one; the (user_id, approved, created_at) index makes this a seek
+REFRESH_LAST_ACTION = '''
+    UPDATE user_stats SET last_action_at = (
+        SELECT MAX(created_at) FROM eco_actions WHERE user_id = ? AND approved = TRUE
+    ) WHERE user_id = ?
+'''
+
+SELECT_USER_STATS = 'SELECT total_points, action_count, last_action_at FROM user_stats WHERE user_id = ?'
+
+SELECT_USER_ACTION_COUNT = 'SELECT action_count FROM user_stats WHERE user_id = ?'
+
+SELECT_USER_TYPE_STATS = 'SELECT type, total_points, action_count FROM user_type_stats WHERE user_id = ?'
+
+DELETE_USER_STATS = 'DELETE FROM user_stats WHERE user_id = ?'
+
+UPSERT_DAILY_USER_STATS = '''
+    INSERT INTO daily_user_stats (day, user_id, type, points, action_count)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (day, user_id, type) DO UPDATE SET
+        points = daily_user_stats.points + excluded.points,
+        action_count = daily_user_stats.action_count + excluded.action_count
+'''
+
+SELECT_DAILY_USER_STATS = '''
+    SELECT day, type, points, action_count FROM daily_user_stats
+    WHERE user_id = ? AND day >= ? AND action_count > 0
+    ORDER BY day, type
+'''
+
+DELETE_DAILY_USER_STATS = 'DELETE FROM daily_user_stats WHERE user_id = ?'
+
+DELETE_USER_TYPE_STATS = 'DELETE FROM user_type_stats WHERE user_id = ?'
+
+def utc_timestamp():
+    """Now in the format SQLite's CURRENT_TIMESTAMP uses"""
+    return datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+
+def day_of(timestamp):
+    """'YYYY-MM-DD' of a created_at value (a string on SQLite, a datetime on Postgres)"""
+    if timestamp is None:
+        return utc_timestamp()[:10]
+    if hasattr(timestamp, 'strftime'):
+        return timestamp.strftime('%Y-%m-%d')
+    return str(timestamp)[:10]
+
+def record_approved_actions(conn, user_id, action_type, points, count, last_action_at=None, day=None,
+                            reason='eco_action.approved', action_id=None, idempotency_key=None):
+    """Apply approved actions (negative values remove them) to user stats, the ledger and platform counters
+
+    `day` is the actions' created_at day; it defaults to the day of `last_action_at`.
+    Returns False, having changed nothing, when `idempotency_key` was already posted.
+    """
+    if not count:
+        return True
+    if points or idempotency_key:
+        if post_points(conn, user_id, points, reason, action_type, action_id, idempotency_key) is None:
+            return False
+    deltas = eco_action_counter_deltas(action_type, points, count)
+    deltas['active_users'] = adjust_user_stats(conn, user_id, action_type, points, count, last_action_at)
+    if user_id is not None:
+        execute(conn, UPSERT_DAILY_USER_STATS, (day or day_of(last_action_at), user_id, action_type, points, count))
+    bump_counters(conn, deltas)
+    return True
+
+def adjust_user_stats(conn, user_id, action_type, points, count, last_action_at=None):
+    """Add approved actions to a user's totals (negative values remove them)
+
+    Returns +1 / -1 when the user becomes / stops being an active user.
+    """
+    if user_id is None or not count:
+        return 0
+    execute(conn, UPSERT_USER_STATS, (user_id, points, count, last_action_at))
+    execute(conn, UPSERT_USER_TYPE_STATS, (user_id, action_type, points, count))
+    if count < 0:
+        execute(conn, REFRESH_LAST_ACTION, (user_id, user_id))
+    user_changed(conn, user_id)
+    after = fetch_value(conn, SELECT_USER_ACTION_COUNT, (user_id,), default=0)
+    before = after - count
+    if before <= 0 < after:
+        return 1
+    if after <= 0 < before:
+        return -1
+    return 0
+
+def user_changed(conn, user_id):
+    """Announce a change to a user's totals, or that the user was created/deleted"""
+    bump_counters(conn, {USER_STATS_VERSION: 1})
+    version = user_stats_version(conn)
+    execute(conn, INSERT_USER_STATS_CHANGE, (version, user_id))
+    if version % 1000 == 0:
+        execute(conn, PRUNE_USER_STATS_CHANGES, (version - USER_STATS_CHANGES_KEPT,))
+    for listener in user_stats_listeners:
+        listener(conn, user_id, version)
+
+def changed_users(conn, since, until):
+    """Ids of the users changed after version `since` up to `until`, or None
+
+    None means the log no longer holds every change in that range (pruned,
+    or made before the log existed), so the caller has to reload everything.
+    """
+    if fetch_value(conn, COUNT_USER_STATS_CHANGES, (since, until), default=0) != until - since:
+        return None
+    return [row[0] for row in fetch_all(conn, SELECT_CHANGED_USERS, (since, until))]
+
+def user_stats_version(conn):
+    """Change counter for user totals; read uncached so other processes' writes show up"""
+    return fetch_value(conn, SELECT_COUNTER, (USER_STATS_VERSION,), default=0)
+
+def get_daily_user_stats(conn, user_id, since=None):
+    """[(day, type, points, action_count)] for one user, oldest first"""
+    return fetch_all(conn, SELECT_DAILY_USER_STATS, (user_id, since or '0000-00-00'))
+
+def rebuild_daily_user_stats(conn):
+    """Recompute the daily rollups from eco_actions (backfill); the caller commits"""
+    day = sql_dialect.day_expression('created_at', dialect(conn))
+    execute(conn, 'DELETE FROM daily_user_stats')
+    execute(conn, f'''
+        INSERT INTO daily_user_stats (day, user_id, type, points, action_count)
+        SELECT {day}, user_id, type, COALESCE(SUM(points), 0), COUNT(*)
+        FROM eco_actions
+        WHERE approved = TRUE AND user_id IS NOT NULL
+        GROUP BY {day}, user_id, type
+    ''')
+    return fetch_value(conn, 'SELECT COUNT(*) FROM daily_user_stats', default=0)
+
+def get_user_stats(conn, user_id):
+    """Totals for one user (zeros for a user with no approved actions)"""
+    row = fetch_one(conn, SELECT_USER_STATS, (user_id,))
+    if row is None:
+        return {'total_points': 0, 'action_count': 0, 'last_action_at': None}
+    return {'total_points': row[0], 'action_count': row[1], 'last_action_at': row[2]}
+
+def get_user_type_stats(conn, user_id):
+    """{type: {'total_points', 'action_count'}} for one user"""
+    return {
+        row[0]: {'total_points': row[1], 'action_count': row[2]}
+        for row in fetch_all(conn, SELECT_USER_TYPE_STATS, (user_id,))
+    }
+
+# ==================== POINTS LEDGER ====================
+# Every change to a user's points is an append-only ledger entry (like a
+# double-entry journal in a payments service). Each entry stores the running
+# balances right after it, so the current balance is one row away:
+#   user_balance     the user's points, mirrored in users.points
+#   global_balance   the charity pool: points earned by eco actions across
+#                    the platform, mirrored in the ledger.balance counter
+# Only eco_action.* entries move the pool; grants and opening balances only
+# move the user's balance. Idempotency keys are unique, so a retried request
+# cannot post the same points twice. Entries are never updated except by
+# replay_points_ledger, which rebuilds every balance from the deltas.
+LEDGER_BALANCE = 'ledger.balance'
+
+POOL_REASON_PREFIX = 'eco_action.'
+
+CHARITY_CYCLE_POINTS = 500
+
+INSERT_LEDGER_ENTRY = '''
+    INSERT INTO points_ledger (idempotency_key, user_id, type, action_id, reason, delta,
+                               user_balance, global_balance)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+SELECT_LEDGER_ENTRY = '''
+    SELECT id, user_id, type, action_id, reason, delta, user_balance, global_balance, created_at
+    FROM points_ledger WHERE idempotency_key = ?
+'''
+
+SELECT_USER_LEDGER = '''
+    SELECT id, user_id, type, action_id, reason, delta, user_balance, global_balance, created_at
+    FROM points_ledger WHERE user_id = ? AND id < ?
+    ORDER BY id DESC LIMIT ?
+'''
+
+ADD_USER_POINTS = 'UPDATE users SET points = COALESCE(points, 0) + ? WHERE id = ?'
+
+SELECT_USER_POINTS = 'SELECT points FROM users WHERE id = ?'
+
+LEDGER_COLUMNS = ('id', 'user_id', 'type', 'action_id', 'reason', 'delta',
+                  'user_balance', 'global_balance', 'created_at')
+
+def in_pool(reason):
+    """True when entries with `reason` count toward the global (charity) balance"""
+    return reason.startswith(POOL_REASON_PREFIX)
+
+def post_points(conn, user_id, delta, reason, action_type=None, action_id=None, idempotency_key=None):
+    """Append a ledger entry and move the running balances; returns its id
+
+    Returns None when `idempotency_key` was already posted. The caller commits.
+    """
+    if idempotency_key is None:
+        idempotency_key = f'{reason}:{uuid.uuid4().hex}'
+    elif fetch_one(conn, SELECT_LEDGER_ENTRY, (idempotency_key,)) is not None:
+        return None
+    if in_pool(reason):
+        bump_counters(conn, {LEDGER_BALANCE: delta})
+    # Read back inside the transaction: the UPDATE / upsert holds the row lock
+    global_balance = fetch_value(conn, SELECT_COUNTER, (LEDGER_BALANCE,), default=0)
+    user_balance = None
+    if user_id is not None:
+        if delta:
+            execute(conn, ADD_USER_POINTS, (delta, user_id))
+        user_balance = fetch_value(conn, SELECT_USER_POINTS, (user_id,), default=0)
+    return insert_returning_id(conn, INSERT_LEDGER_ENTRY, (
+        idempotency_key, user_id, action_type, action_id, reason, delta, user_balance, global_balance
+    ))
+
+def get_ledger_entry(conn, idempotency_key):
+    """The entry posted under `idempotency_key` as a dict, or None"""
+    row = fetch_one(conn, SELECT_LEDGER_ENTRY, (idempotency_key,))
+    return dict(zip(LEDGER_COLUMNS, row)) if row is not None else None
+
+def get_user_ledger(conn, user_id, before=None, limit=50):
+    """A user's entries newest first, starting below entry id `before`"""
+    rows = fetch_all(conn, SELECT_USER_LEDGER, (user_id, before or 2 ** 62, limit))
+    return [dict(zip(LEDGER_COLUMNS, row)) for row in rows]
+
+def charity_progress(total_points):
+    """Donation cycle for a pool balance (1 BGN per completed cycle)"""
+    donations_made = total_points // CHARITY_CYCLE_POINTS
+    cycle_points = total_points % CHARITY_CYCLE_POINTS
+    return {
+        'total_points': total_points,
+        'donations_made': donations_made,
+        'total_donated_bgn': donations_made * 1.0,
+        'current_cycle_points': cycle_points,
+        'points_to_next_donation': CHARITY_CYCLE_POINTS - cycle_points
+    }
+
+def backfill_points_ledger(conn):
+    """Seed an empty ledger from approved eco actions plus per-user opening balances
+
+    Points a user holds beyond their approved actions (seeded admins,
+    promotion bonuses) become one opening_balance entry. The caller commits.
+    """
+    execute(conn, '''
+        INSERT INTO points_ledger (idempotency_key, user_id, type, action_id, reason, delta, created_at)
+        SELECT 'backfill:eco_action:' || CAST(id AS TEXT), user_id, type, id,
+               'eco_action.backfill', COALESCE(points, 0), created_at
+        FROM eco_actions
+        WHERE approved = TRUE AND COALESCE(points, 0) <> 0
+        ORDER BY created_at, id
+    ''')
+    execute(conn, '''
+        INSERT INTO points_ledger (idempotency_key, user_id, reason, delta)
+        SELECT 'backfill:opening_balance:' || CAST(u.id AS TEXT), u.id, 'opening_balance',
+               COALESCE(u.points, 0) - COALESCE(e.points, 0)
+        FROM users u
+        LEFT JOIN (
+            SELECT user_id, SUM(points) AS points FROM eco_actions
+            WHERE approved = TRUE GROUP BY user_id
+        ) e ON e.user_id = u.id
+        WHERE COALESCE(u.points, 0) <> COALESCE(e.points, 0)
+    ''')
+    return replay_points_ledger(conn)
+
+def replay_points_ledger(conn):
+    """Recompute every running balance from the ledger deltas, in entry order
+
+    Rewrites entries whose stored balances disagree, then sets users.points
+    and the ledger.balance counter to the replayed totals. The caller
+    commits. Returns {'entries', 'rewritten', 'users': {id: (stored, actual)},
+    'balance': (stored, actual)}.
+    """
+    balances = {}
+    total = 0
+    entries = 0
+    rewrites = []
+    for entry_id, user_id, reason, delta, user_balance, global_balance in iter_rows(conn, '''
+        SELECT id, user_id, reason, delta, user_balance, global_balance FROM points_ledger ORDER BY id
+    '''):
+        entries += 1
+        if in_pool(reason):
+            total += delta
+        expected = None
+        if user_id is not None:
+            expected = balances[user_id] = balances.get(user_id, 0) + delta
+        if user_balance != expected or global_balance != total:
+            rewrites.append((expected, total, entry_id))
+    for params in rewrites:
+        execute(conn, 'UPDATE points_ledger SET user_balance = ?, global_balance = ? WHERE id = ?', params)
+
+    drift = {}
+    for user_id, points in fetch_all(conn, 'SELECT id, points FROM users'):
+        actual = balances.get(user_id, 0)
+        if (points or 0) != actual:
+            drift[user_id] = (points, actual)
+            execute(conn, 'UPDATE users SET points = ? WHERE id = ?', (actual, user_id))
+
+    stored = fetch_value(conn, SELECT_COUNTER, (LEDGER_BALANCE,), default=0)
+    if stored != total:
+        execute(conn, 'DELETE FROM platform_counters WHERE name = ?', (LEDGER_BALANCE,))
+        bump_counters(conn, {LEDGER_BALANCE: total})
+    return {'entries': entries, 'rewritten': len(rewrites), 'users': drift, 'balance': (stored, total)}
+
+# ==================== PLATFORM COUNTERS ====================
+# Totals behind /api/stats, /api/charity-stats and /api/v1/stats, kept in
+# platform_counters so those endpoints read a few dozen rows no matter how
+# large eco_actions and locations grow. Names:
+#   locations.approved[.<type>]       approved locations
+#   eco_actions.approved[.<type>]     approved eco actions
+#   eco_actions.points[.<type>]       points of approved eco actions
+#   active_users                      users with at least one approved action
+#   ledger.balance                    points ledger pool (owned by replay_points_ledger)
+#   version.*                         change counters, not derived from data
+UPSERT_COUNTER = '''
+    INSERT INTO platform_counters (name, value) VALUES (?, ?)
+    ON CONFLICT (name) DO UPDATE SET value = platform_counters.value + excluded.value
+'''
+
+SELECT_COUNTERS = 'SELECT name, value FROM platform_counters'
+
+SELECT_COUNTER = 'SELECT value FROM platform_counters WHERE name = ?'
+
+# Counters reconcile_counters leaves alone (not recounted from locations / eco_actions)
+UNRECONCILED_PREFIXES = ('version.', 'ledger.')
+
+COUNTERS_TTL = 5  # seconds; any commit touching platform_counters drops the cached copy
+
+def location_counter_deltas(location_type, count):
+    return {'locations.approved': count, f'locations.approved.{location_type}': count}
+
+def eco_action_counter_deltas(action_type, points, count):
+    return {
+        'eco_actions.approved': count,
+        'eco_actions.points': points,
+        f'eco_actions.approved.{action_type}': count,
+        f'eco_actions.points.{action_type}': points,
+    }
+
+def bump_counters(conn, deltas):
+    for name, delta in deltas.items():
+        if delta:
+            execute(conn, UPSERT_COUNTER, (name, delta))
+
+def platform_counters(conn):
+    """{name: value} for every counter"""
+    rows = fetch_all(conn, SELECT_COUNTERS, ttl=COUNTERS_TTL, tables=('platform_counters',))
+    return {row[0]: row[1] for row in rows}
+
+def counters_by_type(counters, prefix):
+    """{type: value} for the per-type counters under `prefix` (zeros dropped)"""
+    prefix += '.'
+    return {name[len(prefix):]: value for name, value in counters.items()
+            if name.startswith(prefix) and value}
+
+def compute_counters(conn):
+    """Recount every counter from the source tables (full scans)"""
+    counters = {'locations.approved': 0, 'eco_actions.approved': 0,
+                'eco_actions.points': 0, 'active_users': 0}
+    for location_type, count in fetch_all(conn, '''
+        SELECT type, COUNT(*) FROM locations WHERE approved = TRUE GROUP BY type
+    '''):
+        for name, delta in location_counter_deltas(location_type, count).items():
+            counters[name] = counters.get(name, 0) + delta
+    for action_type, count, points in fetch_all(conn, '''
+        SELECT type, COUNT(*), COALESCE(SUM(points), 0) FROM eco_actions WHERE approved = TRUE GROUP BY type
+    '''):
+        for name, delta in eco_action_counter_deltas(action_type, points, count).items():
+            counters[name] = counters.get(name, 0) + delta
+    counters['active_users'] = fetch_value(conn, '''
+        SELECT COUNT(DISTINCT user_id) FROM eco_actions WHERE approved = TRUE
+    ''', default=0)
+    return counters
+
+def reconcile_counters(conn):
+    """Rebuild platform_counters from scratch; returns {name: (stored, actual)} for drifted counters
+
+    The caller commits.
+    """
+    actual = compute_counters(conn)
+    stored = {row[0]: row[1] for row in fetch_all(conn, SELECT_COUNTERS)
+              if not row[0].startswith(UNRECONCILED_PREFIXES)}
+    drift = {}
+    for name in sorted(set(actual) | set(stored)):
+        if stored.get(name, 0) != actual.get(name, 0):
+            drift[name] = (stored.get(name, 0), actual.get(name, 0))
+    execute(conn, "DELETE FROM platform_counters WHERE name NOT LIKE 'version.%' AND name NOT LIKE 'ledger.%'")
+    bulk_insert(conn, 'platform_counters', ('name', 'value'), actual.items())
+    return drift
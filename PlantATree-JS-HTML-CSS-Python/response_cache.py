@@ -0,0 +1,169 @@
+# Response cache for public GET endpoints (like apicache / express-cache-middleware)
+#
+# Anonymous visitors all get the same payload from the stats, leaderboard
+# and list endpoints, so the finished response body is cached per path and
+# query string for a per-route TTL. Each route is tagged with the tables it
+# reads; when a commit in this process writes one of them (eco action
+# posts, location approvals, admin approvals...) the tagged entries are
+# dropped, so the TTL only bounds staleness from other processes.
+# Requests with an Authorization header or asking for read-your-writes
+# always bypass the cache.
+import os
+import threading
+import time
+from functools import wraps
+
+from flask import has_request_context, make_response, request
+
+import db_pool
+
+CACHE_TYPE = os.getenv('CACHE_TYPE', 'simple').lower()
+CACHE_DEFAULT_TIMEOUT = int(os.getenv('CACHE_DEFAULT_TIMEOUT', '300'))
+CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', '1000'))
+RESPONSE_CACHE_ENABLED = CACHE_TYPE != 'null'
+
+# Response headers worth replaying from the cache
+CACHED_HEADERS = ('Content-Type', 'X-Next-Cursor')
+
+class ResponseCache:
+    """Bodies of successful GET responses keyed by (path, query), dropped by tag"""
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = {}  # key -> (expires_at, body, status, headers, tags)
+        # Bumped on every invalidation so a response computed across a
+        # write is not stored after the write already cleared the cache
+        self._generations = {}
+        self._routes = {}  # endpoint -> {'hits', 'misses', 'bypassed'}
+        self.invalidations = 0
+
+    def _route(self, endpoint):
+        stats = self._routes.get(endpoint)
+        if stats is None:
+            stats = self._routes[endpoint] = {'hits': 0, 'misses': 0, 'bypassed': 0}
+        return stats
+
+    def get(self, endpoint, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._route(endpoint)['hits'] += 1
+                return entry
+            if entry is not None:
+                del self._entries[key]
+            self._route(endpoint)['misses'] += 1
+            return None
+
+    def bypass(self, endpoint):
+        with self._lock:
+            self._route(endpoint)['bypassed'] += 1
+
+    def generation(self, tags):
+        with self._lock:
+            return tuple(self._generations.get(tag, 0) for tag in tags)
+
+    def set(self, key, body, status, headers, ttl, tags, generation):
+        with self._lock:
+            if tuple(self._generations.get(tag, 0) for tag in tags) != generation:
+                return False
+            if key not in self._entries and len(self._entries) >= self.max_entries:
+                self._entries.pop(next(iter(self._entries)))
+            self._entries[key] = (time.monotonic() + ttl, body, status, headers, frozenset(tags))
+            return True
+
+    def invalidate(self, tags):
+        tags = set(tags)
+        with self._lock:
+            for tag in tags:
+                self._generations[tag] = self._generations.get(tag, 0) + 1
+            stale = [key for key, entry in self._entries.items() if entry[4] & tags]
+            for key in stale:
+                del self._entries[key]
+            if stale:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            hits = sum(route['hits'] for route in self._routes.values())
+            misses = sum(route['misses'] for route in self._routes.values())
+            return {
+                'enabled': RESPONSE_CACHE_ENABLED,
+                'entries': len(self._entries),
+                'hits': hits,
+                'misses': misses,
+                'hit_rate': round(hits / (hits + misses), 3) if hits + misses else 0.0,
+                'invalidations': self.invalidations,
+                'routes': {name: dict(route) for name, route in self._routes.items()}
+            }
+
+RESPONSE_CACHE = ResponseCache()
+db_pool.commit_observers.append(RESPONSE_CACHE.invalidate)
+
+def invalidate(*tags):
+    """Drop cached responses tagged with any of `tags` (table names)"""
+    RESPONSE_CACHE.invalidate(tags)
+
+def _cacheable():
+    return (request.method == 'GET'
+            and not request.headers.get('Authorization')
+            and not db_pool.read_your_writes())
+
+def cached(ttl=None, tags=()):
+    """Cache a GET view's response for `ttl` seconds; `tags` are the tables it reads"""
+    ttl = CACHE_DEFAULT_TIMEOUT if ttl is None else ttl
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not RESPONSE_CACHE_ENABLED:
+                return view(*args, **kwargs)
+            endpoint = request.endpoint or view.__name__
+            if not _cacheable():
+                RESPONSE_CACHE.bypass(endpoint)
+                return view(*args, **kwargs)
+
+            key = (request.path, tuple(sorted(request.args.items(multi=True))))
+            entry = RESPONSE_CACHE.get(endpoint, key)
+            if entry is not None:
+                response = make_response(entry[1], entry[2])
+                for name, value in entry[3]:
+                    response.headers[name] = value
+                response.headers['X-Cache'] = 'HIT'
+                return response
+
+            generation = RESPONSE_CACHE.generation(tags)
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200 and not response.direct_passthrough:
+                headers = [(name, response.headers[name]) for name in CACHED_HEADERS
+                           if name in response.headers]
+                RESPONSE_CACHE.set(key, response.get_data(), 200, headers, ttl, tags, generation)
+            response.headers['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
+
+def cached_value(name, compute, ttl=None, tags=()):
+    """Memoize compute() under `name` with the same TTL and tag invalidation
+
+    For endpoints that assemble several cached parts. The value is shared
+    between requests, so callers must not modify it.
+    """
+    ttl = CACHE_DEFAULT_TIMEOUT if ttl is None else ttl
+    if not RESPONSE_CACHE_ENABLED or (has_request_context() and not _cacheable()):
+        return compute()
+    key = ('value', name)
+    entry = RESPONSE_CACHE.get(name, key)
+    if entry is not None:
+        return entry[1]
+    generation = RESPONSE_CACHE.generation(tags)
+    value = compute()
+    RESPONSE_CACHE.set(key, value, None, (), ttl, tags, generation)
+    return value
+
+def stats():
+    return RESPONSE_CACHE.stats()
@@ -1,9 +1,11 @@
 # Express.js-style router for Flask
 from flask import Blueprint, request, jsonify, g
 from middleware import rate_limit, validate_json, handle_errors, require_auth
-import sqlite3
 import json
 from datetime import datetime
+import repository
+import pagination
+import stats_service
 
 # Create blueprints (like Express.js routers)
 api_v1 = Blueprint('api_v1', __name__, url_prefix='/api/v1')
@@ -11,42 +13,58 @@ admin_routes = Blueprint('admin', __name__, url_prefix='/api/admin')
 
 # Database helper
 def get_db():
-    """Get database connection"""
-    return sqlite3.connect('plantatree.db')
+    """Get database connection (same pooled database as the main app)"""
+    return repository.get_connection()
+
+def get_read_db():
+    """Get a connection for read-only handlers (routed to the read target)"""
+    return repository.get_read_connection()
+
+def fetch_list_page(conn, select_sql, conditions, params, after, limit, **columns):
+    """(rows, next_cursor, page) for a newest-first list
+
+    Pages are fetched by cursor (?cursor=). The old ?page= parameter still
+    works for existing clients but pays for OFFSET, so `page` is only set then.
+    """
+    page = request.args.get('page', None, type=int)
+    if page is None or after is not None:
+        rows, next_cursor = pagination.fetch_page(conn, select_sql, conditions, params, after, limit, **columns)
+        return rows, next_cursor, None
+    
+    page = max(page, 1)
+    sql, params = pagination.keyset_query(select_sql, conditions, params, None, None,
+                                          columns.get('created_column', 'created_at'),
+                                          columns.get('id_column', 'id'))
+    cursor = conn.cursor()
+    cursor.execute(sql + ' LIMIT ? OFFSET ?', params + [limit, (page - 1) * limit])
+    return cursor.fetchall(), None, page
 
 # ==================== LOCATIONS ROUTER ====================
 @api_v1.route('/locations', methods=['GET'])
 @handle_errors
 @rate_limit(max_requests=100, window_seconds=3600)
 def get_locations_v1():
-    """Get all approved locations with pagination and filtering"""
-    page = request.args.get('page', 1, type=int)
-    limit = request.args.get('limit', 10, type=int)
+    """Get approved locations with cursor pagination and filtering"""
+    limit, after = pagination.page_args(request.args, default_limit=10)
     location_type = request.args.get('type', None)
     
-    offset = (page - 1) * limit
-    
-    conn = get_db()
-    cursor = conn.cursor()
+    conn = get_read_db()
     
     # Build query with filters
-    query = '''
-        SELECT id, name, description, type, latitude, longitude, created_at
-        FROM locations 
-        WHERE approved = TRUE
-    '''
+    conditions = ['approved = TRUE']
     params = []
     
     if location_type:
-        query += ' AND type = ?'
+        conditions.append('type = ?')
         params.append(location_type)
     
-    query += ' ORDER BY created_at DESC LIMIT ? OFFSET ?'
-    params.extend([limit, offset])
+    rows, next_cursor, legacy_page = fetch_list_page(conn, '''
+        SELECT id, name, description, type, latitude, longitude, created_at
+        FROM locations
+    ''', conditions, params, after, limit)
     
-    cursor.execute(query, params)
     locations = []
-    for row in cursor.fetchall():
+    for row in rows:
         locations.append({
             'id': row[0],
             'name': row[1],
@@ -57,26 +75,24 @@ def get_locations_v1():
             'created_at': row[6]
         })
     
-    # Get total count for pagination
-    count_query = 'SELECT COUNT(*) FROM locations WHERE approved = TRUE'
-    count_params = []
-    if location_type:
-        count_query += ' AND type = ?'
-        count_params.append(location_type)
-    
-    cursor.execute(count_query, count_params)
-    total = cursor.fetchone()[0]
+    # Total from the maintained counters instead of a COUNT(*) scan
+    counter = 'locations.approved' + (f'.{location_type}' if location_type else '')
+    total = repository.platform_counters(conn).get(counter, 0)
     
     conn.close()
     
+    page_info = {
+        'limit': limit,
+        'total': total,
+        'next_cursor': next_cursor
+    }
+    if legacy_page is not None:
+        page_info['page'] = legacy_page
+        page_info['pages'] = (total + limit - 1) // limit
+    
     return jsonify({
         'data': locations,
-        'pagination': {
-            'page': page,
-            'limit': limit,
-            'total': total,
-            'pages': (total + limit - 1) // limit
-        },
+        'pagination': page_info,
         'meta': {
             'timestamp': datetime.now().isoformat(),
             'count': len(locations)
@@ -103,22 +119,17 @@ def create_location_v1():
         return jsonify({'error': 'Name must be between 3 and 100 characters'}), 400
     
     conn = get_db()
-    cursor = conn.cursor()
     
-    cursor.execute('''
-        INSERT INTO locations (name, description, type, latitude, longitude, user_id, approved)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    ''', (
+    location_id = repository.insert_location(
+        conn,
         data['name'],
         data['description'],
         data['type'],
         data.get('latitude'),
         data.get('longitude'),
         getattr(g, 'user_id', 1),
-        False  # Requires approval
-    ))
-    
-    location_id = cursor.lastrowid
+        approved=False  # Requires approval
+    )
     conn.commit()
     conn.close()
     
@@ -135,7 +146,7 @@ def create_location_v1():
 @handle_errors
 def get_location_by_id_v1(location_id):
     """Get specific location by ID"""
-    conn = get_db()
+    conn = get_read_db()
     cursor = conn.cursor()
     
     cursor.execute('''
@@ -168,40 +179,33 @@ def get_location_by_id_v1(location_id):
 @rate_limit(max_requests=100, window_seconds=3600)
 def get_eco_actions_v1():
     """Get eco actions with advanced filtering and pagination"""
-    page = request.args.get('page', 1, type=int)
-    limit = request.args.get('limit', 20, type=int)
+    limit, after = pagination.page_args(request.args, default_limit=20)
     action_type = request.args.get('type', None)
     user_id = request.args.get('user_id', None, type=int)
     
-    offset = (page - 1) * limit
-    
-    conn = get_db()
-    cursor = conn.cursor()
+    conn = get_read_db()
     
-    query = '''
-        SELECT ea.id, ea.title, ea.description, ea.type, ea.location_name, 
-               ea.image_path, ea.points, ea.created_at, u.username
-        FROM eco_actions ea
-        LEFT JOIN users u ON ea.user_id = u.id
-        WHERE ea.approved = TRUE
-    '''
+    conditions = ['ea.approved = TRUE']
     params = []
     
     if action_type:
-        query += ' AND ea.type = ?'
+        conditions.append('ea.type = ?')
         params.append(action_type)
     
     if user_id:
-        query += ' AND ea.user_id = ?'
+        conditions.append('ea.user_id = ?')
         params.append(user_id)
     
-    query += ' ORDER BY ea.created_at DESC LIMIT ? OFFSET ?'
-    params.extend([limit, offset])
-    
-    cursor.execute(query, params)
+    rows, next_cursor, legacy_page = fetch_list_page(conn, '''
+        SELECT ea.id, ea.title, ea.description, ea.type, ea.location_name, 
+               ea.image_path, ea.points, ea.created_at, u.username
+        FROM eco_actions ea
+        LEFT JOIN users u ON ea.user_id = u.id
+    ''', conditions, params, after, limit,
+        created_column='ea.created_at', id_column='ea.id', created_index=7)
     
     actions = []
-    for row in cursor.fetchall():
+    for row in rows:
         actions.append({
             'id': row[0],
             'title': row[1],
@@ -216,12 +220,13 @@ def get_eco_actions_v1():
     
     conn.close()
     
+    page_info = {'limit': limit, 'next_cursor': next_cursor}
+    if legacy_page is not None:
+        page_info['page'] = legacy_page
+    
     return jsonify({
         'data': actions,
-        'pagination': {
-            'page': page,
-            'limit': limit
-        }
+        'pagination': page_info
     })
 
 @api_v1.route('/eco-actions', methods=['POST'])
@@ -244,22 +249,18 @@ def create_eco_action_v1():
     points = points_map.get(data['type'], 5)
     
     conn = get_db()
-    cursor = conn.cursor()
     
-    cursor.execute('''
-        INSERT INTO eco_actions (title, description, type, location_name, points, user_id, approved)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    ''', (
+    action_id = repository.insert_eco_action(
+        conn,
         data['title'],
         data['description'],
         data['type'],
         data.get('location_name', ''),
+        None,
         points,
         getattr(g, 'user_id', 1),
         True  # Auto-approve for demo
-    ))
-    
-    action_id = cursor.lastrowid
+    )
     conn.commit()
     conn.close()
     
@@ -277,47 +278,8 @@ def create_eco_action_v1():
 @handle_errors
 def get_platform_stats_v1():
     """Get comprehensive platform statistics"""
-    conn = get_db()
-    cursor = conn.cursor()
-    
-    # Get various statistics
-    stats = {}
-    
-    # Locations count by type
-    cursor.execute('''
-        SELECT type, COUNT(*) 
-        FROM locations 
-        WHERE approved = TRUE 
-        GROUP BY type
-    ''')
-    stats['locations_by_type'] = dict(cursor.fetchall())
-    
-    # Eco actions count by type
-    cursor.execute('''
-        SELECT type, COUNT(*), SUM(points) 
-        FROM eco_actions 
-        WHERE approved = TRUE 
-        GROUP BY type
-    ''')
-    eco_actions_data = cursor.fetchall()
-    stats['eco_actions'] = {
-        row[0]: {'count': row[1], 'total_points': row[2]} 
-        for row in eco_actions_data
-    }
-    
-    # Total statistics
-    cursor.execute('SELECT COUNT(*) FROM locations WHERE approved = TRUE')
-    stats['total_locations'] = cursor.fetchone()[0]
-    
-    cursor.execute('SELECT COUNT(*) FROM eco_actions WHERE approved = TRUE')
-    stats['total_actions'] = cursor.fetchone()[0]
-    
-    cursor.execute('SELECT SUM(points) FROM eco_actions WHERE approved = TRUE')
-    stats['total_points'] = cursor.fetchone()[0] or 0
-    
-    cursor.execute('SELECT COUNT(DISTINCT user_id) FROM eco_actions WHERE approved = TRUE')
-    stats['active_users'] = cursor.fetchone()[0]
-    
+    conn = get_read_db()
+    stats = stats_service.platform_stats(conn, with_totals=True)
     conn.close()
     
     return jsonify({
@@ -358,18 +320,9 @@ def health_check_v1():
 def get_pending_locations():
     """Get all pending locations (admin only)"""
     conn = get_db()
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT l.id, l.name, l.description, l.type, l.created_at, u.username
-        FROM locations l
-        LEFT JOIN users u ON l.user_id = u.id
-        WHERE l.approved = FALSE
-        ORDER BY l.created_at DESC
-    ''')
     
     pending = []
-    for row in cursor.fetchall():
+    for row in repository.list_pending_locations(conn):
         pending.append({
             'id': row[0],
             'name': row[1],
@@ -391,11 +344,8 @@ def get_pending_locations():
 def approve_location(location_id):
     """Approve a pending location"""
     conn = get_db()
-    cursor = conn.cursor()
     
-    cursor.execute('UPDATE locations SET approved = TRUE WHERE id = ?', (location_id,))
-    
-    if cursor.rowcount == 0:
+    if repository.approve_location(conn, location_id) == 0:
         conn.close()
         return jsonify({'error': 'Location not found'}), 404
     
@@ -407,6 +357,22 @@ def approve_location(location_id):
         'message': 'Location approved successfully'
     })
 
+@admin_routes.route('/leaderboard/rebuild', methods=['POST'])
+@handle_errors
+@require_auth
+def rebuild_leaderboard():
+    """Reload this worker's in-memory leaderboard from the database"""
+    import leaderboard
+    conn = get_db()
+    users = leaderboard.LEADERBOARD.rebuild(conn)
+    conn.close()
+    
+    return jsonify({
+        'success': True,
+        'users': users,
+        'stats': leaderboard.LEADERBOARD.stats()
+    })
+
 # ==================== WEBSOCKET SUPPORT (Real-time features) ====================
 # This would require Socket.IO for Flask, similar to Socket.io for Express.js
 """
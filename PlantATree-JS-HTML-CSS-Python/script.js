@@ -394,10 +394,36 @@ const translations = {
     }
 };
 
+// Home page data arrives in one /api/bootstrap request. Each part is handed
+// out once, to the first loader that asks for it; later reloads (after a
+// POST, a location change, ...) go to the individual endpoints as before.
+let bootstrapPromise = null;
+const bootstrapTaken = new Set();
+
+function loadBootstrap() {
+    if (!bootstrapPromise) {
+        bootstrapPromise = fetch('/api/bootstrap')
+            .then(response => response.ok ? response.json() : null)
+            .catch(error => {
+                console.error('Bootstrap request failed:', error);
+                return null;
+            });
+    }
+    return bootstrapPromise;
+}
+
+async function takeBootstrap(part) {
+    if (bootstrapTaken.has(part)) return null;
+    bootstrapTaken.add(part);
+    const data = await loadBootstrap();
+    return data && data[part] !== undefined ? data[part] : null;
+}
+
 document.addEventListener('DOMContentLoaded', function() {
     console.log('DOM loaded, initializing app...');
     console.log('Leaflet available:', typeof L !== 'undefined');
     
+    loadBootstrap();
     initializeApp();
     loadSampleData();
 
@@ -689,8 +715,11 @@ const SOFIA_CENTER = [42.6977, 23.3219];
 
 async function loadSofiaData() {
     try {
-        const response = await fetch('/sofia_data.json');
-        sofiaData = await response.json();
+        sofiaData = await takeBootstrap('sofia_data');
+        if (!sofiaData) {
+            const response = await fetch('/sofia_data.json');
+            sofiaData = await response.json();
+        }
 
         originalSofiaData = JSON.parse(JSON.stringify(sofiaData));
         
@@ -1273,7 +1302,7 @@ async function handleActionSubmit(form) {
             closeModal('addActionModal');
             form.reset();
 
-            setTimeout(() => loadEcoActions(), 1000);
+            setTimeout(() => loadEcoActions(true), 1000);
         } else {
             
             if (response.status === 401) {
@@ -1461,8 +1490,11 @@ function loadSampleData() {
 async function fetchLocationsFromAPI() {
     try {
         
-        const response = await fetch('/api/locations');
-        const locations = await response.json();
+        let locations = await takeBootstrap('locations');
+        if (!locations) {
+            const response = await fetch('/api/locations');
+            locations = await response.json();
+        }
         console.log('Locations from API:', locations);
         return locations;
     } catch (error) {
@@ -1984,10 +2016,16 @@ window.showAddLocationModal = showAddLocationModal;
 window.showAddActionModal = showAddActionModal;
 window.handleAddActionClick = handleAddActionClick;
 
-async function loadEcoActions() {
+async function loadEcoActions(readYourWrites = false) {
     try {
-        const response = await fetch('/api/eco-actions');
-        const actions = await response.json();
+        // Right after our own POST, ask the server to skip the read-only replica
+        let actions = readYourWrites ? null : await takeBootstrap('eco_actions');
+        if (!actions) {
+            const response = await fetch('/api/eco-actions', readYourWrites ? {
+                headers: { 'X-Read-Your-Writes': '1' }
+            } : undefined);
+            actions = await response.json();
+        }
         
         const grid = document.getElementById('ecoActionsGrid');
         if (!grid) return;
@@ -2087,8 +2125,11 @@ function getTimeAgo(date) {
 
 async function updateCharityProgress() {
     try {
-        const response = await fetch('/api/charity-stats');
-        const data = await response.json();
+        let data = await takeBootstrap('charity_stats');
+        if (!data) {
+            const response = await fetch('/api/charity-stats');
+            data = await response.json();
+        }
         
         const totalPoints = data.total_points || 0;
         const targetPoints = 500;
@@ -2712,15 +2753,18 @@ async function loadDrawnItems() {
     }
     
     try {
-        console.log('📡 Fetching from /api/redesigns...');
-        const response = await fetch('/api/redesigns');
-        console.log('📡 Response status:', response.status);
-        
-        if (!response.ok) {
-            throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+        let savedItems = await takeBootstrap('redesigns');
+        if (!savedItems) {
+            console.log('📡 Fetching from /api/redesigns...');
+            const response = await fetch('/api/redesigns');
+            console.log('📡 Response status:', response.status);
+            
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+            }
+            
+            savedItems = await response.json();
         }
-        
-        const savedItems = await response.json();
         console.log('📥 Received items:', savedItems);
         
         if (!Array.isArray(savedItems)) {
@@ -3575,25 +3619,46 @@ const LOCATION_COORDINATES = {
 
 let currentAirLocation = 'sofia-center';
 
-async function fetchAirQualityData(lat, lon) {
-    try {
-        console.log(`Fetching air quality data for lat: ${lat}, lon: ${lon}`);
+function isDefaultLocation(lat, lon) {
+    return Number(lat) === SOFIA_COORDINATES.lat && Number(lon) === SOFIA_COORDINATES.lon;
+}
 
-        const response = await fetch(`/api/air-quality?lat=${lat}&lon=${lon}`, {
+// Off the bootstrap path, air quality and weather for a point come from one
+// /api/environment request that both fetchers share
+const environmentRequests = new Map();
+
+function fetchEnvironment(lat, lon) {
+    const key = `${lat},${lon}`;
+    if (!environmentRequests.has(key)) {
+        const request = fetch(`/api/environment?lat=${lat}&lon=${lon}`, {
             method: 'GET',
             headers: {
                 'Content-type': 'application/json'
             }
-        });
-        
-        console.log('Air Quality API Response status:', response.status);
-        
-        if (!response.ok) {
-            console.error(`HTTP error! status: ${response.status}`);
-            throw new Error(`HTTP error! status: ${response.status}`);
+        })
+            .then(response => {
+                console.log('Environment API Response status:', response.status);
+                if (!response.ok) {
+                    throw new Error(`HTTP error! status: ${response.status}`);
+                }
+                return response.json();
+            })
+            .finally(() => environmentRequests.delete(key));
+        environmentRequests.set(key, request);
+    }
+    return environmentRequests.get(key);
+}
+
+async function fetchAirQualityData(lat, lon) {
+    try {
+        console.log(`Fetching air quality data for lat: ${lat}, lon: ${lon}`);
+
+        // The bootstrap payload holds the data for the default (Sofia center) location
+        let result = isDefaultLocation(lat, lon) ? await takeBootstrap('air_quality') : null;
+        if (!result) {
+            // A lookup that misses the server's deadline comes back as the fallback
+            result = (await fetchEnvironment(lat, lon)).air_quality;
         }
-        
-        const result = await response.json();
         console.log('Air Quality API Response data:', result);
         
         if (result.status === 'success') {
@@ -3624,21 +3689,10 @@ async function fetchWeatherData(lat, lon) {
     try {
         console.log(`Fetching weather data for lat: ${lat}, lon: ${lon}`);
 
-        const response = await fetch(`/api/weather?lat=${lat}&lon=${lon}`, {
-            method: 'GET',
-            headers: {
-                'Content-type': 'application/json'
-            }
-        });
-        
-        console.log('Weather API Response status:', response.status);
-        
-        if (!response.ok) {
-            console.error(`HTTP error! status: ${response.status}`);
-            throw new Error(`HTTP error! status: ${response.status}`);
+        let result = isDefaultLocation(lat, lon) ? await takeBootstrap('weather') : null;
+        if (!result) {
+            result = (await fetchEnvironment(lat, lon)).weather;
         }
-        
-        const result = await response.json();
         console.log('Weather API Response data:', result);
         
         if (result.status === 'success') {
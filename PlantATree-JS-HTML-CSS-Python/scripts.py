@@ -18,13 +18,24 @@ class Scripts:
     def start():
         """Start production server (like npm start)"""
         os.environ['FLASK_ENV'] = 'production'
-        subprocess.run([
-            'gunicorn', 
-            '--bind', '0.0.0.0:5000',
-            '--workers', '4',
-            '--timeout', '30',
-            'app:application'
-        ])
+        # Bootstrap once here instead of in every gunicorn worker
+        Scripts.db_init()
+        os.environ['AUTO_BOOTSTRAP'] = 'false'
+        # One Ambee prefetcher beside the workers, not one per worker
+        prefetcher = None
+        if os.getenv('AMBEE_PREFETCH_ENABLED', 'true').lower() == 'true':
+            prefetcher = subprocess.Popen([sys.executable, 'ambee_prefetch.py'])
+        try:
+            subprocess.run([
+                'gunicorn', 
+                '--bind', '0.0.0.0:5000',
+                '--workers', '4',
+                '--timeout', '30',
+                'app:application'
+            ])
+        finally:
+            if prefetcher is not None:
+                prefetcher.terminate()
     
     @staticmethod
     def test():
@@ -61,14 +72,94 @@ class Scripts:
     def db_init():
         """Initialize database"""
         print("🗄️ Initializing database...")
-        subprocess.run([sys.executable, '-c', 'from app import init_db; init_db()'])
+        from bootstrap import bootstrap
+        
+        if bootstrap(force='--force' in sys.argv):
+            print("   ✓ Schema created, seeded and migrated")
+        else:
+            print("   Already up to date")
     
     @staticmethod
     def db_migrate():
         """Run database migrations"""
         print("🔄 Running database migrations...")
-        # Add migration logic here
-        pass
+        from db_pool import get_connection
+        from migrations import run_migrations, current_version
+        
+        conn = get_connection()
+        try:
+            applied = run_migrations(conn)
+            for version, description in applied:
+                print(f"   ✓ {version:03d} {description}")
+            if not applied:
+                print("   Already up to date")
+            print(f"Schema version: {current_version(conn)}")
+        finally:
+            conn.close()
+    
+    @staticmethod
+    def db_status():
+        """Show applied and pending migrations"""
+        from db_pool import get_connection
+        from migrations import pending_migrations, current_version
+        
+        conn = get_connection()
+        try:
+            print(f"Schema version: {current_version(conn)}")
+            for version, description, _ in pending_migrations(conn):
+                print(f"   pending {version:03d} {description}")
+        finally:
+            conn.close()
+    
+    @staticmethod
+    def db_reconcile():
+        """Rebuild the platform counters from scratch and report drift"""
+        print("🔢 Reconciling platform counters...")
+        import repository
+        
+        conn = repository.get_connection()
+        try:
+            drift = repository.reconcile_counters(conn)
+            conn.commit()
+            for name, (stored, actual) in drift.items():
+                print(f"   ✗ {name}: stored {stored}, actual {actual}")
+            print(f"   {len(drift)} counter(s) drifted" if drift else "   ✓ No drift")
+        finally:
+            conn.close()
+    
+    @staticmethod
+    def db_backfill_rollups():
+        """Recompute the daily per-user rollups from all approved eco actions"""
+        print("📅 Backfilling daily user stats...")
+        import repository
+        
+        conn = repository.get_connection()
+        try:
+            rows = repository.rebuild_daily_user_stats(conn)
+            conn.commit()
+            print(f"   ✓ {rows} daily rollup row(s)")
+        finally:
+            conn.close()
+    
+    @staticmethod
+    def db_replay_ledger():
+        """Rebuild every points balance by replaying the points ledger"""
+        print("📒 Replaying points ledger...")
+        import repository
+        
+        conn = repository.get_connection()
+        try:
+            result = repository.replay_points_ledger(conn)
+            conn.commit()
+            for user_id, (stored, actual) in result['users'].items():
+                print(f"   ✗ user {user_id}: stored {stored}, actual {actual}")
+            stored, actual = result['balance']
+            if stored != actual:
+                print(f"   ✗ pool balance: stored {stored}, actual {actual}")
+            print(f"   ✓ {result['entries']} entries replayed, {result['rewritten']} rewritten, "
+                  f"pool balance {actual}")
+        finally:
+            conn.close()
     
     @staticmethod
     def db_seed():
@@ -96,8 +187,10 @@ def main():
     parser.add_argument('command', choices=[
         'dev', 'start', 'test', 'lint', 'format', 
         'install', 'build', 'db:init', 'db:migrate', 
-        'db:seed', 'clean'
+        'db:status', 'db:reconcile', 'db:backfill-rollups', 'db:replay-ledger', 'db:seed', 'clean'
     ], help='Command to run')
+    parser.add_argument('--force', action='store_true',
+                        help='db:init: run the bootstrap even if the schema is current')
     
     args = parser.parse_args()
     
@@ -112,6 +205,10 @@ def main():
         'build': Scripts.build,
         'db:init': Scripts.db_init,
         'db:migrate': Scripts.db_migrate,
+        'db:status': Scripts.db_status,
+        'db:reconcile': Scripts.db_reconcile,
+        'db:backfill-rollups': Scripts.db_backfill_rollups,
+        'db:replay-ledger': Scripts.db_replay_ledger,
         'db:seed': Scripts.db_seed,
         'clean': Scripts.clean
     }
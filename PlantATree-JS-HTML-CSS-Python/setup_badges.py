@@ -3,14 +3,10 @@
 Setup default badges in the database
 """
 
-import sqlite3
-import os
+import repository
 
 def get_db_connection():
-    db_path = 'infousers.db'
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    return conn
+    return repository.get_connection()
 
 def create_badges_table():
     """Create badges and user_badges tables if they don't exist"""
@@ -83,9 +79,9 @@ def award_badges_to_users():
     
     # Get all users with their points and action counts
     cursor.execute('''
-        SELECT u.id, u.username, u.points, 
-               (SELECT COUNT(*) FROM eco_actions WHERE user_id = u.id AND approved = TRUE) as action_count
+        SELECT u.id, u.username, u.points, s.action_count
         FROM users u
+        LEFT JOIN user_stats s ON s.user_id = u.id
     ''')
     users = cursor.fetchall()
     
@@ -0,0 +1,98 @@
+# SQL dialect helpers so the same statements run on SQLite and PostgreSQL
+#
+# Statements in this codebase are written in SQLite style (? placeholders,
+# INSERT OR IGNORE, AUTOINCREMENT). Postgres connections translate them on
+# the fly in their cursor; the few constructs that cannot be rewritten
+# mechanically (GROUP_CONCAT, date('now', ...), lastrowid) have helpers here.
+import re
+from datetime import datetime, timedelta
+
+SQLITE = 'sqlite'
+POSTGRES = 'postgres'
+
+_AUTOINCREMENT_RE = re.compile(r'\bINTEGER\s+PRIMARY\s+KEY\s+AUTOINCREMENT\b', re.IGNORECASE)
+_INSERT_OR_IGNORE_RE = re.compile(r'^(\s*)INSERT\s+OR\s+IGNORE\s+INTO\b', re.IGNORECASE)
+
+_translations = {}
+
+def to_postgres(sql, has_params=True):
+    """Rewrite a SQLite-style statement for psycopg2 (cached per statement)"""
+    key = (sql, has_params)
+    translated = _translations.get(key)
+    if translated is not None:
+        return translated
+
+    out = []
+    quote = None
+    for ch in sql:
+        if quote is not None:
+            # psycopg2 treats every % as a format marker when params are bound
+            out.append('%%' if ch == '%' and has_params else ch)
+            if ch == quote:
+                quote = None
+        elif ch in ("'", '"'):
+            quote = ch
+            out.append(ch)
+        elif ch == '?' and has_params:
+            out.append('%s')
+        elif ch == '%' and has_params:
+            out.append('%%')
+        else:
+            out.append(ch)
+    translated = ''.join(out)
+
+    translated = _AUTOINCREMENT_RE.sub('SERIAL PRIMARY KEY', translated)
+    if _INSERT_OR_IGNORE_RE.match(translated):
+        translated = _INSERT_OR_IGNORE_RE.sub(r'\1INSERT INTO', translated).rstrip().rstrip(';')
+        translated += ' ON CONFLICT DO NOTHING'
+
+    if len(_translations) < 2048:
+        _translations[key] = translated
+    return translated
+
+def group_concat(expression, dialect, distinct=False):
+    """Comma-separated aggregate of `expression`"""
+    prefix = 'DISTINCT ' if distinct else ''
+    if dialect == POSTGRES:
+        return f"STRING_AGG({prefix}{expression}, ',')"
+    return f"GROUP_CONCAT({prefix}{expression})"
+
+def day_expression(expression, dialect):
+    """'YYYY-MM-DD' text of a timestamp column, for daily rollups"""
+    if dialect == POSTGRES:
+        return f"TO_CHAR({expression}, 'YYYY-MM-DD')"
+    return f"SUBSTR({expression}, 1, 10)"
+
+def with_returning_id(sql, dialect):
+    """Append RETURNING id on Postgres, where cursor.lastrowid is not available"""
+    if dialect == POSTGRES:
+        return sql.rstrip().rstrip(';') + ' RETURNING id'
+    return sql
+
+def period_start(period, now=None):
+    """Start date for week/month/year filters, matching SQLite's date('now', '-1 month')
+
+    Returned as a 'YYYY-MM-DD' string so it can be bound as a parameter on
+    both backends instead of calling the SQLite-only date() function.
+    """
+    now = now or datetime.utcnow()
+    today = now.date()
+    if period == 'week':
+        start = today - timedelta(days=7)
+    elif period == 'month':
+        year, month = (today.year, today.month - 1) if today.month > 1 else (today.year - 1, 12)
+        start = _clamp_day(year, month, today.day)
+    elif period == 'year':
+        start = _clamp_day(today.year - 1, today.month, today.day)
+    else:
+        return None
+    return start.isoformat()
+
+def _clamp_day(year, month, day):
+    # SQLite normalizes e.g. March 31 - 1 month to March 3; clamping to the
+    # last day of the month is close enough for leaderboard windows
+    while True:
+        try:
+            return datetime(year, month, day).date()
+        except ValueError:
+            day -= 1
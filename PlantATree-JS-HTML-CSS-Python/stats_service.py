@@ -0,0 +1,93 @@
+# Platform statistics service (like a shared stats service behind Express routes and CLI scripts)
+#
+# /api/stats, /api/v1/stats, /api/charity-stats, /api/bootstrap and the
+# admin_eco_manager statistics screen all take their numbers from
+# platform_stats(), so they cannot disagree. It reads the materialized
+# platform_counters (one cached statement) and, when asked for totals, one
+# more statement for the figures that have no counter (all users, pending
+# actions). scan_stats() builds the same dict from the source tables with
+# one conditional-aggregation pass over eco_actions, for audits and for
+# databases whose counters are suspect.
+import repository
+
+UNCOUNTED_TTL = 5  # seconds; commits to users / eco_actions drop the cached row
+
+SELECT_UNCOUNTED = '''
+    SELECT (SELECT COUNT(*) FROM users),
+           (SELECT COUNT(*) FROM eco_actions WHERE approved = FALSE)
+'''
+
+# One pass over eco_actions: approved count/points and pending count per type
+SCAN_ECO_ACTIONS = '''
+    SELECT type,
+           SUM(CASE WHEN approved = TRUE THEN 1 ELSE 0 END),
+           COALESCE(SUM(CASE WHEN approved = TRUE THEN points ELSE 0 END), 0),
+           SUM(CASE WHEN approved = TRUE THEN 0 ELSE 1 END)
+    FROM eco_actions
+    GROUP BY type
+'''
+
+SCAN_LOCATIONS = 'SELECT type, COUNT(*) FROM locations WHERE approved = TRUE GROUP BY type'
+
+SCAN_USERS = '''
+    SELECT (SELECT COUNT(*) FROM users),
+           (SELECT COUNT(*) FROM user_stats WHERE action_count > 0)
+'''
+
+def build_stats(locations_by_type, actions_by_type, points_by_type, active_users, pool_points,
+                total_users=None, pending_actions=None):
+    """The stats dict every caller shares; per-type maps drop zero entries"""
+    stats = {
+        'total_locations': sum(locations_by_type.values()),
+        'locations_by_type': locations_by_type,
+        'total_actions': sum(actions_by_type.values()),
+        'total_points': sum(points_by_type.values()),
+        'eco_actions': {
+            action_type: {'count': count, 'total_points': points_by_type.get(action_type, 0)}
+            for action_type, count in actions_by_type.items()
+        },
+        'active_users': active_users,
+        'charity': repository.charity_progress(pool_points)
+    }
+    if total_users is not None:
+        stats['total_users'] = total_users
+        stats['pending_actions'] = pending_actions
+    return stats
+
+def platform_stats(conn, with_totals=False):
+    """Stats from the materialized counters
+
+    `with_totals` adds total_users and pending_actions (one extra,
+    briefly cached statement).
+    """
+    counters = repository.platform_counters(conn)
+    total_users = pending_actions = None
+    if with_totals:
+        total_users, pending_actions = repository.fetch_all(
+            conn, SELECT_UNCOUNTED, ttl=UNCOUNTED_TTL, tables=('users', 'eco_actions'))[0]
+    return build_stats(
+        repository.counters_by_type(counters, 'locations.approved'),
+        repository.counters_by_type(counters, 'eco_actions.approved'),
+        repository.counters_by_type(counters, 'eco_actions.points'),
+        counters.get('active_users', 0),
+        counters.get(repository.LEDGER_BALANCE, 0),
+        total_users, pending_actions
+    )
+
+def scan_stats(conn):
+    """The same stats (with totals) recomputed from the source tables
+
+    One pass over eco_actions and locations, no counters involved; the
+    charity pool is the approved points total.
+    """
+    actions_by_type, points_by_type, pending_actions = {}, {}, 0
+    for action_type, approved, points, pending in repository.fetch_all(conn, SCAN_ECO_ACTIONS):
+        if approved:
+            actions_by_type[action_type] = approved
+        if points:
+            points_by_type[action_type] = points
+        pending_actions += pending
+    locations_by_type = dict(repository.fetch_all(conn, SCAN_LOCATIONS))
+    total_users, active_users = repository.fetch_one(conn, SCAN_USERS)
+    return build_stats(locations_by_type, actions_by_type, points_by_type, active_users,
+                       sum(points_by_type.values()), total_users, pending_actions)
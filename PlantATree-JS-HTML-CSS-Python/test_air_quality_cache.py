@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Tests for the geohash-keyed Ambee cache, against a local fake Ambee server
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+import ambee
+import ambee_prefetch
+import geo_cache
+from db_pool import ConnectionPool, sqlite_factory
+from migrations import MIGRATIONS
+from write_queue import WriteQueue
+
+SOFIA = (42.6977, 23.3219)
+NEARBY = (42.6980, 23.3225)
+
+class FakeAmbee(BaseHTTPRequestHandler):
+    calls = []
+    delay = 0.0
+    slow_paths = {}
+    status = 200
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        FakeAmbee.calls.append((url.path, self.headers.get('x-api-key')))
+        time.sleep(FakeAmbee.slow_paths.get(url.path, FakeAmbee.delay))
+        body = json.dumps({'message': 'success', 'stations': [{
+            'AQI': len(FakeAmbee.calls), 'lat': float(query['lat'][0]), 'lng': float(query['lng'][0])
+        }]}).encode()
+        self.send_response(FakeAmbee.status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def upstream(monkeypatch):
+    FakeAmbee.calls = []
+    FakeAmbee.delay = 0.0
+    FakeAmbee.slow_paths = {}
+    FakeAmbee.status = 200
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeAmbee)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(ambee, 'AMBEE_BASE_URL', f'http://127.0.0.1:{server.server_port}')
+    monkeypatch.setattr(ambee, 'AMBEE_API_KEY', 'test-key')
+    yield FakeAmbee
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def store(tmp_path):
+    pool = ConnectionPool(sqlite_factory(str(tmp_path / 'cache.db')), max_size=4)
+    with pool.connection() as conn:
+        conn.execute(dict((v, steps) for v, _, steps in MIGRATIONS)[7][0])
+        conn.commit()
+    writer = WriteQueue(pool, max_latency_ms=5)
+    yield geo_cache.DatabaseStore(pool, writer)
+    writer.close()
+    pool.close_all()
+
+def make_cache(store=None, ttl=60, **kwargs):
+    return geo_cache.GeoCache('air_quality', ambee.request_air_quality, ttl=ttl, store=store, **kwargs)
+
+def expire(cache):
+    """Age every entry past its TTL"""
+    for cell, (fetched_at, value) in list(cache._entries.items()):
+        cache._entries[cell] = (fetched_at - cache._ttl(cell) - 1, value)
+
+def test_geohash_matches_reference_values():
+    assert geo_cache.encode(57.64911, 10.40744, 11) == 'u4pruydqqvj'
+    lat, lon = geo_cache.decode('sx8dfsy')
+    assert geo_cache.encode(lat, lon, 7) == 'sx8dfsy'
+    assert geo_cache.encode(*SOFIA) == geo_cache.encode(*NEARBY)
+    with pytest.raises(ValueError):
+        geo_cache.encode(91, 0)
+
+def test_nearby_lookups_share_one_upstream_call(upstream):
+    cache = make_cache()
+    first, info = cache.get(*SOFIA)
+    second, _ = cache.get(*NEARBY)
+    assert first is second
+    assert len(upstream.calls) == 1
+    assert upstream.calls[0] == ('/latest/by-lat-lng', 'test-key')
+    # The upstream is asked for the cell centre, not the raw coordinates
+    assert (first['stations'][0]['lat'], first['stations'][0]['lng']) == pytest.approx(geo_cache.decode(info['cell']))
+    stats = cache.stats()
+    assert stats['hits'] == 1 and stats['misses'] == 1 and stats['hit_rate'] == 0.5
+    assert stats['upstream_latency_ms']['max'] > 0
+    cache.close()
+
+def test_stale_entry_is_served_while_one_refresh_runs(upstream):
+    cache = make_cache()
+    cache.get(*SOFIA)
+    expire(cache)
+    upstream.delay = 0.3
+    start = time.perf_counter()
+    results = [cache.get(*SOFIA) for _ in range(20)]
+    assert time.perf_counter() - start < 0.2
+    assert all(info['stale'] and data['stations'][0]['AQI'] == 1 for data, info in results)
+    time.sleep(0.5)
+    data, info = cache.get(*SOFIA)
+    assert data['stations'][0]['AQI'] == 2 and not info['stale']
+    assert len(upstream.calls) == 2
+    assert cache.stats()['stale_hits'] == 20
+    cache.close()
+
+def test_upstream_errors_keep_stale_data_and_back_off(upstream):
+    cache = make_cache(error_ttl=60)
+    cache.get(*SOFIA)
+    expire(cache)
+    upstream.status = 500
+    cache.get(*SOFIA)
+    cache.close()  # waits for the background refresh
+    data, info = cache.get(*SOFIA)
+    assert info['stale'] and data['stations'][0]['AQI'] == 1
+    assert len(upstream.calls) == 2
+    assert cache.stats()['upstream_errors'] == 1
+    cache.close()
+
+def test_data_past_max_stale_is_not_served(upstream, monkeypatch):
+    cache = make_cache(max_stale=30)
+    cache.get(*SOFIA)
+    cell, (fetched_at, value) = next(iter(cache._entries.items()))
+    cache._entries[cell] = (fetched_at - 60 - 30 - 1, value)
+    upstream.status = 503
+    assert cache.get(*SOFIA) is None
+    monkeypatch.setattr(ambee, 'AIR_QUALITY_CACHE', cache)
+    assert ambee.air_quality(*SOFIA)['source'] == 'fallback'
+    cache.close()
+
+def test_history_write_errors_do_not_fail_the_lookup(upstream, monkeypatch):
+    def record(*args):
+        raise RuntimeError('write queue full')
+
+    monkeypatch.setattr(ambee.aq_history, 'record', record)
+    cache = geo_cache.GeoCache('air_quality', ambee.fetch_air_quality, ttl=60)
+    data, info = cache.get(*SOFIA)
+    assert data['stations'][0]['AQI'] == 1 and not info['stale']
+    assert cache.stats()['upstream_errors'] == 0
+    cache.close()
+
+def test_entries_survive_a_restart(upstream, store):
+    cache = make_cache(store)
+    cache.get(*SOFIA)
+    cache.close()
+    store._writer.flush(timeout=5)
+
+    restarted = make_cache(store)
+    data, info = restarted.get(*NEARBY)
+    assert data['stations'][0]['AQI'] == 1 and not info['stale']
+    assert len(upstream.calls) == 1
+    assert restarted.stats()['restored'] == 1
+    restarted.close()
+
+def test_payload_falls_back_without_upstream(upstream, monkeypatch):
+    upstream.status = 503
+    monkeypatch.setattr(ambee, 'AIR_QUALITY_CACHE', make_cache())
+    payload = ambee.air_quality(*SOFIA)
+    assert payload['source'] == 'fallback' and payload['data']['stations'][0]['city'] == 'Sofia'
+    assert ambee.air_quality('not-a-number', 23.3)['source'] == 'fallback'
+    ambee.AIR_QUALITY_CACHE.close()
+
+def test_sofia_grid_covers_the_boundary():
+    rings = ambee_prefetch.load_boundary()
+    cells = ambee_prefetch.grid_cells(rings, 5)
+    assert geo_cache.encode(*SOFIA, 5) in cells
+    assert all(geo_cache.encode(lat, lon, 5) in cells for lon, lat in rings[0])
+    assert ambee_prefetch.contains(rings, *SOFIA) and not ambee_prefetch.contains(rings, 42.15, 24.75)
+    assert ambee_prefetch.round_interval(len(cells)) >= ambee_prefetch.AMBEE_PREFETCH_MIN_INTERVAL
+
+def test_web_process_answers_from_the_prefetched_grid(upstream, store):
+    cells = ambee_prefetch.grid_cells(ambee_prefetch.load_boundary(), 5)
+    prefetcher = ambee_prefetch.Prefetcher([make_cache(store)], cells, interval=3600, pause=0)
+    prefetcher.run_once()
+    assert prefetcher.upstream_calls == len(cells) == len(upstream.calls)
+    store._writer.flush(timeout=5)
+    prefetcher.run_once()
+    assert prefetcher.skipped == len(cells)
+
+    # A separate process: everything comes from the table, nothing from Ambee
+    web = make_cache(store)
+    web.use_prefetched(cells, ttl=5400, nearest_km=5)
+    data, info = web.get(*SOFIA)
+    assert not info['stale'] and info['cell'] in cells
+    _, info = web.get(42.6929, 23.215)  # just west of the boundary
+    assert info['cell'] == 'sx8dc'
+    assert web.get(42.1354, 24.7453)[1]['cell'] not in cells  # Plovdiv is too far
+    calls = len(upstream.calls)
+
+    # Overdue in memory: the refresh re-reads the prefetcher's copy, even with Ambee down
+    upstream.status = 500
+    expire(web)
+    data, info = web.get(*SOFIA)
+    web.close()
+    assert info['stale'] and len(upstream.calls) == calls
+    assert web.stats()['reloads'] == 1
+    assert not web.get(*SOFIA)[1]['stale']
+
+def test_environment_runs_both_lookups_concurrently(upstream, monkeypatch):
+    monkeypatch.setattr(ambee, 'AIR_QUALITY_CACHE', make_cache())
+    monkeypatch.setattr(ambee, 'WEATHER_CACHE', geo_cache.GeoCache('weather', ambee.request_weather, ttl=60))
+    upstream.delay = 0.3
+    payload = ambee.environment(*SOFIA, timeout=2)
+    assert not payload['partial'] and payload['missing'] == []
+    assert payload['air_quality']['source'] == payload['weather']['source'] == 'ambee_api'
+    assert payload['elapsed_ms'] < 550  # the slower call, not the sum
+
+    # Only weather is slow now: its side falls back, air quality still comes back
+    ambee.AIR_QUALITY_CACHE.clear()
+    ambee.WEATHER_CACHE.clear()
+    upstream.delay = 0.0
+    upstream.slow_paths = {'/weather/latest/by-lat-lng': 0.5}
+    payload = ambee.environment(*SOFIA, timeout=0.2)
+    assert payload['partial'] and payload['missing'] == ['weather']
+    assert payload['weather']['source'] == 'fallback'
+    assert payload['weather']['data'] == ambee.fallback_weather()
+    assert payload['air_quality']['data']['stations']
+    assert payload['elapsed_ms'] < 450
+    ambee.AIR_QUALITY_CACHE.close()
+    ambee.WEATHER_CACHE.close()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Tests for the columnar analytics snapshot
+"""
+
+import pytest
+
+pytest.importorskip('numpy')
+
+import analytics
+import bootstrap
+import repository
+from db_pool import sqlite_factory
+
+@pytest.fixture
+def conn(tmp_path, monkeypatch):
+    monkeypatch.setattr(analytics, 'ANALYTICS_REFRESH_SECONDS', 0)
+    connection = sqlite_factory(str(tmp_path / 'analytics.db'))()
+    bootstrap.bootstrap(connection)
+    connection.executemany("INSERT INTO users (id, username, email, password_hash) VALUES (?, ?, ?, 'x')",
+                           [(100 + i, f'u{i}', f'u{i}@x') for i in range(5)])
+    for i in range(200):
+        action_id = repository.insert_eco_action(connection, 'a', 'd', ('tree', 'bike', 'clean')[i % 3],
+                                                 None, None, 5 + i % 11, 100 + i % 5, True)
+        connection.execute('UPDATE eco_actions SET created_at = ? WHERE id = ?',
+                           (f'2025-02-{1 + i % 20:02d} {i % 24:02d}:15:00', action_id))
+    connection.commit()
+    yield connection
+    connection.close()
+
+def test_charts_match_sql(conn):
+    snapshot = analytics.ActionSnapshot()
+    columns, types = snapshot.refresh(conn)
+
+    heatmap = analytics.activity_heatmap(columns)
+    expected = {(int(w), int(h)): n for w, h, n in conn.execute('''
+        SELECT strftime('%w', created_at), strftime('%H', created_at), COUNT(*)
+        FROM eco_actions WHERE approved = TRUE GROUP BY 1, 2''')}
+    for (sunday_first, hour), count in expected.items():
+        assert heatmap['matrix'][(sunday_first + 6) % 7][hour] == count
+    assert heatmap['total'] == sum(expected.values())
+
+    mix = analytics.type_mix(columns, types, 'month')
+    by_type = dict(conn.execute('SELECT type, SUM(points) FROM eco_actions WHERE approved = TRUE GROUP BY type'))
+    assert {t: sum(row[i] for row in mix['points']) for i, t in enumerate(mix['types'])} == by_type
+
+    totals = sorted(row[0] for row in conn.execute('SELECT total_points FROM user_stats WHERE total_points > 0'))
+    distribution = analytics.points_distribution(columns, bins=4)
+    assert distribution['max'] == totals[-1] and distribution['users'] == len(totals)
+    assert sum(bucket['users'] for bucket in distribution['histogram']) == len(totals)
+
+def test_refresh_appends_new_rows_and_reloads_on_old_changes(conn):
+    snapshot = analytics.ActionSnapshot()
+    snapshot.refresh(conn)
+    repository.insert_eco_action(conn, 'a', 'd', 'recycle', None, None, 8, 101, True)
+    conn.commit()
+    columns, types = snapshot.refresh(conn)
+    assert snapshot.full_loads == 1 and snapshot.appended == 1 and 'recycle' in types
+
+    repository.set_eco_action_approved(conn, 3, False)
+    conn.commit()
+    columns, types = snapshot.refresh(conn)
+    assert snapshot.full_loads == 2
+    assert 3 not in columns['id'].tolist() and len(columns['id']) == 200
+
+    since = analytics.parse_since('2025-02-15')
+    recent, _ = analytics.get_columns(conn, since, 'tree')
+    assert (recent['created'] >= since).all() and set(recent['type'].tolist()) <= {types.index('tree')}
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Tests for the air quality history: recording, rollups, retention and range queries
+"""
+
+import pytest
+
+import aq_history
+from aq_history import DAY, HOUR
+from db_pool import sqlite_factory
+from migrations import MIGRATIONS
+
+CELL = 'sx8df'
+NOW = 1_760_000_000 - 1_760_000_000 % DAY + 12 * HOUR  # midday UTC
+
+def reading(aqi, pm25=10.0, updated_at=None):
+    station = {'AQI': aqi, 'PM25': pm25, 'PM10': 20.0, 'NO2': 7.5, 'OZONE': 22.8, 'CO': 1.0, 'SO2': 0.8}
+    if updated_at:
+        station['updatedAt'] = updated_at
+    return {'message': 'success', 'stations': [station]}
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = sqlite_factory(str(tmp_path / 'aq.db'))()
+    for step in dict((v, steps) for v, _, steps in MIGRATIONS)[8]:
+        conn.execute(step)
+    yield conn
+    conn.close()
+
+def add(conn, ts, aqi, cell=CELL):
+    conn.execute(aq_history.INSERT_SAMPLE, aq_history.sample_params(cell, reading(aqi), fetched_at=ts))
+
+def test_samples_use_the_observation_time_and_skip_empty_responses(conn):
+    params = aq_history.sample_params(CELL, reading(44, updated_at='2025-10-09T08:00:00.000Z'), 1)
+    assert params[:3] == (CELL, 1759996800, 44.0)
+    conn.execute(aq_history.INSERT_SAMPLE, params)
+    conn.execute(aq_history.INSERT_SAMPLE, params)  # the same reading fetched again
+    assert conn.execute('SELECT COUNT(*) FROM aq_samples').fetchone()[0] == 1
+    assert aq_history.sample_params(CELL, {'stations': []}) is None
+    assert aq_history.sample_params(CELL, {'message': 'error'}) is None
+
+def test_rollups_are_weighted_and_retention_drops_old_rows(conn):
+    # Three days of readings every 20 minutes; AQI = the hour of day
+    start = NOW - 3 * DAY
+    for ts in range(start, NOW + 30 * 60, 20 * 60):
+        add(conn, ts, ts % DAY // HOUR)
+    aq_history.rollup(conn, NOW)
+    hourly = tuple(conn.execute('SELECT samples, aqi FROM aq_hourly WHERE bucket = ?', (NOW - 2 * HOUR,)).fetchone())
+    assert hourly == (3, 10.0)
+    # The current hour is not complete yet
+    assert conn.execute('SELECT COUNT(*) FROM aq_hourly WHERE bucket >= ?', (NOW,)).fetchone()[0] == 0
+    daily = tuple(conn.execute('SELECT samples, aqi FROM aq_daily WHERE bucket = ?', (NOW - NOW % DAY - DAY,)).fetchone())
+    assert daily == (72, 11.5)
+
+    # Rolling up again (with late readings) rewrites rows instead of adding to them
+    add(conn, NOW - 2 * HOUR + 60, 40)
+    aq_history.rollup(conn, NOW)
+    assert tuple(conn.execute('SELECT samples, aqi FROM aq_hourly WHERE bucket = ?',
+                              (NOW - 2 * HOUR,)).fetchone()) == (4, 17.5)
+
+    deleted = aq_history.apply_retention(conn, NOW + 5 * DAY)
+    assert deleted['aq_samples'] > 0 and deleted['aq_hourly'] == deleted['aq_daily'] == 0
+    assert conn.execute('SELECT MIN(ts) FROM aq_samples').fetchone()[0] >= NOW - 2 * DAY
+
+def test_history_is_bounded_and_picks_a_resolution(conn):
+    for ts in range(NOW - 40 * DAY, NOW, 15 * 60):
+        add(conn, ts, 50)
+    add(conn, NOW - HOUR, 80, cell='sx8dg')
+    aq_history.rollup(conn, NOW)
+
+    day = aq_history.history(conn, CELL, NOW - DAY, NOW, max_points=500, now=NOW)
+    assert day['resolution'] == 'raw' and day['count'] == 96
+    assert day['points'][0]['aqi'] == 50.0 and day['points'][0]['samples'] == 1
+
+    month = aq_history.history(conn, CELL, NOW - 30 * DAY, NOW, metrics=('aqi',), max_points=100,
+                                 now=NOW)
+    assert month['resolution'] == 'hour' and month['step_seconds'] % HOUR == 0
+    assert month['count'] <= 100 and set(month['points'][0]) == {'t', 'samples', 'aqi'}
+    assert sum(point['samples'] for point in month['points']) == 30 * 96
+
+    with pytest.raises(ValueError):
+        aq_history.history(conn, CELL, NOW, NOW - 1)
+    with pytest.raises(ValueError):
+        aq_history.history(conn, CELL, NOW - DAY, NOW, metrics=('pm1',))
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Tests for the pooled database connections
+"""
+
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import db_pool
+from db_pool import (ConnectionPool, PooledConnection, PoolTimeout, SqliteSnapshot,
+                     create_read_pool, sqlite_factory)
+
+def make_pool(tmp_path, **kwargs):
+    return ConnectionPool(sqlite_factory(str(tmp_path / 'pool.db')), **kwargs)
+
+def test_connections_are_reused(tmp_path):
+    pool = make_pool(tmp_path, max_size=2)
+    first = pool.acquire()
+    pool.release(first)
+    second = pool.acquire()
+    assert second is first
+    pool.release(second)
+    assert pool.stats()['created'] == 1
+
+def test_checkout_times_out_when_exhausted(tmp_path):
+    pool = make_pool(tmp_path, max_size=1)
+    held = pool.acquire()
+    with pytest.raises(PoolTimeout):
+        pool.acquire(timeout=0.05)
+    pool.release(held)
+    assert pool.stats()['timeouts'] == 1
+
+def test_waiter_gets_released_connection(tmp_path):
+    pool = make_pool(tmp_path, max_size=1)
+    held = pool.acquire()
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(pool.acquire(timeout=2)))
+    waiter.start()
+    pool.release(held)
+    waiter.join()
+    assert got == [held]
+    pool.release(held)
+
+def test_release_rolls_back_uncommitted_work(tmp_path):
+    pool = make_pool(tmp_path, max_size=1)
+    with pool.connection() as conn:
+        conn.execute('CREATE TABLE t (x INTEGER)')
+        conn.commit()
+        conn.execute('INSERT INTO t VALUES (1)')
+    with pool.connection() as conn:
+        assert conn.execute('SELECT COUNT(*) FROM t').fetchone()[0] == 0
+
+def test_unhealthy_idle_connection_is_replaced(tmp_path):
+    pool = make_pool(tmp_path, max_size=1, health_check_interval=0)
+    conn = pool.acquire()
+    pool.release(conn)
+    conn.close()  # simulate a connection that died while idle
+    fresh = pool.acquire()
+    assert fresh is not conn
+    assert pool.stats()['health_check_failures'] == 1
+    assert list(pool._born) == [id(fresh)]  # the dead connection's birth time is dropped
+    pool.release(fresh)
+
+def test_pooled_connection_close_returns_to_pool(tmp_path):
+    pool = make_pool(tmp_path, max_size=1)
+    handle = PooledConnection(pool, pool.acquire())
+    handle.cursor().execute('SELECT 1')
+    handle.close()
+    assert pool.stats()['in_use'] == 0
+    assert pool.stats()['idle'] == 1
+
+def test_sqlite_profile_is_applied_at_connect(tmp_path):
+    pool = make_pool(tmp_path, max_size=1)
+    with pool.connection() as conn:
+        assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        assert conn.execute('PRAGMA synchronous').fetchone()[0] == 1  # NORMAL
+        assert conn.execute('PRAGMA busy_timeout').fetchone()[0] == 5000
+
+def test_invalid_profile_value_is_rejected(tmp_path):
+    connect = sqlite_factory(str(tmp_path / 'bad.db'), profile={'journal_mode': 'WAL; DROP TABLE users'})
+    with pytest.raises(ValueError):
+        connect()
+
+def seeded_pool(tmp_path):
+    pool = make_pool(tmp_path, max_size=2)
+    with pool.connection() as conn:
+        conn.execute('CREATE TABLE t (n INTEGER)')
+        conn.execute('INSERT INTO t VALUES (1)')
+        conn.commit()
+    return pool
+
+def test_read_only_pool_sees_commits_but_rejects_writes(tmp_path):
+    pool = seeded_pool(tmp_path)
+    read_pool = create_read_pool(pool, sqlite_path=str(tmp_path / 'pool.db'), mode='ro')
+    assert read_pool is not pool
+    with read_pool.connection() as conn:
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute('INSERT INTO t VALUES (2)')
+    with pool.connection() as conn:
+        conn.execute('INSERT INTO t VALUES (2)')
+        conn.commit()
+    with read_pool.connection() as conn:
+        assert conn.execute('SELECT COUNT(*) FROM t').fetchone()[0] == 2
+    assert create_read_pool(pool, mode='off') is pool
+
+def test_snapshot_only_changes_on_refresh(tmp_path):
+    pool = seeded_pool(tmp_path)
+    snapshot = SqliteSnapshot(str(tmp_path / 'pool.db'), interval=3600).start()
+    read_pool = ConnectionPool(sqlite_factory(snapshot.path, read_only=True), max_size=1, max_lifetime=0.01)
+    with pool.connection() as conn:
+        conn.execute('INSERT INTO t VALUES (2)')
+        conn.commit()
+    with read_pool.connection() as conn:
+        assert conn.execute('SELECT COUNT(*) FROM t').fetchone()[0] == 1
+    snapshot.refresh()
+    time.sleep(0.02)
+    with read_pool.connection() as conn:
+        assert conn.execute('SELECT COUNT(*) FROM t').fetchone()[0] == 2
+    snapshot.stop()
+
+def test_read_routing_honours_read_your_writes(tmp_path):
+    from flask import Flask
+
+    pool = seeded_pool(tmp_path)
+    read_pool = create_read_pool(pool, sqlite_path=str(tmp_path / 'pool.db'), mode='ro')
+    db_pool.set_pool(pool, read_pool)
+    app = Flask(__name__)
+    db_pool.init_app(app)
+    try:
+        with app.test_request_context('/api/locations'):
+            assert db_pool.get_read_connection()._pool is read_pool
+        with app.test_request_context('/api/locations', headers={'X-Read-Your-Writes': '1'}):
+            assert db_pool.get_read_connection()._pool is pool
+        with app.test_request_context('/api/locations?consistent=1'):
+            assert db_pool.get_read_connection()._pool is pool
+        with app.test_request_context('/api/locations'):
+            db_pool.get_connection()
+            assert db_pool.get_read_connection()._pool is pool
+    finally:
+        db_pool.set_pool(None)
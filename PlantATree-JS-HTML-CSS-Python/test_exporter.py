@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Tests for the streaming CSV / NDJSON exports
+"""
+
+import csv
+import gzip
+import io
+import json
+
+import pytest
+
+import bootstrap
+import exporter
+from db_pool import sqlite_factory
+
+@pytest.fixture
+def conn(tmp_path):
+    connection = sqlite_factory(str(tmp_path / 'export.db'))()
+    bootstrap.bootstrap(connection)
+    connection.execute('DELETE FROM eco_actions')
+    connection.executemany(
+        'INSERT INTO eco_actions (title, description, type, points, user_id, approved, created_at) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?)',
+        [(f'act "{i}", ok', 'd', 'tree' if i % 2 else 'bike', 15, 1, i % 7 != 0,
+          f'2025-03-{1 + i % 28:02d} 10:00:00') for i in range(1200)]
+    )
+    connection.commit()
+    yield connection
+    connection.close()
+
+def approved(conn, where='', params=()):
+    return conn.execute('SELECT COUNT(*) FROM eco_actions WHERE approved = TRUE' + where, params).fetchone()[0]
+
+def test_ndjson_streams_in_chunks_with_filters(conn):
+    chunks = list(exporter.stream_export('eco-actions', 'ndjson', since='2025-03-05', until='2025-03-06',
+                                         action_type='tree', conn=conn))
+    assert len(chunks) >= 1
+    rows = [json.loads(line) for line in b''.join(chunks).decode().splitlines()]
+    assert len(rows) == approved(conn, " AND type = 'tree' AND created_at >= '2025-03-05' AND created_at < '2025-03-07'")
+    assert {row['type'] for row in rows} == {'tree'} and rows[0]['username'] == 'admin'
+
+    everything = list(exporter.stream_export('eco-actions', 'ndjson', conn=conn))
+    assert len(everything) > 1  # more rows than one chunk
+    assert b''.join(everything).count(b'\n') == approved(conn)
+
+def test_csv_round_trips_through_gzip(conn):
+    data = gzip.decompress(b''.join(exporter.stream_export('eco-actions', 'csv', gzip=True, conn=conn)))
+    rows = list(csv.reader(io.StringIO(data.decode())))
+    assert rows[0][:3] == ['id', 'title', 'description']
+    assert len(rows) - 1 == approved(conn)
+    assert rows[1][1] == 'act "1", ok'
+
+def test_bad_filters_are_rejected_up_front():
+    for kwargs in ({'dataset': 'users', 'fmt': 'csv'}, {'dataset': 'locations', 'fmt': 'xml'},
+                   {'dataset': 'locations', 'fmt': 'csv', 'since': '03/05/2025'}):
+        with pytest.raises(exporter.ExportError):
+            exporter.stream_export(**kwargs)
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Tests for the Google Translate client, against a local server
+"""
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+import google_translate
+import http_client
+
+pytest.importorskip('bs4')
+
+class TranslatePage(BaseHTTPRequestHandler):
+    status = 200
+    queries = []
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        TranslatePage.queries.append(query)
+        body = f'<html><body><div class="result-container">[{query["tl"][0]}] {query["q"][0]}</div></body></html>'
+        body = body.encode('utf-8')
+        self.send_response(TranslatePage.status)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def page(monkeypatch):
+    TranslatePage.status = 200
+    TranslatePage.queries = []
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), TranslatePage)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(google_translate, 'GOOGLE_TRANSLATE_URL', f'http://127.0.0.1:{httpd.server_port}/m')
+    yield TranslatePage
+    httpd.shutdown()
+    httpd.server_close()
+
+def test_translation_goes_through_the_shared_client(page):
+    calls = http_client.stats().get('google_translate', {}).get('calls', 0)
+    assert google_translate.translate('  Здравей  ', 'en') == '[en] Здравей'
+    assert page.queries == [{'sl': ['auto'], 'tl': ['en'], 'q': ['Здравей']}]
+    assert http_client.stats()['google_translate']['calls'] == calls + 1
+
+    # Nothing to translate: no request
+    assert google_translate.translate('   ', 'en') == ''
+    assert len(page.queries) == 1
+
+def test_upstream_errors_raise(page, monkeypatch):
+    monkeypatch.setattr(http_client.get_client(), 'backoff', 0)
+    page.status = 503
+    with pytest.raises(google_translate.TranslationError):
+        google_translate.translate('Здравей', 'en')
+    with pytest.raises(google_translate.TranslationError):
+        google_translate.translate('x' * (google_translate.MAX_CHARS + 1), 'en')
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Tests for the shared outbound HTTP client, against a local server
+"""
+
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from http_client import HttpClient
+
+class Upstream(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive
+    statuses = []
+    delay = 0.0
+    connections = set()
+    hits = 0
+
+    def do_GET(self):
+        Upstream.connections.add(self.client_address)
+        Upstream.hits += 1
+        time.sleep(Upstream.delay)
+        status = Upstream.statuses.pop(0) if Upstream.statuses else 200
+        body = b'{"ok": true}'
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server():
+    Upstream.statuses = []
+    Upstream.delay = 0.0
+    Upstream.connections = set()
+    Upstream.hits = 0
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Upstream)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{httpd.server_port}/'
+    httpd.shutdown()
+    httpd.server_close()
+
+def test_connections_are_reused(server):
+    client = HttpClient()
+    for _ in range(5):
+        assert client.get('fake', server).status_code == 200
+    assert len(Upstream.connections) == 1
+    stats = client.stats()['fake']
+    assert stats['calls'] == 5 and stats['retries'] == 0 and stats['statuses'] == {'200': 5}
+    assert sum(stats['latency_ms']['histogram'].values()) == 5
+    client.close()
+
+def test_retryable_statuses_are_retried_with_backoff(server):
+    client = HttpClient(retries=2, backoff=0.01)
+    Upstream.statuses = [503, 502]
+    assert client.get('fake', server).status_code == 200
+    assert Upstream.hits == 3
+    Upstream.statuses = [404]
+    assert client.get('fake', server).status_code == 404  # not retryable
+    stats = client.stats()['fake']
+    assert stats['attempts'] == 4 and stats['retries'] == 2
+    client.close()
+
+def test_budget_bounds_the_whole_call(server):
+    client = HttpClient(retries=5, backoff=0.01)
+    Upstream.delay = 0.3
+    start = time.monotonic()
+    with pytest.raises(requests.Timeout):
+        client.get('slow', server, timeout=0.2, budget=0.5)
+    assert time.monotonic() - start < 0.9
+    stats = client.stats()['slow']
+    assert stats['errors'] == 1 and stats['statuses'] == {'error': 1}
+    assert 1 <= stats['attempts'] <= 3
+    client.close()
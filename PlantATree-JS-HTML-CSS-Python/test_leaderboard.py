@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Tests for the in-memory leaderboard engine
+"""
+
+import random
+
+import pytest
+
+import bootstrap
+import db_pool
+import leaderboard
+import repository
+from db_pool import ConnectionPool, sqlite_factory
+from leaderboard import IndexableSkipList, Leaderboard, LEADERBOARD
+
+def test_skip_list_matches_sorted_order():
+    rng = random.Random(7)
+    skip, reference = IndexableSkipList(), []
+    for _ in range(2000):
+        key = rng.randrange(500)
+        if key in reference:
+            skip.remove(key)
+            reference.remove(key)
+        else:
+            skip.insert(key)
+            reference.append(key)
+            reference.sort()
+    assert list(skip) == reference and len(skip) == len(reference)
+    for index, key in enumerate(reference):
+        assert skip.rank(key) == index
+    assert skip.slice(10, 25) == reference[10:35]
+    assert skip.slice(len(reference) - 3, 10) == reference[-3:]
+    with pytest.raises(KeyError):
+        skip.remove(-1)
+
+@pytest.fixture
+def conn(tmp_path):
+    connection = sqlite_factory(str(tmp_path / 'board.db'))()
+    bootstrap.bootstrap(connection)
+    for user_id, name in ((101, 'ana'), (102, 'bob'), (103, 'cvet')):
+        connection.execute('INSERT INTO users (id, username, email, password_hash) VALUES (?, ?, ?, ?)',
+                           (user_id, name, f'{name}@x', 'x'))
+        repository.user_changed(connection, user_id)
+    connection.commit()
+    LEADERBOARD.rebuild(connection)
+    yield connection
+    connection.close()
+
+def add(conn, user_id, points):
+    return repository.insert_eco_action(conn, 'a', 'd', 'tree', None, None, points, user_id, True)
+
+def test_updates_apply_only_after_commit(conn):
+    # Bootstrap seeds the admin (id 1); ties are broken by user id
+    add(conn, 102, 30)
+    assert LEADERBOARD.top(1)[0]['points'] == 0
+    conn.commit()
+    assert [(e['id'], e['points']) for e in LEADERBOARD.top(2)] == [(102, 30), (1, 0)]
+
+    add(conn, 103, 50)
+    conn.rollback()
+    assert LEADERBOARD.rank_of(103) == 4
+
+    add(conn, 103, 10)
+    add(conn, 103, 10)
+    conn.commit()
+    assert LEADERBOARD.rank_of(103) == 2
+    rank, window = LEADERBOARD.around(103, 1)
+    assert rank == 2 and [e['id'] for e in window] == [102, 103, 1]
+    assert window[1] == {'rank': 2, 'id': 103, 'username': 'cvet', 'points': 20,
+                         'actions': 2, 'join_date': window[1]['join_date']}
+
+def test_changes_from_another_process_are_caught_up(conn):
+    board = Leaderboard()
+    board.rebuild(conn)
+    # A writer in another process: this board hears only the version counter
+    add(conn, 103, 5)
+    conn.commit()
+    assert board.rank_of(103) == 4
+    assert board.ensure_current(conn) is True
+    assert board.top(1)[0] == {'rank': 1, 'id': 103, 'username': 'cvet', 'points': 5,
+                               'actions': 1, 'join_date': board.top(1)[0]['join_date']}
+    assert board.ensure_current(conn) is False
+
+    conn.execute('DELETE FROM users WHERE id = 102')
+    repository.user_changed(conn, 102)
+    conn.commit()
+    board.ensure_current(conn)
+    assert len(board) == 3 and board.rank_of(102) is None
+    assert board.stats()['rebuilds'] == 1 and board.stats()['catch_ups'] == 2
+
+    # Changes the log no longer holds fall back to a full rebuild
+    add(conn, 101, 50)
+    conn.execute('DELETE FROM user_stats_changes')
+    conn.commit()
+    board.ensure_current(conn)
+    assert board.rank_of(101) == 1 and board.stats()['rebuilds'] == 2
+
+def test_position_reports_rank_percentile_and_neighbours(conn):
+    add(conn, 101, 40)
+    add(conn, 102, 30)
+    conn.commit()
+    position = LEADERBOARD.position(102, radius=5)
+    assert position['rank'] == 2 and position['total_users'] == 4
+    assert position['percentile'] == round(100 * 2 / 3, 1)
+    assert [e['id'] for e in position['neighbours']] == [101, 102, 1, 103]
+    assert [e['id'] for e in LEADERBOARD.position(101, radius=1)['neighbours']] == [101, 102]
+    assert LEADERBOARD.position(999) is None
+
+def test_version_check_reuses_the_request_connection(conn, tmp_path):
+    from flask import Flask
+
+    # One connection: a nested checkout would wait out the pool timeout
+    pool = ConnectionPool(sqlite_factory(str(tmp_path / 'board.db')), max_size=1, timeout=0.2)
+    db_pool.set_pool(pool)
+    app = Flask(__name__)
+    db_pool.init_app(app)
+    try:
+        with app.test_request_context('/api/leaderboard'):
+            held = repository.get_read_connection()
+            LEADERBOARD.version = None  # force a version check
+            board = leaderboard.get_leaderboard()
+            assert board.version is not None and len(board) == 4
+            assert held.execute('SELECT COUNT(*) FROM users').fetchone()[0] == 4
+        # Without a held connection the check must not pin the request to the primary
+        with app.test_request_context('/api/leaderboard'):
+            LEADERBOARD.version = None
+            leaderboard.get_leaderboard()
+            assert db_pool.request_connection() is None and not db_pool.read_your_writes()
+        assert pool.stats()['timeouts'] == 0 and pool.stats()['in_use'] == 0
+    finally:
+        db_pool.set_pool(None)
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Tests for the schema migration runner
+"""
+
+import sqlite3
+
+from migrations import LATEST_VERSION, MIGRATIONS, current_version, run_migrations
+
+def make_database(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / 'migrate.db'))
+    conn.executescript('''
+        CREATE TABLE users (id INTEGER PRIMARY KEY, username TEXT, points INTEGER DEFAULT 0,
+                            created_at TIMESTAMP);
+        CREATE TABLE user_sessions (id INTEGER PRIMARY KEY, user_id INTEGER, session_token TEXT UNIQUE,
+                                    expires_at TIMESTAMP, created_at TIMESTAMP);
+        CREATE TABLE locations (id INTEGER PRIMARY KEY, name TEXT, type TEXT, user_id INTEGER,
+                                approved BOOLEAN, created_at TIMESTAMP);
+        CREATE TABLE eco_actions (id INTEGER PRIMARY KEY, title TEXT, type TEXT, points INTEGER,
+                                  user_id INTEGER, approved BOOLEAN, created_at TIMESTAMP);
+        CREATE TABLE sofia_redesigns (id INTEGER PRIMARY KEY, type TEXT, created_at TIMESTAMP);
+    ''')
+    return conn
+
+def test_fresh_database_is_migrated_to_latest(tmp_path):
+    conn = make_database(tmp_path)
+    assert current_version(conn) == 0
+    applied = run_migrations(conn)
+    assert [version for version, _ in applied] == [m[0] for m in MIGRATIONS]
+    assert current_version(conn) == LATEST_VERSION
+    assert run_migrations(conn) == []
+
+def test_feed_query_uses_index(tmp_path):
+    conn = make_database(tmp_path)
+    run_migrations(conn)
+    plan = ' '.join(row[-1] for row in conn.execute('''
+        EXPLAIN QUERY PLAN
+        SELECT id, title FROM eco_actions WHERE approved = TRUE ORDER BY created_at DESC LIMIT 20
+    '''))
+    assert 'idx_eco_actions_approved_created' in plan
+    assert 'TEMP B-TREE' not in plan
+
+def test_bootstrap_runs_once(tmp_path):
+    import bootstrap
+    from db_pool import sqlite_factory
+
+    conn = sqlite_factory(str(tmp_path / 'bootstrap.db'))()
+    assert bootstrap.schema_version(conn) is None
+    assert bootstrap.bootstrap(conn) is True
+    assert bootstrap.schema_version(conn) == LATEST_VERSION
+    assert bootstrap.bootstrap(conn) is False
+    assert conn.execute('SELECT COUNT(*) FROM locations').fetchone()[0] == 5
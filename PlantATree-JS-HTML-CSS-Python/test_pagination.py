@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Tests for keyset (cursor) pagination
+"""
+
+import pytest
+
+import bootstrap
+import pagination
+from db_pool import sqlite_factory
+
+SELECT_LOCATIONS = 'SELECT id, name, created_at FROM locations'
+
+@pytest.fixture
+def conn(tmp_path):
+    connection = sqlite_factory(str(tmp_path / 'pages.db'))()
+    bootstrap.bootstrap(connection)
+    connection.execute('DELETE FROM locations')
+    # Three rows share each timestamp so pages have to break ties by id
+    connection.executemany(
+        'INSERT INTO locations (name, type, approved, created_at) VALUES (?, ?, ?, ?)',
+        [(f'loc{i}', 'park', i % 5 != 0, f'2025-01-{1 + i // 3:02d} 12:00:00') for i in range(60)]
+    )
+    connection.commit()
+    yield connection
+    connection.close()
+
+def test_cursor_round_trip_and_rejects_garbage():
+    token = pagination.encode_cursor('2025-01-02 12:00:00', 42)
+    assert pagination.decode_cursor(token) == ('2025-01-02 12:00:00', 42)
+    for bad in ('nope', pagination.encode_cursor('x', 1)[:-3] + '!!', 'WzEsMl0'):
+        with pytest.raises(pagination.InvalidCursor):
+            pagination.decode_cursor(bad)
+
+def test_pages_cover_every_row_once_in_order(conn):
+    expected = [tuple(row) for row in conn.execute(
+        SELECT_LOCATIONS + ' WHERE approved = TRUE ORDER BY created_at DESC, id DESC')]
+    seen, after = [], None
+    while True:
+        rows, next_cursor = pagination.fetch_page(conn, SELECT_LOCATIONS, ['approved = TRUE'], (), after, 7)
+        seen.extend(tuple(row) for row in rows)
+        if next_cursor is None:
+            break
+        after = pagination.decode_cursor(next_cursor)
+    assert seen == expected and len(seen) == 48
+
+    rows, next_cursor = pagination.fetch_page(conn, SELECT_LOCATIONS, ['approved = TRUE'], (), None, None)
+    assert len(rows) == 48 and next_cursor is None
+
+def test_next_page_is_an_index_range_scan(conn):
+    sql, params = pagination.keyset_query(SELECT_LOCATIONS, ['approved = TRUE'], (),
+                                          ('2025-01-10 12:00:00', 30), 20)
+    plan = ' '.join(row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, params))
+    assert 'USING INDEX idx_locations_approved_created_id' in plan
+    assert 'TEMP B-TREE' not in plan
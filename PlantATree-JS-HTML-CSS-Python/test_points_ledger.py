@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Tests for the append-only points ledger
+"""
+
+import repository
+
+def user_points(conn, user_id):
+    return conn.execute('SELECT points FROM users WHERE id = ?', (user_id,)).fetchone()[0]
+
+def pool(conn):
+    return repository.platform_counters(conn).get(repository.LEDGER_BALANCE, 0)
+
+def test_entries_carry_running_balances(conn, add):
+    start = pool(conn)
+    tree = add('tree', 15, True)
+    pending = add('clean', 10, False)
+    repository.set_eco_action_approved(conn, pending, True)
+    repository.delete_eco_action(conn, tree)
+    conn.commit()
+
+    entries = repository.get_user_ledger(conn, 7)
+    assert [(e['reason'], e['delta'], e['user_balance']) for e in entries] == [
+        ('eco_action.deleted', -15, 10),
+        ('eco_action.approved', 10, 25),
+        ('eco_action.created', 15, 15),
+    ]
+    assert entries[0]['global_balance'] == pool(conn) == start + 10
+    assert user_points(conn, 7) == repository.get_user_stats(conn, 7)['total_points'] == 10
+
+def test_idempotency_key_posts_once(conn, add):
+    first = add('tree', 15, True, key='eco_action:7:abc')
+    conn.commit()
+    entry = repository.get_ledger_entry(conn, 'eco_action:7:abc')
+    assert entry['action_id'] == first and entry['delta'] == 15
+    assert repository.post_points(conn, 7, 15, 'eco_action.created', idempotency_key='eco_action:7:abc') is None
+    assert user_points(conn, 7) == 15
+
+def test_repeated_key_writes_nothing_without_the_route_check(conn, add):
+    key = 'eco_action:7:retry'
+    first = add('tree', 15, True, key=key)
+    conn.commit()
+    stats, counters = repository.get_user_stats(conn, 7), repository.platform_counters(conn)
+
+    assert add('tree', 15, True, key=key) == first
+    action_id, entry = repository.add_eco_action(conn, 'a', 'd', 'tree', None, None, 15, 7, True, key)
+    conn.commit()
+    assert action_id == first and entry['delta'] == 15
+    assert conn.execute('SELECT COUNT(*) FROM eco_actions WHERE user_id = 7').fetchone()[0] == 1
+    assert repository.get_user_stats(conn, 7) == stats and repository.platform_counters(conn) == counters
+    assert user_points(conn, 7) == stats['total_points'] == 15
+
+def test_key_posted_after_the_check_drops_the_new_action(conn, add, monkeypatch):
+    first = add('tree', 15, True, key='eco_action:7:race')
+    conn.commit()
+    stats = repository.get_user_stats(conn, 7)
+    # The other request commits between this one's key check and its ledger post
+    real = repository.get_ledger_entry
+
+    def stale_once(c, key):
+        monkeypatch.setattr(repository, 'get_ledger_entry', real)
+        return None
+
+    monkeypatch.setattr(repository, 'get_ledger_entry', stale_once)
+    action_id, entry = repository.add_eco_action(conn, 'a', 'd', 'tree', None, None, 15, 7, True,
+                                                 'eco_action:7:race')
+    conn.commit()
+    assert action_id == first and entry['action_id'] == first
+    assert conn.execute('SELECT COUNT(*) FROM eco_actions WHERE user_id = 7').fetchone()[0] == 1
+    assert repository.get_user_stats(conn, 7) == stats
+
+    # Both checks missed: the ledger's UNIQUE key stops the post, and only
+    # this insert is undone, not the caller's other pending work
+    real_fetch_one = repository.fetch_one
+
+    def ledger_check_misses(c, sql, params=()):
+        if sql is repository.SELECT_LEDGER_ENTRY:
+            monkeypatch.setattr(repository, 'fetch_one', real_fetch_one)
+            return None
+        return real_fetch_one(c, sql, params)
+
+    monkeypatch.setattr(repository, 'get_ledger_entry', stale_once)
+    monkeypatch.setattr(repository, 'fetch_one', ledger_check_misses)
+    repository.insert_location(conn, 'Park', 'd', 'park', 42.0, 23.0, 7)
+    action_id, entry = repository.add_eco_action(conn, 'a', 'd', 'tree', None, None, 15, 7, True,
+                                                 'eco_action:7:race')
+    conn.commit()
+    assert action_id == first and entry['action_id'] == first
+    assert conn.execute("SELECT COUNT(*) FROM locations WHERE name = 'Park'").fetchone()[0] == 1
+    assert conn.execute('SELECT COUNT(*) FROM eco_actions WHERE user_id = 7').fetchone()[0] == 1
+    assert repository.get_user_stats(conn, 7) == stats
+
+def test_grants_skip_the_pool_and_replay_repairs_drift(conn, add):
+    admin_points = user_points(conn, 1)
+    start = pool(conn)
+    add('bike', 5, True)
+    repository.post_points(conn, 7, 500, 'grant.admin_promoted')
+    conn.commit()
+    assert pool(conn) == start + 5 and user_points(conn, 7) == 505
+    assert repository.charity_progress(1234)['donations_made'] == 2
+
+    conn.execute('UPDATE users SET points = 0')
+    conn.execute('UPDATE points_ledger SET user_balance = NULL, global_balance = NULL')
+    conn.execute("UPDATE platform_counters SET value = 0 WHERE name = 'ledger.balance'")
+    result = repository.replay_points_ledger(conn)
+    conn.commit()
+    assert result['balance'] == (0, start + 5)
+    assert result['rewritten'] == result['entries']
+    assert user_points(conn, 7) == 505 and user_points(conn, 1) == admin_points
+    assert repository.replay_points_ledger(conn)['rewritten'] == 0
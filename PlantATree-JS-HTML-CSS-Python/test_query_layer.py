@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Tests for the dialect-aware query layer (SQLite always, PostgreSQL when TEST_DATABASE_URL is set)
+"""
+
+import os
+from datetime import datetime
+
+import pytest
+
+import db_pool
+import repository
+from sql_dialect import group_concat, period_start, to_postgres
+
+TEST_DATABASE_URL = os.getenv('TEST_DATABASE_URL')
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS dialect_items (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT UNIQUE NOT NULL,
+        kind TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+@pytest.fixture(params=['sqlite', 'postgres'])
+def conn(request, tmp_path):
+    if request.param == 'sqlite':
+        factory = db_pool.sqlite_factory(str(tmp_path / 'dialect.db'))
+    else:
+        if not TEST_DATABASE_URL:
+            pytest.skip('TEST_DATABASE_URL not set')
+        factory = db_pool.postgres_factory(TEST_DATABASE_URL)
+    connection = factory()
+    cursor = connection.cursor()
+    cursor.execute('DROP TABLE IF EXISTS dialect_items')
+    cursor.execute(SCHEMA)
+    connection.commit()
+    yield connection
+    connection.rollback()
+    connection.cursor().execute('DROP TABLE IF EXISTS dialect_items')
+    connection.commit()
+    connection.close()
+
+def test_translation_rewrites_placeholders_outside_literals():
+    sql = "SELECT * FROM t WHERE a = ? AND b = 'what?' AND c LIKE '10%'"
+    assert to_postgres(sql) == "SELECT * FROM t WHERE a = %s AND b = 'what?' AND c LIKE '10%%'"
+    assert to_postgres("SELECT '10%'", has_params=False) == "SELECT '10%'"
+    assert to_postgres('INSERT OR IGNORE INTO t (a) VALUES (?)') == 'INSERT INTO t (a) VALUES (%s) ON CONFLICT DO NOTHING'
+    assert 'SERIAL PRIMARY KEY' in to_postgres(SCHEMA, has_params=False)
+
+def test_period_start():
+    now = datetime(2024, 3, 31, 12, 0)
+    assert period_start('week', now) == '2024-03-24'
+    assert period_start('month', now) == '2024-02-29'
+    assert period_start('year', now) == '2023-03-31'
+    assert period_start('all', now) is None
+
+def test_insert_returning_id_and_ignore(conn):
+    first = repository.insert_returning_id(conn, 'INSERT INTO dialect_items (name, kind) VALUES (?, ?)', ('oak', 'tree'))
+    second = repository.insert_returning_id(conn, 'INSERT INTO dialect_items (name, kind) VALUES (?, ?)', ('elm', 'tree'))
+    assert second == first + 1
+    repository.execute(conn, 'INSERT OR IGNORE INTO dialect_items (name, kind) VALUES (?, ?)', ('oak', 'tree'))
+    conn.commit()
+    assert repository.fetch_value(conn, "SELECT COUNT(*) FROM dialect_items WHERE kind = 'tree'") == 2
+
+def test_bulk_insert_iter_rows_and_group_concat(conn):
+    rows = [(f'item{i}', 'bike' if i % 2 else 'park') for i in range(1200)]
+    assert repository.bulk_insert(conn, 'dialect_items', ('name', 'kind'), rows) == 1200
+    conn.commit()
+
+    names = [row[0] for row in repository.iter_rows(conn, 'SELECT name FROM dialect_items WHERE kind = ? ORDER BY id', ('park',), batch_size=100)]
+    assert len(names) == 600 and names[0] == 'item0'
+
+    aggregate = group_concat('name', repository.dialect(conn), distinct=True)
+    value = repository.fetch_value(conn, f"SELECT {aggregate} FROM dialect_items WHERE name IN (?, ?)", ('item1', 'item2'))
+    assert sorted(value.split(',')) == ['item1', 'item2']
+
+def test_period_filter_binds_as_parameter(conn):
+    repository.execute(conn, 'INSERT INTO dialect_items (name, created_at) VALUES (?, ?)', ('old', '2000-01-01 00:00:00'))
+    repository.execute(conn, 'INSERT INTO dialect_items (name) VALUES (?)', ('new',))
+    conn.commit()
+    rows = repository.fetch_all(conn, 'SELECT name FROM dialect_items WHERE created_at >= ?', (period_start('week'),))
+    assert [row[0] for row in rows] == ['new']
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Tests for the tagged response cache
+"""
+
+import pytest
+from flask import Flask, jsonify, request
+
+import response_cache
+from db_pool import sqlite_factory
+
+@pytest.fixture
+def client():
+    response_cache.RESPONSE_CACHE.clear()
+    app = Flask(__name__)
+    calls = []
+
+    @app.route('/items')
+    @response_cache.cached(ttl=60, tags=('items',))
+    def items():
+        calls.append(request.args.get('page'))
+        return jsonify({'calls': len(calls), 'page': request.args.get('page')})
+
+    client = app.test_client()
+    client.calls = calls
+    return client
+
+def test_hits_are_keyed_by_query_string(client):
+    first = client.get('/items?page=1')
+    assert first.headers['X-Cache'] == 'MISS'
+    again = client.get('/items?page=1')
+    assert again.headers['X-Cache'] == 'HIT' and again.get_json() == first.get_json()
+    assert client.get('/items?page=2').headers['X-Cache'] == 'MISS'
+    assert client.calls == ['1', '2']
+    route = response_cache.stats()['routes']['items']
+    assert route['hits'] == 1 and route['misses'] == 2
+
+def test_authenticated_and_consistent_reads_bypass(client):
+    client.get('/items')
+    client.get('/items', headers={'Authorization': 'Bearer x'})
+    client.get('/items', headers={'X-Read-Your-Writes': '1'})
+    assert len(client.calls) == 3
+    assert response_cache.stats()['routes']['items']['bypassed'] == 2
+
+def test_commit_to_tagged_table_invalidates(client, tmp_path):
+    conn = sqlite_factory(str(tmp_path / 'cache.db'))()
+    conn.execute('CREATE TABLE items (n INTEGER)')
+    conn.execute('CREATE TABLE other (n INTEGER)')
+    conn.commit()
+    client.get('/items')
+
+    conn.execute('INSERT INTO other (n) VALUES (1)')
+    conn.commit()
+    assert client.get('/items').headers['X-Cache'] == 'HIT'
+
+    conn.execute('INSERT INTO items (n) VALUES (1)')
+    conn.rollback()
+    assert client.get('/items').headers['X-Cache'] == 'HIT'
+
+    conn.execute('INSERT INTO items (n) VALUES (1)')
+    conn.commit()
+    assert client.get('/items').headers['X-Cache'] == 'MISS'
+    conn.close()
+
+def test_response_computed_across_a_write_is_not_stored():
+    cache = response_cache.ResponseCache()
+    generation = cache.generation(('items',))
+    cache.invalidate({'items'})
+    assert cache.set('key', b'{}', 200, [], 60, ('items',), generation) is False
+    assert cache.get('items', 'key') is None
+
+def test_cached_value_is_shared_until_its_tables_change():
+    response_cache.RESPONSE_CACHE.clear()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return {'n': len(calls)}
+
+    assert response_cache.cached_value('part', compute, 60, ('items',)) == {'n': 1}
+    assert response_cache.cached_value('part', compute, 60, ('items',)) == {'n': 1}
+    response_cache.invalidate('items')
+    assert response_cache.cached_value('part', compute, 60, ('items',)) == {'n': 2}
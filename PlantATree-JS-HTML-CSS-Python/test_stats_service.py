@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Tests for the shared platform statistics
+"""
+
+import db_pool
+import repository
+import stats_service
+
+def test_counters_agree_with_a_full_scan(conn, add):
+    for action_type, points, approved in [('tree', 15, True), ('tree', 15, False), ('bike', 5, True),
+                                          ('clean', 10, False), ('recycle', 8, True)]:
+        add(action_type, points, approved)
+    repository.insert_location(conn, 'park', 'd', 'park', 42.7, 23.3, 7, approved=True)
+    conn.commit()
+
+    stats = stats_service.platform_stats(conn, with_totals=True)
+    assert stats == stats_service.scan_stats(conn)
+    assert stats['pending_actions'] == 2 and stats['eco_actions']['tree'] == {'count': 1, 'total_points': 15}
+    assert stats['charity']['total_points'] == stats['total_points']
+    assert 'total_users' not in stats_service.platform_stats(conn)
+
+def test_statement_counts(conn):
+    statements = []
+    db_pool.query_observers.append(lambda sql, seconds: statements.append(sql))
+    try:
+        stats_service.scan_stats(conn)
+        assert len(statements) == 3
+        del statements[:]
+        stats_service.platform_stats(conn, with_totals=True)
+        assert len(statements) <= 2
+        del statements[:]
+        stats_service.platform_stats(conn, with_totals=True)  # both statements cached
+        assert statements == []
+    finally:
+        db_pool.query_observers.pop()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Tests for the per-user stats kept in step with eco action writes
+"""
+
+import repository
+from db_pool import sqlite_factory
+
+def recomputed(conn, user_id):
+    row = conn.execute('''
+        SELECT COALESCE(SUM(points), 0), COUNT(*), MAX(created_at)
+        FROM eco_actions WHERE user_id = ? AND approved = TRUE
+    ''', (user_id,)).fetchone()
+    return {'total_points': row[0], 'action_count': row[1], 'last_action_at': row[2]}
+
+def test_stats_follow_every_write(conn, add):
+    tree = add('tree', 15, True)
+    bike = add('bike', 5, True)
+    pending = add('clean', 10, False)
+    conn.commit()
+    assert repository.get_user_stats(conn, 7)['total_points'] == 20
+    assert repository.get_user_stats(conn, 7)['action_count'] == 2
+
+    repository.set_eco_action_approved(conn, pending, True)
+    repository.set_eco_action_approved(conn, pending, True)  # no double count
+    repository.set_eco_action_approved(conn, bike, False)
+    repository.delete_eco_action(conn, tree)
+    conn.commit()
+
+    stats = repository.get_user_stats(conn, 7)
+    assert {k: stats[k] for k in ('total_points', 'action_count')} == {'total_points': 10, 'action_count': 1}
+    assert stats['last_action_at'] == recomputed(conn, 7)['last_action_at']
+    assert repository.get_user_type_stats(conn, 7) == {
+        'tree': {'total_points': 0, 'action_count': 0},
+        'bike': {'total_points': 0, 'action_count': 0},
+        'clean': {'total_points': 10, 'action_count': 1},
+    }
+    assert conn.execute('SELECT points FROM users WHERE id = 7').fetchone()[0] == 10
+
+def test_approve_all_and_delete_user_actions(conn, add):
+    for _ in range(3):
+        add('recycle', 8, False)
+    assert repository.approve_all_pending_actions(conn) == 3
+    conn.commit()
+    assert repository.get_user_stats(conn, 7)['total_points'] == recomputed(conn, 7)['total_points'] == 24
+
+    repository.delete_user_eco_actions(conn, 7)
+    conn.commit()
+    assert repository.get_user_stats(conn, 7) == {'total_points': 0, 'action_count': 0, 'last_action_at': None}
+
+def test_rollback_discards_stats_change(conn, add):
+    add('tree', 15, True)
+    conn.rollback()
+    assert repository.get_user_stats(conn, 7)['action_count'] == 0
+
+def interleave(monkeypatch, conn, other_write):
+    """Run `other_write` (another admin, committed) just before conn's first eco_actions write"""
+    real = repository.execute
+
+    def execute(c, sql, params=()):
+        if c is conn and 'eco_actions' in sql and sql.lstrip().startswith(('UPDATE', 'DELETE')):
+            monkeypatch.setattr(repository, 'execute', real)
+            other_write()
+        return real(c, sql, params)
+
+    monkeypatch.setattr(repository, 'execute', execute)
+
+def test_concurrent_admins_apply_a_change_once(conn, add, db_path, monkeypatch):
+    other = sqlite_factory(db_path)()
+    pending = add('tree', 15, False)
+    conn.commit()
+
+    def approve():
+        assert repository.set_eco_action_approved(other, pending, True) == 1
+        other.commit()
+
+    interleave(monkeypatch, conn, approve)
+    assert repository.set_eco_action_approved(conn, pending, True) == 0
+    conn.commit()
+    stats = repository.get_user_stats(conn, 7)
+    assert (stats['total_points'], stats['action_count']) == (15, 1)
+    assert conn.execute('SELECT points FROM users WHERE id = 7').fetchone()[0] == 15
+
+    def delete():
+        assert repository.delete_eco_action(other, pending) == 1
+        other.commit()
+
+    interleave(monkeypatch, conn, delete)
+    assert repository.delete_eco_action(conn, pending) == 0
+    conn.commit()
+    assert repository.get_user_stats(conn, 7)['action_count'] == 0
+    assert conn.execute('SELECT points FROM users WHERE id = 7').fetchone()[0] == 0
+
+    second = add('bike', 5, False)
+    add('bike', 5, False)
+    conn.commit()
+
+    def approve_one():
+        repository.set_eco_action_approved(other, second, True)
+        other.commit()
+
+    interleave(monkeypatch, conn, approve_one)
+    assert repository.approve_all_pending_actions(conn) == 1
+    conn.commit()
+    assert repository.get_user_stats(conn, 7)['total_points'] == recomputed(conn, 7)['total_points'] == 10
+    assert repository.reconcile_counters(conn) == {}
+    other.close()
+
+def test_platform_counters_match_recount(conn, add):
+    first = add('tree', 15, True)
+    add('bike', 5, False)
+    repository.insert_location(conn, 'Park', 'd', 'park', 42.0, 23.0, 7, approved=False)
+    conn.commit()
+    baseline = repository.platform_counters(conn)
+
+    repository.approve_all_pending_actions(conn)
+    repository.delete_eco_action(conn, first)
+    for row in repository.list_pending_locations(conn):
+        repository.approve_location(conn, row[0])
+    conn.commit()
+
+    counters = repository.platform_counters(conn)
+    assert counters['eco_actions.points'] == baseline['eco_actions.points'] - 10
+    assert counters['locations.approved'] == baseline['locations.approved'] + 1
+    assert repository.reconcile_counters(conn) == {}
+
+    conn.execute("UPDATE platform_counters SET value = 99 WHERE name = 'active_users'")
+    assert repository.reconcile_counters(conn) == {'active_users': (99, 1)}
+
+def test_daily_rollups_match_backfill(conn, add):
+    add('tree', 15, True)
+    old = add('bike', 5, False)
+    conn.execute("UPDATE eco_actions SET created_at = '2024-03-02 10:00:00' WHERE id = ?", (old,))
+    repository.approve_all_pending_actions(conn)
+    add('tree', 3, True)
+    conn.commit()
+    maintained = [tuple(row) for row in repository.get_daily_user_stats(conn, 7)]
+    assert maintained[0] == ('2024-03-02', 'bike', 5, 1)
+    assert maintained[1][1:] == ('tree', 18, 2)
+    assert [tuple(r) for r in repository.get_daily_user_stats(conn, 7, since='2025-01-01')] == maintained[1:]
+
+    repository.delete_eco_action(conn, old)
+    conn.commit()
+    maintained = [tuple(row) for row in repository.get_daily_user_stats(conn, 7)]
+    repository.rebuild_daily_user_stats(conn)
+    assert [tuple(row) for row in repository.get_daily_user_stats(conn, 7)] == maintained
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Tests for the group-commit write queue
+"""
+
+import threading
+
+import pytest
+
+from db_pool import ConnectionPool, sqlite_factory
+from write_queue import WriteQueue
+
+INSERT = 'INSERT INTO hits (n) VALUES (?)'
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ConnectionPool(sqlite_factory(str(tmp_path / 'queue.db')), max_size=4)
+    with pool.connection() as conn:
+        conn.execute('CREATE TABLE hits (n INTEGER UNIQUE)')
+        conn.commit()
+    yield pool
+    pool.close_all()
+
+def count(pool):
+    with pool.connection() as conn:
+        return conn.execute('SELECT COUNT(*) FROM hits').fetchone()[0]
+
+def test_concurrent_writes_are_group_committed(pool):
+    wq = WriteQueue(pool, max_latency_ms=20)
+    threads = [threading.Thread(target=lambda base=t: [wq.submit(INSERT, (base * 100 + i,)) for i in range(100)])
+               for t in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert wq.flush(timeout=5)
+    assert count(pool) == 800
+    stats = wq.stats()
+    assert stats['writes'] == 800 and stats['pending'] == 0
+    assert stats['batches'] < 800
+    wq.close()
+
+def test_close_flushes_and_later_writes_are_synchronous(pool):
+    wq = WriteQueue(pool, max_latency_ms=1000)
+    for i in range(10):
+        wq.submit(INSERT, (i,))
+    wq.close()
+    assert count(pool) == 10
+    wq.submit(INSERT, (10,))
+    assert count(pool) == 11
+
+def test_bad_write_does_not_sink_the_batch(pool):
+    wq = WriteQueue(pool, max_latency_ms=50)
+    wq.submit(INSERT, (1,))
+    wq.submit(INSERT, (1,))  # UNIQUE violation
+    wq.submit(INSERT, (2,))
+    wq.flush(timeout=5)
+    assert count(pool) == 2
+    assert wq.stats()['failed'] == 1
+    wq.close()
+
+def test_full_queue_falls_back_to_synchronous_write(pool):
+    wq = WriteQueue(pool, max_latency_ms=20, max_pending=1)
+    for i in range(50):
+        wq.submit(INSERT, (i,))
+    wq.flush(timeout=5)
+    assert count(pool) == 50
+    wq.close()
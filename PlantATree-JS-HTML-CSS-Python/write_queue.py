@@ -0,0 +1,246 @@
+# Write-behind queue with group commit (like a batching job queue in Node.js)
+#
+# Non-critical bookkeeping writes (last_login updates, session rows,
+# analytics) are handed to a background thread that commits them in
+# batches: the first write in a batch waits at most WRITE_QUEUE_MAX_LATENCY_MS
+# before the batch is committed, so many requests share one transaction
+# (and one fsync on SQLite) instead of each paying for its own. Anything
+# the response depends on must stay a normal synchronous write.
+import atexit
+import os
+import queue
+import threading
+import time
+
+import db_pool
+
+WRITE_QUEUE_ENABLED = os.getenv('WRITE_QUEUE_ENABLED', 'true').lower() == 'true'
+WRITE_QUEUE_MAX_LATENCY_MS = float(os.getenv('WRITE_QUEUE_MAX_LATENCY_MS', '20'))
+WRITE_QUEUE_MAX_BATCH = int(os.getenv('WRITE_QUEUE_MAX_BATCH', '500'))
+WRITE_QUEUE_MAX_PENDING = int(os.getenv('WRITE_QUEUE_MAX_PENDING', '10000'))
+
+_STOP = object()
+
+class WriteQueue:
+    """Background writer that group-commits queued (sql, params) statements"""
+
+    def __init__(self, pool=None, max_latency_ms=WRITE_QUEUE_MAX_LATENCY_MS,
+                 max_batch=WRITE_QUEUE_MAX_BATCH, max_pending=WRITE_QUEUE_MAX_PENDING):
+        self._pool = pool
+        self.max_latency = max_latency_ms / 1000.0
+        self.max_batch = max_batch
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._cond = threading.Condition()
+        self._thread = None
+        self._closed = False
+
+        # Progress markers for flush(): every write gets a sequence number
+        self._submitted = 0
+        self._done = 0
+
+        # Metrics
+        self._batches = 0
+        self._writes = 0
+        self._failed = 0
+        self._overflow = 0
+        self._max_batch_seen = 0
+        self._commit_ms = 0.0
+
+    @property
+    def pool(self):
+        return self._pool or db_pool.get_pool()
+
+    def start(self):
+        with self._cond:
+            if self._thread is None and not self._closed:
+                self._thread = threading.Thread(target=self._run, name='write-queue', daemon=True)
+                self._thread.start()
+        return self
+
+    def submit(self, sql, params=()):
+        """Queue a write; falls back to a synchronous write when full or closed"""
+        self.start()
+        with self._cond:
+            # Enqueue under the lock so nothing can land behind close()'s stop marker
+            queued = not self._closed
+            if queued:
+                try:
+                    self._queue.put_nowait((sql, tuple(params)))
+                    self._submitted += 1
+                except queue.Full:
+                    self._overflow += 1
+                    queued = False
+        if not queued:
+            # Closed, or backpressure: the caller pays for its own commit
+            self._write_now(sql, params)
+
+    def flush(self, timeout=None):
+        """Block until every write submitted so far is committed; False on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            target = self._submitted
+            while self._done < target:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout=10):
+        """Flush pending writes and stop the writer thread"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+        if thread is not None:
+            # No submit can enqueue once _closed is set, so the marker goes last
+            self._queue.put(_STOP)
+            thread.join(timeout)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'enabled': True,
+                'pending': self._submitted - self._done,
+                'batches': self._batches,
+                'writes': self._writes,
+                'failed': self._failed,
+                'overflow': self._overflow,
+                'avg_batch': round(self._writes / self._batches, 2) if self._batches else 0.0,
+                'max_batch': self._max_batch_seen,
+                'avg_commit_ms': round(self._commit_ms / self._batches, 3) if self._batches else 0.0,
+                'max_latency_ms': self.max_latency * 1000
+            }
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.max_latency
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._commit(batch)
+
+        # Drain whatever arrived before close()
+        leftover = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                leftover.append(item)
+        for start in range(0, len(leftover), self.max_batch):
+            self._commit(leftover[start:start + self.max_batch])
+
+    def _commit(self, batch):
+        start = time.perf_counter()
+        failed = 0
+        try:
+            with self.pool.connection() as conn:
+                try:
+                    self._execute_grouped(conn, batch)
+                    conn.commit()
+                except Exception as e:
+                    conn.rollback()
+                    print(f"Write queue batch failed ({e}), retrying {len(batch)} writes one by one")
+                    failed = self._execute_individually(conn, batch)
+        except Exception as e:
+            print(f"Write queue could not get a connection: {e}")
+            failed = len(batch)
+        with self._cond:
+            self._batches += 1
+            self._writes += len(batch) - failed
+            self._failed += failed
+            self._max_batch_seen = max(self._max_batch_seen, len(batch))
+            self._commit_ms += (time.perf_counter() - start) * 1000
+        self._mark_done(len(batch))
+
+    def _execute_grouped(self, conn, batch):
+        # Consecutive writes with the same statement go out as one executemany
+        cursor = conn.cursor()
+        i = 0
+        while i < len(batch):
+            sql = batch[i][0]
+            j = i
+            while j < len(batch) and batch[j][0] == sql:
+                j += 1
+            if j - i == 1:
+                cursor.execute(sql, batch[i][1])
+            else:
+                cursor.executemany(sql, [params for _, params in batch[i:j]])
+            i = j
+
+    def _execute_individually(self, conn, batch):
+        failed = 0
+        for sql, params in batch:
+            try:
+                conn.cursor().execute(sql, params)
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                failed += 1
+                print(f"Write queue dropped write: {e}")
+        return failed
+
+    def _write_now(self, sql, params):
+        with self.pool.connection() as conn:
+            try:
+                conn.cursor().execute(sql, params)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def _mark_done(self, count):
+        with self._cond:
+            self._done += count
+            self._cond.notify_all()
+
+_queue_instance = None
+_queue_lock = threading.Lock()
+
+def get_write_queue():
+    """Process-wide queue, started on first use and flushed at interpreter exit"""
+    global _queue_instance
+    if _queue_instance is None:
+        with _queue_lock:
+            if _queue_instance is None:
+                _queue_instance = WriteQueue()
+                atexit.register(_queue_instance.close)
+    return _queue_instance
+
+def defer(conn, sql, params=()):
+    """Queue a non-critical write, or run it on `conn` (caller commits) when the queue is disabled"""
+    if not WRITE_QUEUE_ENABLED:
+        conn.cursor().execute(sql, params)
+        return
+    get_write_queue().submit(sql, params)
+
+def flush(timeout=None):
+    if _queue_instance is not None:
+        return _queue_instance.flush(timeout)
+    return True
+
+def shutdown():
+    if _queue_instance is not None:
+        _queue_instance.close()
+
+def stats():
+    if _queue_instance is None:
+        return {'enabled': WRITE_QUEUE_ENABLED, 'pending': 0}
+    return _queue_instance.stats()